@@ -60,12 +60,29 @@ class ContextMixin:
         self._total_output_tokens: int = 0
         self._cache_read_tokens: int = 0
         self._cache_write_tokens: int = 0
+        self._last_turn_cache: Dict[str, Any] = {}  # prompt-cache usage of the latest model call
 
     @property
     def total_tokens(self) -> int:
         """Total token usage across all API calls."""
         return self._total_input_tokens + self._total_output_tokens
 
+    def _record_turn_cache(self, iteration: int, uncached: int, read: int, write: int) -> None:
+        """Record and log prompt-cache usage for one model call."""
+        prompt = uncached + read + write
+        hit_rate = round(read / prompt * 100, 1) if prompt else 0.0
+        self._last_turn_cache = {
+            "iteration": iteration,
+            "input_tokens": uncached,
+            "cache_read_tokens": read,
+            "cache_write_tokens": write,
+            "hit_rate_pct": hit_rate,
+        }
+        logger.info(
+            "Turn %d prompt cache: %d read, %d written, %d uncached (%.1f%% hit)",
+            iteration, read, write, uncached, hit_rate,
+        )
+
     @property
     def modified_files(self) -> Dict[str, Any]:
         """Return files modified in this session (path -> original_content or None if new file)."""
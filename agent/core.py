@@ -11,7 +11,8 @@ import os
 import queue as _queue
 import re
 import threading
-from typing import List, Dict, Any, Optional
+import weakref
+from typing import List, Dict, Any, Optional, Callable, Tuple
 
 from bedrock_service import BedrockService, GenerationConfig
 from config import (
@@ -25,6 +26,7 @@ from config import (
 from backend import Backend, LocalBackend
 
 from .events import AgentEvent
+from .streaming import ModelStream
 from .prompts import (
     _compose_system_prompt,
     _detect_project_language,
@@ -88,6 +90,7 @@ class CodingAgent(
         self._cancelled = False
         self._pending_guidance: _queue.Queue[str] = _queue.Queue()
         self._guidance_interrupt = threading.Event()
+        self._streams: "weakref.WeakSet[ModelStream]" = weakref.WeakSet()  # open model streams
 
         # Initialize mixins (ContextMixin, VerificationMixin, ExecutionMixin, etc.)
         super().__init__()
@@ -104,6 +107,8 @@ class CodingAgent(
         self._task_complexity: str = "low"
         self._phase_summaries: List[str] = []
         self._step_failure_counts: Dict[str, int] = {}
+        # base prompt -> (rules signature, learned patterns, stable prompt, token estimate)
+        self._stable_prompt_memo: Dict[str, tuple] = {}
 
     # ------------------------------------------------------------------
     # Cancellation and guidance injection
@@ -112,6 +117,7 @@ class CodingAgent(
     def cancel(self):
         """Cancel the current agent run and kill any running command."""
         self._cancelled = True
+        self._wake_streams()
         if self.backend:
             try:
                 self.backend.cancel_running_command()
@@ -123,6 +129,24 @@ class CodingAgent(
         Also sets _guidance_interrupt to abort any in-progress Bedrock stream."""
         self._pending_guidance.put(text)
         self._guidance_interrupt.set()
+        self._wake_streams()
+
+    def _open_model_stream(self, produce: Callable[[], Any], stop_on_guidance: bool = False) -> ModelStream:
+        """Start streaming a model response (see agent.streaming.ModelStream). Iteration ends as soon
+        as the run is cancelled, or guidance is injected when stop_on_guidance is set."""
+        def should_stop() -> bool:
+            return self._cancelled or (stop_on_guidance and self._guidance_interrupt.is_set())
+        stream = ModelStream(produce, should_stop=should_stop)
+        self._streams.add(stream)
+        return stream.start()
+
+    def _wake_streams(self) -> None:
+        try:
+            streams = list(self._streams)
+        except RuntimeError:  # set changed while copying (another thread opened a stream)
+            streams = list(self._streams)
+        for stream in streams:
+            stream.wake()
 
     def _consume_guidance(self) -> Optional[str]:
         """Drain all queued guidance messages and combine into one string.
@@ -150,6 +174,7 @@ class CodingAgent(
         self._total_output_tokens = 0
         self._cache_read_tokens = 0
         self._cache_write_tokens = 0
+        self._last_turn_cache = {}
         self._approved_commands = set()
         self._history_len_at_last_call = 0
         self._running_summary = ""
@@ -379,18 +404,34 @@ class CodingAgent(
     # Dynamic system prompt composition
     # ------------------------------------------------------------------
 
-    def _effective_system_prompt(self, base: str) -> str:
-        """Return system prompt with dynamic context sections appended."""
-        prompt = base
+    def _stable_system_prompt(self, base: str) -> str:
+        """Base prompt plus project rules and learned failure patterns.
 
+        This is the cached part of the system prompt, so it only changes when a
+        rule file (by mtime/size) or the failure patterns change; the rule files
+        are re-read only then.
+        """
+        sig = self._project_rules_signature()
+        learned = self._failure_patterns_prompt()
+        memo = self._stable_prompt_memo.get(base)
+        if memo is not None and memo[0] == sig and memo[1] == learned:
+            return memo[2]
+
+        prompt = base
         rules = self._load_project_rules()
         if rules:
             prompt += "\n\n<project_rules>\nThese project-specific rules MUST be followed:\n\n" + rules + "\n</project_rules>"
-
-        learned = self._failure_patterns_prompt()
         if learned:
             prompt += "\n\n<known_failure_patterns>\n" + learned + "\n</known_failure_patterns>"
 
+        if len(self._stable_prompt_memo) >= 4:  # main, plan and scout prompts
+            self._stable_prompt_memo.clear()
+        self._stable_prompt_memo[base] = (sig, learned, prompt, self._estimate_tokens(prompt))
+        return prompt
+
+    def _volatile_system_prompt(self) -> str:
+        """Todos and system reminders — the per-turn part of the system prompt."""
+        sections = []
         if self._todos:
             lines = ["<current_todos>", "Your task checklist (update with TodoWrite as you progress):"]
             for t in self._todos:
@@ -398,13 +439,32 @@ class CodingAgent(
                 c = (t.get("content") or "").strip()
                 lines.append(f"  [{s}] {c}")
             lines.append("</current_todos>")
-            prompt += "\n\n" + "\n".join(lines)
+            sections.append("\n".join(lines))
 
         reminders = self._gather_system_reminders()
         if reminders:
-            prompt += "\n\n<system_reminders>\n" + "\n".join(f"- {r}" for r in reminders) + "\n</system_reminders>"
+            sections.append("<system_reminders>\n" + "\n".join(f"- {r}" for r in reminders) + "\n</system_reminders>")
 
-        return prompt
+        return "\n\n".join(sections)
+
+    def _system_prompt_parts(self, base: str) -> Tuple[str, str]:
+        """(stable, volatile) system prompt. The model call caches the stable part and sends
+        the volatile part after the last cache breakpoint (GenerationConfig.volatile_context),
+        so a todo update doesn't invalidate the cached system prompt and history."""
+        return self._stable_system_prompt(base), self._volatile_system_prompt()
+
+    def _system_prompt_tokens(self) -> int:
+        """Token estimate of the effective system prompt (stable part memoized)."""
+        stable = self._stable_system_prompt(self.system_prompt)
+        memo = self._stable_prompt_memo.get(self.system_prompt)
+        stable_tokens = memo[3] if memo is not None else self._estimate_tokens(stable)
+        volatile = self._volatile_system_prompt()
+        return stable_tokens + (self._estimate_tokens(volatile) if volatile else 0)
+
+    def _effective_system_prompt(self, base: str) -> str:
+        """Return system prompt with dynamic context sections appended."""
+        stable, volatile = self._system_prompt_parts(base)
+        return stable + "\n\n" + volatile if volatile else stable
 
     # ------------------------------------------------------------------
     # Plan decomposition helpers
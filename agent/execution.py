@@ -7,11 +7,10 @@ import asyncio
 import json
 import logging
 import os
-import queue
 import re
-import threading
 import time
 from collections import defaultdict
+from dataclasses import replace
 from typing import List, Dict, Any, Optional, Callable, Awaitable
 
 from bedrock_service import GenerationConfig, BedrockError
@@ -30,7 +29,6 @@ _GUIDANCE_PREFIX = (
     "[USER GUIDANCE — mid-task correction from the user. "
     "Incorporate this into your current work immediately.]"
 )
-_POLL_TIMEOUT = object()  # sentinel for chunk polling timeout
 
 
 # ---------------------------------------------------------------------------
@@ -153,6 +151,7 @@ class ExecutionMixin:
             for attempt in range(1, max_retries + 1):
                 try:
                     # Reset per-attempt accumulators
+                    stream = None
                     assistant_content = []
                     current_tool_use = None
                     tool_use_json_parts: List[str] = []
@@ -176,60 +175,28 @@ class ExecutionMixin:
                             data={"attempt": attempt, "max_retries": max_retries},
                         ))
 
-                    chunk_queue: queue.Queue = queue.Queue(maxsize=256)
-                    _stop_producer = threading.Event()
-
                     build_tools = (TOOL_DEFINITIONS + [ASK_USER_QUESTION_DEFINITION]) if request_question_answer else TOOL_DEFINITIONS
+                    system_prompt, volatile_context = self._system_prompt_parts(self.system_prompt)
+                    call_config = replace(
+                        gen_config,
+                        cache_stable_prefix=self._cache_stable_prefix(),
+                        volatile_context=volatile_context,
+                    )
 
-                    def _stream_producer():
-                        """Run the sync generator in a background thread, forwarding chunks to the queue."""
-                        try:
-                            for c in self.service.generate_response_stream(
-                                messages=self.history,
-                                system_prompt=self._effective_system_prompt(self.system_prompt),
-                                model_id=None,
-                                config=gen_config,
-                                tools=build_tools,
-                            ):
-                                if _stop_producer.is_set():
-                                    break
-                                chunk_queue.put(c)
-                            chunk_queue.put(None)  # sentinel: stream complete
-                        except Exception as exc:
-                            chunk_queue.put(exc)
-
-                    producer_thread = threading.Thread(target=_stream_producer, daemon=True)
-                    producer_thread.start()
-
-                    # Consume chunks from the queue in the async loop
-                    loop = asyncio.get_event_loop()
-                    _guidance_interrupted = False
-
-                    def _poll_chunk():
-                        """Block up to 0.25s for a chunk, returning _POLL_TIMEOUT sentinel on timeout."""
-                        try:
-                            return chunk_queue.get(timeout=0.25)
-                        except queue.Empty:
-                            return _POLL_TIMEOUT
-
-                    while True:
-                        if self._cancelled:
-                            _stop_producer.set()
-                            break
-                        if self._guidance_interrupt.is_set():
-                            _stop_producer.set()
-                            _guidance_interrupted = True
-                            break
-
-                        chunk = await loop.run_in_executor(None, _poll_chunk)
-                        if chunk is _POLL_TIMEOUT:
-                            continue
-
-                        if chunk is None:
-                            break  # stream complete
-                        if isinstance(chunk, Exception):
-                            raise chunk
+                    # Stream on a background thread; chunks arrive on the event loop directly and
+                    # a cancel or guidance interrupt ends the iteration immediately
+                    stream = self._open_model_stream(
+                        lambda: self.service.generate_response_stream(
+                            messages=self.history,
+                            system_prompt=system_prompt,
+                            model_id=None,
+                            config=call_config,
+                            tools=build_tools,
+                        ),
+                        stop_on_guidance=True,
+                    )
 
+                    async for chunk in stream:
                         chunk_type = chunk.get("type", "")
                         content = chunk.get("content", "")
 
@@ -382,9 +349,8 @@ class ExecutionMixin:
                             self._total_output_tokens += usage.get("output_tokens", 0)
                             last_stop_reason = chunk.get("stop_reason") or None
 
-                    producer_thread.join(timeout=5)
-
                     # If guidance arrived mid-stream, discard partial response and restart
+                    _guidance_interrupted = stream.interrupted and not self._cancelled
                     if _guidance_interrupted:
                         discarded_len = len(current_text)
                         assistant_content = []
@@ -400,12 +366,19 @@ class ExecutionMixin:
 
                     stream_succeeded = True
                     self._history_len_at_last_call = len(self.history)
+                    self._record_turn_cache(
+                        iteration,
+                        self._total_input_tokens - snapshot_input,
+                        self._cache_read_tokens - snapshot_cache_read,
+                        self._cache_write_tokens - snapshot_cache_write,
+                    )
                     self._consecutive_stream_errors = 0
                     self._last_stream_error_sig = ""
                     break  # exit retry loop — stream completed
 
                 except (BedrockError, Exception) as stream_err:
-                    producer_thread.join(timeout=2)
+                    if stream is not None:
+                        stream.stop()
 
                     # Determine if this error is retryable (connection/timeout/throttle/token limit)
                     err_str = str(stream_err).lower()
@@ -658,6 +631,8 @@ class ExecutionMixin:
                         "input_tokens": self._total_input_tokens,
                         "output_tokens": self._total_output_tokens,
                         "cache_read_tokens": self._cache_read_tokens,
+                        "cache_write_tokens": self._cache_write_tokens,
+                        "last_turn_cache": dict(self._last_turn_cache),
                         "context_usage_pct": round(ctx_est / ctx_window * 100) if ctx_window else 0,
                     },
                 ))
@@ -83,8 +83,7 @@ class HistoryMixin:
         # The effective system prompt can be 5K-20K tokens depending on rules,
         # todos, failure patterns, and reminders.
         try:
-            sys_prompt = self._effective_system_prompt(self.system_prompt)
-            base += self._estimate_tokens(sys_prompt)
+            base += self._system_prompt_tokens()
         except Exception:
             base += 4000  # conservative fallback
         return base
@@ -396,6 +395,15 @@ class HistoryMixin:
     # History trimming
     # ------------------------------------------------------------------
 
+    def _cache_stable_prefix(self) -> int:
+        """Number of leading history messages the next _trim_history pass leaves untouched
+        (short of a tier 2 summary). Tier 0 only rewrites tool results that have just left
+        the last two messages and tier 1 only strips thinking from messages that have just
+        crossed the thinking horizon; anything older was already rewritten, so a prompt
+        cache breakpoint placed there keeps hitting on the next turn.
+        """
+        return max(0, len(self.history) - max(2, self._ctx_scale(4)))
+
     async def _trim_history(self) -> None:
         """Multi-tier context management inspired by Cursor's approach.
 
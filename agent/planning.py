@@ -7,9 +7,7 @@ import asyncio
 import json
 import logging
 import os
-import queue
 import re
-import threading
 from typing import List, Dict, Any, Optional, Callable, Awaitable
 
 from bedrock_service import GenerationConfig
@@ -153,24 +151,14 @@ class PlanningMixin:
 
         async def _stream_plan_call(messages, tools_list):
             """Run a single streaming plan LLM call. Returns (text, tool_uses, assistant_content)."""
-            cq: queue.Queue = queue.Queue()
-
-            def _producer():
-                try:
-                    for c in self.service.generate_response_stream(
-                        messages=messages,
-                        system_prompt=self._effective_system_prompt(plan_system),
-                        model_id=None,
-                        config=plan_config,
-                        tools=tools_list,
-                    ):
-                        cq.put(c)
-                    cq.put(None)
-                except Exception as exc:
-                    cq.put(exc)
-
-            t = threading.Thread(target=_producer, daemon=True)
-            t.start()
+            system_prompt = self._effective_system_prompt(plan_system)
+            stream = self._open_model_stream(lambda: self.service.generate_response_stream(
+                messages=messages,
+                system_prompt=system_prompt,
+                model_id=None,
+                config=plan_config,
+                tools=tools_list,
+            ))
 
             a_content: List[Dict[str, Any]] = []
             c_text = ""
@@ -181,17 +169,7 @@ class PlanningMixin:
             c_tool = None
             t_json: List[str] = []
 
-            while True:
-                if self._cancelled:
-                    t.join(timeout=2)
-                    return "", [], []
-
-                chunk = await loop.run_in_executor(None, cq.get)
-                if chunk is None:
-                    break
-                if isinstance(chunk, Exception):
-                    raise chunk
-
+            async for chunk in stream:
                 ct = chunk.get("type", "")
                 cc = chunk.get("content", "")
 
@@ -256,7 +234,8 @@ class PlanningMixin:
                     usage = chunk.get("usage", {})
                     self._total_output_tokens += usage.get("output_tokens", 0)
 
-            t.join(timeout=5)
+            if stream.interrupted:
+                return "", [], []
             full_text = "\n\n".join(all_text_blocks).strip() if all_text_blocks else c_text
             return full_text, t_uses, a_content
 
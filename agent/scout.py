@@ -8,8 +8,6 @@ import json
 import logging
 import os
 import re
-import queue
-import threading
 from typing import List, Dict, Any, Optional, Callable, Awaitable
 
 from bedrock_service import GenerationConfig, BedrockError
@@ -120,65 +118,54 @@ Keep the whole response under 400 words. If the request is already very clear an
         scout_tools = SCOUT_TOOL_DEFINITIONS
 
         for scout_iter in range(max_scout_iters):
-            # Stream scout response
-            q: queue.Queue = queue.Queue()
-
-            def _producer():
-                try:
-                    for chunk in self.service.generate_response_stream(
-                        messages=scout_messages,
-                        system_prompt=scout_system,
-                        tools=scout_tools,
-                        model_id=scout_model,
-                        config=scout_config,
-                    ):
-                        q.put(chunk)
-                except Exception as e:
-                    q.put({"type": "error", "error": str(e)})
-                finally:
-                    q.put(None)
-
-            t = threading.Thread(target=_producer, daemon=True)
-            t.start()
+            # Stream scout response (ends immediately on cancel)
+            stream = self._open_model_stream(lambda: self.service.generate_response_stream(
+                messages=scout_messages,
+                system_prompt=scout_system,
+                tools=scout_tools,
+                model_id=scout_model,
+                config=scout_config,
+            ))
 
             c_text = ""
             t_uses: List[Dict[str, Any]] = []
             c_tool: Optional[Dict[str, Any]] = None
             a_content: List[Dict[str, Any]] = []
 
-            while True:
-                chunk = q.get()
-                if chunk is None:
-                    break
-                ct = chunk.get("type", "")
-
-                if ct == "text":
-                    c_text += chunk.get("text", "")
-                elif ct == "tool_use_start":
-                    c_tool = {"type": "tool_use", "id": chunk.get("id", ""),
-                              "name": chunk.get("name", ""), "input_json": ""}
-                    display_name = SCOUT_TOOL_DISPLAY_NAMES.get(chunk.get("name", ""), chunk.get("name", ""))
-                    await on_event(AgentEvent(type="scout_progress", content=f"Scouting: {display_name}..."))
-                elif ct == "tool_input_delta" and c_tool:
-                    c_tool["input_json"] += chunk.get("json_delta", "")
-                elif ct == "tool_use_end" and c_tool:
-                    try:
-                        inp = json.loads(c_tool["input_json"]) if c_tool["input_json"] else {}
-                    except json.JSONDecodeError:
-                        inp = {}
-                    tu = {"type": "tool_use", "id": c_tool["id"], "name": c_tool["name"], "input": inp}
-                    t_uses.append(tu)
-                    a_content.append(tu)
-                    c_tool = None
-                elif ct == "usage_start":
-                    usage = chunk.get("usage", {})
-                    self._total_input_tokens += usage.get("input_tokens", 0)
-                    self._cache_read_tokens += usage.get("cache_read_input_tokens", 0)
-                elif ct == "message_end":
-                    usage = chunk.get("usage", {})
-                    self._total_output_tokens += usage.get("output_tokens", 0)
-
-            t.join(timeout=5)
+            try:
+                async for chunk in stream:
+                    ct = chunk.get("type", "")
+
+                    if ct == "text":
+                        c_text += chunk.get("text", "")
+                    elif ct == "tool_use_start":
+                        c_tool = {"type": "tool_use", "id": chunk.get("id", ""),
+                                  "name": chunk.get("name", ""), "input_json": ""}
+                        display_name = SCOUT_TOOL_DISPLAY_NAMES.get(chunk.get("name", ""), chunk.get("name", ""))
+                        await on_event(AgentEvent(type="scout_progress", content=f"Scouting: {display_name}..."))
+                    elif ct == "tool_input_delta" and c_tool:
+                        c_tool["input_json"] += chunk.get("json_delta", "")
+                    elif ct == "tool_use_end" and c_tool:
+                        try:
+                            inp = json.loads(c_tool["input_json"]) if c_tool["input_json"] else {}
+                        except json.JSONDecodeError:
+                            inp = {}
+                        tu = {"type": "tool_use", "id": c_tool["id"], "name": c_tool["name"], "input": inp}
+                        t_uses.append(tu)
+                        a_content.append(tu)
+                        c_tool = None
+                    elif ct == "usage_start":
+                        usage = chunk.get("usage", {})
+                        self._total_input_tokens += usage.get("input_tokens", 0)
+                        self._cache_read_tokens += usage.get("cache_read_input_tokens", 0)
+                    elif ct == "message_end":
+                        usage = chunk.get("usage", {})
+                        self._total_output_tokens += usage.get("output_tokens", 0)
+            except Exception as e:
+                logger.debug(f"Scout stream failed: {e}")
+
+            if stream.interrupted:
+                break
 
             if c_text:
                 a_content.insert(0, {"type": "text", "text": c_text})
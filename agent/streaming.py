@@ -0,0 +1,115 @@
+"""
+Bridge between the blocking Bedrock stream and the agent's event loop.
+Used by the main agent loop, the scout and plan generation.
+"""
+
+import asyncio
+import threading
+import weakref
+from typing import Any, Callable, Dict, Iterable, Optional
+
+_DONE = object()  # stream finished
+_WAKE = object()  # re-check the stop condition (cancel / guidance)
+
+
+def _produce_into(produce: Callable[[], Iterable[Dict[str, Any]]], loop: asyncio.AbstractEventLoop,
+                  queue: asyncio.Queue, stop: threading.Event, slots: threading.Semaphore) -> None:
+    """Producer thread body. Holds no reference to the ModelStream so an abandoned stream can be collected."""
+    def put(item: Any) -> bool:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+            return True
+        except RuntimeError:  # event loop closed
+            stop.set()
+            return False
+
+    gen = None
+    try:
+        gen = produce()
+        for chunk in gen:
+            # Backpressure: at most `maxsize` chunks in flight
+            while not slots.acquire(timeout=0.5):
+                if stop.is_set():
+                    return
+            if stop.is_set() or not put(chunk):
+                return
+        put(_DONE)
+    except Exception as exc:
+        put(exc)
+    finally:
+        close = getattr(gen, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                pass
+
+
+class ModelStream:
+    """Async iterator over the chunks of a blocking generator run on a daemon thread.
+
+    The producer hands each chunk to an asyncio.Queue with loop.call_soon_threadsafe, so
+    the consumer awaits chunks directly instead of polling a queue.Queue through the
+    default executor (one thread-pool hop per chunk, up to one poll timeout of latency).
+    should_stop is checked before every chunk; wake() makes a waiting consumer check it
+    immediately, so cancellation and guidance interrupts end the stream without waiting
+    for the next chunk. A producer exception is re-raised in the consumer.
+    """
+
+    def __init__(self, produce: Callable[[], Iterable[Dict[str, Any]]],
+                 should_stop: Optional[Callable[[], bool]] = None, maxsize: int = 256):
+        self._produce = produce
+        self._should_stop = should_stop or (lambda: False)
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._stop = threading.Event()
+        self._slots = threading.Semaphore(maxsize)
+        self._finished = False
+        self.interrupted = False  # ended by should_stop rather than by the stream
+        # Stop the producer if the consumer abandons the stream (e.g. raises out of its loop)
+        weakref.finalize(self, self._stop.set)
+
+    def start(self) -> "ModelStream":
+        threading.Thread(
+            target=_produce_into,
+            args=(self._produce, self._loop, self._queue, self._stop, self._slots),
+            name="model-stream",
+            daemon=True,
+        ).start()
+        return self
+
+    def wake(self) -> None:
+        """Thread-safe: make the consumer re-check should_stop now."""
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, _WAKE)
+        except RuntimeError:
+            pass
+
+    def stop(self) -> None:
+        """Stop the producer after its current chunk and end iteration."""
+        self._stop.set()
+        self._finished = True
+        self.wake()
+
+    def __aiter__(self) -> "ModelStream":
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        while True:
+            if self._finished:
+                raise StopAsyncIteration
+            if self._should_stop():
+                self.interrupted = True
+                self.stop()
+                raise StopAsyncIteration
+            item = await self._queue.get()
+            if item is _WAKE:
+                continue
+            if item is _DONE:
+                self._finished = True
+                raise StopAsyncIteration
+            if isinstance(item, BaseException):
+                self._finished = True
+                raise item
+            self._slots.release()
+            return item
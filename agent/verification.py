@@ -32,43 +32,49 @@ class VerificationMixin:
     # Project Rules
     # ------------------------------------------------------------------
     
+    def _project_rule_files(self) -> List[str]:
+        """Relative paths of the project rule files that exist, in load order.
+        Tries: .cursorrules, RULE.md, CLAUDE.md, .claude/CLAUDE.md,
+        .cursor/RULE.md, .cursor/rules/*.mdc, .cursor/rules/*.md."""
+        candidates = [".cursorrules", "RULE.md", "CLAUDE.md", ".claude/CLAUDE.md", ".cursor/RULE.md"]
+        # Check for .cursor/rules directory
+        cursor_rules_dir = os.path.join(self.working_directory, ".cursor", "rules")
+        if os.path.isdir(cursor_rules_dir):
+            try:
+                for fname in sorted(os.listdir(cursor_rules_dir)):
+                    if fname.endswith((".md", ".mdc")):
+                        candidates.append(f".cursor/rules/{fname}")
+            except Exception:
+                pass
+        return [p for p in candidates if os.path.isfile(os.path.join(self.working_directory, p))]
+
+    def _project_rules_signature(self) -> tuple:
+        """(path, mtime, size) of each rule file — changes whenever the rules would."""
+        sig = []
+        for path in self._project_rule_files():
+            try:
+                st = os.stat(os.path.join(self.working_directory, path))
+                sig.append((path, st.st_mtime_ns, st.st_size))
+            except OSError:
+                pass
+        return (self.working_directory, tuple(sig))
+
     def _load_project_rules(self) -> str:
         """Load project rule files and return concatenated content for system prompt.
-        Tries: .cursorrules, RULE.md, CLAUDE.md, .claude/CLAUDE.md,
-        .cursor/RULE.md, .cursor/rules/*.mdc, .cursor/rules/*.md.
         Capped at _PROJECT_RULES_MAX_CHARS."""
         parts: List[str] = []
         total = 0
-
-        def _add(path: str, label: str) -> None:
-            nonlocal total
+        for path in self._project_rule_files():
             if total >= self._PROJECT_RULES_MAX_CHARS:
-                return
-            full = os.path.join(self.working_directory, path)
-            if os.path.isfile(full):
-                try:
-                    with open(full, "r", encoding="utf-8", errors="ignore") as f:
-                        chunk = f.read().strip()
-                    if chunk:
-                        take = min(len(chunk), self._PROJECT_RULES_MAX_CHARS - total)
-                        parts.append(f"=== {label} ===\n{chunk[:take]}")
-                        total += take
-                except Exception:
-                    pass
-
-        _add(".cursorrules", "cursorrules")
-        _add("RULE.md", "RULE.md")
-        _add("CLAUDE.md", "CLAUDE.md")
-        _add(".claude/CLAUDE.md", ".claude/CLAUDE.md")
-        _add(".cursor/RULE.md", ".cursor/RULE.md")
-        
-        # Check for .cursor/rules directory
-        cursor_rules_dir = os.path.join(self.working_directory, ".cursor", "rules")
-        if os.path.isdir(cursor_rules_dir):
+                break
             try:
-                for fname in sorted(os.listdir(cursor_rules_dir)):
-                    if fname.endswith((".md", ".mdc")) and total < self._PROJECT_RULES_MAX_CHARS:
-                        _add(f".cursor/rules/{fname}", f".cursor/rules/{fname}")
+                with open(os.path.join(self.working_directory, path), "r", encoding="utf-8", errors="ignore") as f:
+                    chunk = f.read().strip()
+                if chunk:
+                    take = min(len(chunk), self._PROJECT_RULES_MAX_CHARS - total)
+                    label = path[1:] if path == ".cursorrules" else path
+                    parts.append(f"=== {label} ===\n{chunk[:take]}")
+                    total += take
             except Exception:
                 pass
 
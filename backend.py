@@ -26,7 +26,7 @@ class Backend(ABC):
 
     @abstractmethod
     def list_dir(self, path: str) -> List[Dict[str, Any]]:
-        """List entries in a directory. Returns list of {name, type, ext?, size?}."""
+        """List entries in a directory. Returns list of {name, type, ext?, size?, mtime?}."""
 
     @abstractmethod
     def read_file(self, path: str) -> str:
@@ -154,10 +154,12 @@ class LocalBackend(Backend):
                 entries.append({"name": name, "type": "directory"})
             elif os.path.isfile(child):
                 _, ext = os.path.splitext(name)
+                st = os.stat(child)
                 entries.append({
                     "name": name, "type": "file",
                     "ext": ext.lstrip("."),
-                    "size": os.path.getsize(child),
+                    "size": st.st_size,
+                    "mtime": st.st_mtime,
                 })
         return entries
 
@@ -528,22 +530,39 @@ class SSHBackend(Backend):
 
     def _exec(self, cmd: str, timeout: int = 30) -> Tuple[str, str, int]:
         """Execute a command on the remote host."""
+        stdout, stderr, rc = self._exec_bytes(cmd, timeout=timeout)
+        return stdout.decode("utf-8", errors="replace"), stderr, rc
+
+    def _exec_bytes(self, cmd: str, timeout: int = 30, stdin_data: Optional[bytes] = None,
+                    login_shell: bool = True) -> Tuple[bytes, str, int]:
+        """Execute a command on the remote host; stdout is returned as raw bytes.
+
+        stdin_data is written to the command's stdin before reading. Binary streams should pass
+        login_shell=False so output from shell profiles cannot corrupt them.
+        """
         with self._lock:
             self._reconnect_if_needed()
             # Source shell profile to ensure PATH and environment are set up correctly
             # This makes interactive shell commands (aliases, functions, PATH additions) available
-            wrapped_cmd = f"bash -l -c {shlex.quote(cmd)}"
-            _, stdout_ch, stderr_ch = self._client.exec_command(wrapped_cmd, timeout=timeout)
+            wrapped_cmd = f"bash {'-l ' if login_shell else ''}-c {shlex.quote(cmd)}"
+            stdin_ch, stdout_ch, stderr_ch = self._client.exec_command(wrapped_cmd, timeout=timeout)
         channel = stdout_ch.channel
         self._active_channel = channel  # track for cancel
         # Read OUTSIDE the lock — exec channels are independent of SFTP,
         # so we only need the lock to open the channel safely.
         channel.settimeout(timeout)
         stderr_ch.channel.settimeout(timeout)
+        if stdin_data is not None:
+            try:
+                stdin_ch.write(stdin_data)
+                stdin_ch.flush()
+                channel.shutdown_write()
+            except Exception:
+                pass
         try:
-            stdout = stdout_ch.read().decode("utf-8", errors="replace")
+            stdout = stdout_ch.read()
         except Exception:
-            stdout = ""
+            stdout = b""
         try:
             stderr = stderr_ch.read().decode("utf-8", errors="replace")
         except Exception:
@@ -555,6 +574,79 @@ class SSHBackend(Backend):
         self._active_channel = None
         return stdout, stderr, rc
 
+    def scan_files(self, prune_dirs: Any, exclude_globs: Any = (), with_hashes: bool = False,
+                   timeout: int = 120) -> Optional[List[Dict[str, Any]]]:
+        """List regular files under the working directory in one round trip.
+
+        Returns [{path, size, mtime, sha256?}] (paths relative, hidden entries and prune_dirs
+        skipped); the listing and sha256 digests are produced by find/sha256sum on the host and
+        gzip-compressed on the wire. Returns None when the host lacks GNU find/coreutils/gzip.
+        """
+        import gzip
+        wd = self._remote_path(".")
+        prune = " -o ".join(f"-name {shlex.quote(d)}" for d in sorted(prune_dirs))
+        find = "find . -mindepth 1 \\( -name '.*'" + (f" -o {prune}" if prune else "") + " \\) -prune -o -type f"
+        for glob in exclude_globs:
+            find += f" ! -name {shlex.quote(glob)}"
+        listing = find + " -printf '%s\\t%T@\\t%P\\0'"
+        if with_hashes:
+            listing += f"; printf '\\0==sha256==\\0'; {find} -print0 | xargs -0 -r sha256sum -z"
+        cmd = f"cd {shlex.quote(wd)} && {{ {listing}; }} 2>/dev/null | gzip -c"
+        out, err, rc = self._exec_bytes(cmd, timeout=timeout, login_shell=False)
+        try:
+            raw = gzip.decompress(out)
+        except Exception:
+            logger.debug("Remote scan unavailable (rc=%s): %s", rc, err.strip()[:200])
+            return None
+        stats_part, marker, hash_part = (b"\0" + raw).partition(b"\0==sha256==\0")
+        if with_hashes and not marker:
+            return None
+        files: Dict[str, Dict[str, Any]] = {}
+        for rec in stats_part.split(b"\0"):
+            parts = rec.decode("utf-8", errors="replace").split("\t", 2)
+            if len(parts) != 3 or not parts[2]:
+                continue
+            try:
+                files[parts[2]] = {"path": parts[2], "size": int(parts[0]), "mtime": float(parts[1])}
+            except ValueError:
+                continue
+        for rec in hash_part.split(b"\0"):
+            line = rec.decode("utf-8", errors="replace")
+            if len(line) < 67:
+                continue
+            # "<64 hex digits><space><space or *><path>"
+            path = line[66:]
+            if path.startswith("./"):
+                path = path[2:]
+            if path in files:
+                files[path]["sha256"] = line[:64]
+        return list(files.values())
+
+    def read_files(self, paths: List[str], timeout: int = 300) -> Dict[str, str]:
+        """Fetch many files in one round trip as a gzipped tar stream over the exec channel.
+        Returns {path: text}; files that cannot be read are left out."""
+        import io
+        import posixpath
+        import tarfile
+        safe = [p for p in paths if p and not posixpath.isabs(p) and not posixpath.normpath(p).startswith("..")]
+        if not safe:
+            return {}
+        wd = self._remote_path(".")
+        cmd = f"cd {shlex.quote(wd)} && tar -czf - --null --ignore-failed-read -T - 2>/dev/null"
+        out, err, rc = self._exec_bytes(cmd, timeout=timeout, login_shell=False,
+                                        stdin_data=b"\0".join(p.encode("utf-8") for p in safe) + b"\0")
+        if not out:
+            raise IOError(f"Bulk read failed (rc={rc}): {err.strip()[:200]}")
+        result: Dict[str, str] = {}
+        with tarfile.open(fileobj=io.BytesIO(out), mode="r:gz") as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                f = tar.extractfile(member)
+                if f is not None:
+                    result[member.name] = f.read().decode("utf-8", errors="replace")
+        return result
+
     def cancel_running_command(self) -> bool:
         """Kill the currently running SSH command, if any."""
         ch = getattr(self, "_active_channel", None)
@@ -607,7 +699,10 @@ class SSHBackend(Backend):
                 entries.append({"name": name, "type": "directory"})
             else:
                 ext = os.path.splitext(name)[1].lstrip(".")
-                entries.append({"name": name, "type": "file", "ext": ext, "size": attr.st_size or 0})
+                entries.append({
+                    "name": name, "type": "file", "ext": ext,
+                    "size": attr.st_size or 0, "mtime": float(attr.st_mtime or 0),
+                })
         return entries
 
     def read_file(self, path: str) -> str:
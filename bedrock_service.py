@@ -17,6 +17,9 @@ DATA PRIVACY:
 import boto3
 import json
 import logging
+import random
+import threading
+import time
 from typing import Generator, List, Dict, Optional, Any
 from botocore.exceptions import ClientError, NoCredentialsError, PartialCredentialsError
 from botocore.config import Config
@@ -74,6 +77,13 @@ class GenerationConfig:
     # Whether to stream thinking content
     stream_thinking: bool = True
 
+    # Messages before this index won't be rewritten by history trimming before the
+    # next request; one prompt-cache breakpoint is anchored inside that prefix.
+    cache_stable_prefix: Optional[int] = None
+    # Per-turn context (todos, reminders) kept out of the cached prompt: sent after the
+    # last cache breakpoint, or appended to the system prompt when caching is off.
+    volatile_context: Optional[str] = None
+
 
 @dataclass
 class ThinkingBlock:
@@ -102,6 +112,121 @@ class GenerationResult:
     output_tokens: int = 0
 
 
+# Anthropic allows at most 4 cache_control breakpoints per request
+_MAX_CACHE_BREAKPOINTS = 4
+
+# Error codes worth retrying an embedding batch for (everything else fails the batch immediately)
+_EMBED_RETRYABLE_CODES = {
+    "ThrottlingException", "TooManyRequestsException", "ServiceUnavailableException",
+    "ModelNotReadyException", "ModelTimeoutException", "InternalServerException",
+}
+
+
+class _EmbedRateLimiter:
+    """Token bucket shared by every BedrockService in the process (the quota is per account).
+
+    Throttling halves the refill rate; each success adds back a small step
+    until the configured rate is reached (AIMD).
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.max_rate = max(0.1, rate)
+        self.rate = self.max_rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def on_throttle(self) -> None:
+        with self._lock:
+            self.rate = max(0.2, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+_embed_limiter: Optional[_EmbedRateLimiter] = None
+_embed_limiter_lock = threading.Lock()
+
+
+def _get_embed_limiter() -> _EmbedRateLimiter:
+    global _embed_limiter
+    with _embed_limiter_lock:
+        if _embed_limiter is None:
+            _embed_limiter = _EmbedRateLimiter(
+                rate=getattr(app_config, "embedding_requests_per_second", 10.0),
+                burst=getattr(app_config, "embedding_max_concurrency", 4),
+            )
+        return _embed_limiter
+
+
+# Process-wide boto3 clients keyed by (service, region, credentials). botocore clients are
+# thread-safe, so agents, indexers and KB lookups share one client per key and with it
+# the HTTP connection pool — no fresh TLS handshake for each new BedrockService.
+_clients: Dict[tuple, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def _client_config() -> Config:
+    return Config(
+        connect_timeout=aws_config.connect_timeout,
+        read_timeout=aws_config.read_timeout,
+        retries={"max_attempts": getattr(aws_config, "max_attempts", 3), "mode": "adaptive"},
+        max_pool_connections=getattr(aws_config, "max_pool_connections", 50),
+        tcp_keepalive=getattr(aws_config, "tcp_keepalive", True),
+    )
+
+
+def get_client(service_name: str, region: str, credentials: Optional[Dict[str, str]] = None) -> Any:
+    """Shared boto3 client for ``service_name`` in ``region``.
+
+    ``credentials`` (aws_access_key_id / aws_secret_access_key / aws_session_token)
+    overrides the configured profile or keys.
+    """
+    if credentials:
+        session_kwargs: Dict[str, Any] = {k: v for k, v in credentials.items() if v}
+    elif aws_config.has_profile():
+        session_kwargs = {"profile_name": aws_config.profile_name}
+    elif aws_config.has_explicit_credentials():
+        session_kwargs = {
+            "aws_access_key_id": aws_config.access_key_id,
+            "aws_secret_access_key": aws_config.secret_access_key,
+        }
+        if aws_config.has_session_token():
+            session_kwargs["aws_session_token"] = aws_config.session_token
+    else:
+        session_kwargs = {}
+    key = (service_name, region, tuple(sorted(session_kwargs.items())))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            load_dotenv(env_path, override=True)
+            session = boto3.Session(region_name=region, **session_kwargs)
+            client = session.client(service_name, config=_client_config())
+            _clients[key] = client
+        return client
+
+
+def clear_clients() -> None:
+    """Drop the shared clients (e.g. after credentials change); new ones are created on demand."""
+    with _clients_lock:
+        _clients.clear()
+
+
 class BedrockService:
     """
     Service class for Amazon Bedrock interactions.
@@ -117,32 +242,14 @@ class BedrockService:
         self.region = region or aws_config.region
 
         self.client = self._create_client()
+        # Throughput of the most recent multi-batch embed_texts call (see _record_embed_run)
+        self.last_embed_run: Dict[str, Any] = {}
         logger.info(f"BedrockService initialized with model: {self.model_id}")
     
     def _create_client(self) -> Any:
-        """Create and configure the Bedrock runtime client"""
-        load_dotenv(env_path, override=True)
+        """Return the shared Bedrock runtime client for this region"""
         try:
-            session_kwargs = {"region_name": self.region}
-            
-            if aws_config.has_profile():
-                session_kwargs["profile_name"] = aws_config.profile_name
-            elif aws_config.has_explicit_credentials():
-                session_kwargs["aws_access_key_id"] = aws_config.access_key_id
-                session_kwargs["aws_secret_access_key"] = aws_config.secret_access_key
-                if aws_config.has_session_token():
-                    session_kwargs["aws_session_token"] = aws_config.session_token
-            
-            # Configure timeouts for Bedrock API calls
-            boto_config = Config(
-                connect_timeout=aws_config.connect_timeout,
-                read_timeout=aws_config.read_timeout,
-                retries={'max_attempts': 3, 'mode': 'adaptive'}
-            )
-            
-            session = boto3.Session(**session_kwargs)
-            return session.client("bedrock-runtime", config=boto_config)
-            
+            return get_client("bedrock-runtime", self.region)
         except NoCredentialsError:
             raise BedrockError("AWS credentials not configured.")
         except Exception as e:
@@ -156,23 +263,16 @@ class BedrockService:
     ):
         """Refresh the client with new credentials"""
         try:
-            session_kwargs = {"region_name": self.region}
-            
+            credentials = None
             if access_key_id and secret_access_key:
-                session_kwargs["aws_access_key_id"] = access_key_id
-                session_kwargs["aws_secret_access_key"] = secret_access_key
-                if session_token:
-                    session_kwargs["aws_session_token"] = session_token
+                credentials = {
+                    "aws_access_key_id": access_key_id,
+                    "aws_secret_access_key": secret_access_key,
+                    "aws_session_token": session_token or "",
+                }
             
-            # Configure timeouts for Bedrock API calls
-            boto_config = Config(
-                connect_timeout=aws_config.connect_timeout,
-                read_timeout=aws_config.read_timeout,
-                retries={'max_attempts': 3, 'mode': 'adaptive'}
-            )
-
-            session = boto3.Session(**session_kwargs)
-            self.client = session.client("bedrock-runtime", config=boto_config)
+            clear_clients()
+            self.client = get_client("bedrock-runtime", self.region, credentials)
             logger.info("Credentials refreshed successfully")
             set_key(env_path, "AWS_ACCESS_KEY_ID", access_key_id)
             set_key(env_path, "AWS_SECRET_ACCESS_KEY", secret_access_key)
@@ -209,6 +309,29 @@ class BedrockService:
             return "mistral"
         return "anthropic"
     
+    @staticmethod
+    def _cache_breakpoint_indices(messages: List[Dict], stable_prefix: Optional[int]) -> List[int]:
+        """User-message indices for history cache breakpoints, most valuable first.
+
+        1. The last message: writes the newest prefix for the next turn to read.
+        2. The user message before the last assistant turn: what the previous
+           turn wrote, so it is read back even if this turn added many blocks.
+        3. The last user message inside ``stable_prefix``: survives the history
+           trimming that rewrites recent messages, so trimmed turns still hit.
+        """
+        user_idx = [i for i, m in enumerate(messages) if m["role"] == "user"]
+        if not user_idx:
+            return []
+        picks = [user_idx[-1]]
+        prev = [i for i in user_idx if i < picks[0] - 1]
+        if prev:
+            picks.append(prev[-1])
+        if stable_prefix is not None:
+            anchor = [i for i in user_idx if i < stable_prefix]
+            if anchor and anchor[-1] not in picks:
+                picks.append(anchor[-1])
+        return picks
+
     def _format_messages_anthropic(
         self,
         messages: List[Dict],
@@ -255,41 +378,43 @@ class BedrockService:
                 })
         
         # --- Conversation-level prompt caching ---
-        # Add cache_control breakpoint on the last user message so all
-        # prior messages are cached by the API between turns. This is the
-        # single biggest latency/cost optimisation for long conversations.
-        if use_cache and len(formatted_messages) >= 3:
+        # Rolling breakpoints on the history so each turn reads the prefix the
+        # previous turn wrote. The system prompt breakpoint also covers the tools
+        # (cache prefix order is tools -> system -> messages), so the tools only get
+        # their own breakpoint when there is no system prompt.
+        if use_cache and formatted_messages:
             ttl_options = get_cache_ttl_options(model_id)
             msg_cache_ctrl: Dict[str, Any] = {"type": "ephemeral"}
             if "1h" in ttl_options:
                 msg_cache_ctrl["ttl"] = "1h"
-            
-            # Find the second-to-last user message (the last one that won't change)
-            # We skip the very last message because it's the new turn.
-            target_idx = None
-            for i in range(len(formatted_messages) - 2, -1, -1):
-                if formatted_messages[i]["role"] == "user":
-                    target_idx = i
-                    break
-            
-            if target_idx is not None:
-                content = formatted_messages[target_idx]["content"]
+            slots = _MAX_CACHE_BREAKPOINTS - (1 if (system_prompt or tools) else 0)
+            for idx in self._cache_breakpoint_indices(formatted_messages, config.cache_stable_prefix)[:slots]:
+                content = formatted_messages[idx]["content"]
                 # Content can be a string or a list of blocks
                 if isinstance(content, str):
-                    formatted_messages[target_idx]["content"] = [{
+                    formatted_messages[idx]["content"] = [{
                         "type": "text",
                         "text": content,
                         "cache_control": msg_cache_ctrl,
                     }]
-                elif isinstance(content, list):
+                elif isinstance(content, list) and content and isinstance(content[-1], dict):
                     # Add cache_control to the last block in the content
-                    content_copy = [dict(b) if isinstance(b, dict) else b for b in content]
-                    if content_copy:
-                        last_block = content_copy[-1]
-                        if isinstance(last_block, dict):
-                            last_block["cache_control"] = msg_cache_ctrl
-                    formatted_messages[target_idx]["content"] = content_copy
-        
+                    content_copy = list(content)
+                    content_copy[-1] = {**content_copy[-1], "cache_control": msg_cache_ctrl}
+                    formatted_messages[idx]["content"] = content_copy
+
+        # Volatile context rides after the last breakpoint on the final user message, so
+        # it changes without invalidating the cached system prompt or history
+        volatile = (config.volatile_context or "").strip()
+        if volatile:
+            if use_cache and formatted_messages and formatted_messages[-1]["role"] == "user":
+                last = formatted_messages[-1]["content"]
+                if isinstance(last, str):
+                    last = [{"type": "text", "text": last}]
+                formatted_messages[-1]["content"] = list(last) + [{"type": "text", "text": volatile}]
+            else:
+                system_prompt = (system_prompt + "\n\n" + volatile) if system_prompt else volatile
+
         max_output = get_max_output_tokens(model_id)
         effective_max_tokens = min(config.max_tokens, max_output)
         
@@ -401,7 +526,7 @@ class BedrockService:
         
         # --- Tools with prompt caching on the last tool ---
         if tools:
-            if use_cache and len(tools) > 0:
+            if use_cache and not system_prompt:
                 # Deep copy the last tool and add cache_control
                 cached_tools = [dict(t) for t in tools]
                 ttl_options = get_cache_ttl_options(model_id)
@@ -716,28 +841,54 @@ class BedrockService:
         input_type: str = "search_document",
         model_id: Optional[str] = None,
     ) -> List[List[float]]:
-        """Embed texts using Bedrock Cohere Embed. Batches to stay under 2048 chars per call.
-        input_type: 'search_document' for corpus, 'search_query' for queries."""
-        from config import app_config
+        """Embed texts using Bedrock Cohere Embed. Returns one vector per input, in input order.
+        input_type: 'search_document' for corpus, 'search_query' for queries.
+
+        Batches run concurrently (EMBEDDING_MAX_CONCURRENCY in flight) behind a process-wide
+        token bucket. Throttled or transiently failing batches are retried with backoff; a
+        batch that still fails yields empty lists so callers can skip and retry those texts
+        later instead of indexing placeholder vectors."""
+        from concurrent.futures import ThreadPoolExecutor
         embed_model = model_id or getattr(app_config, "embedding_model_id", "cohere.embed-english-v3")
-        # Cohere limit: 2048 chars total per request, 96 texts; ~512 tokens per text recommended
-        batch_size = 8
-        char_limit = 1800
-        all_embeddings: List[List[float]] = []
-        i = 0
-        while i < len(texts):
-            batch = []
-            batch_chars = 0
-            while i < len(texts) and len(batch) < batch_size and batch_chars + len(texts[i]) <= char_limit:
-                t = texts[i][:1500]
-                batch.append(t)
-                batch_chars += len(t)
-                i += 1
-            if not batch:
-                t = texts[i][:1500]
-                batch.append(t)
-                i += 1
-            body = json.dumps({"texts": batch, "input_type": input_type})
+        batch_size = max(1, getattr(app_config, "embedding_batch_size", 96))
+        # ~512 tokens per text recommended; index chunks are already capped at 1500 chars
+        batches = [
+            [t[:1500] for t in texts[i:i + batch_size]]
+            for i in range(0, len(texts), batch_size)
+        ]
+        if not batches:
+            return []
+        stats = {"retries": 0, "throttled": 0, "failed_batches": 0}
+        stats_lock = threading.Lock()
+
+        def _run(batch: List[str]) -> List[List[float]]:
+            return self._embed_batch_with_retry(batch, input_type, embed_model, stats, stats_lock)
+
+        started = time.monotonic()
+        if len(batches) == 1:
+            results = [_run(batches[0])]
+        else:
+            workers = max(1, min(getattr(app_config, "embedding_max_concurrency", 4), len(batches)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed") as pool:
+                results = list(pool.map(_run, batches))
+        all_embeddings = [vec for batch_result in results for vec in batch_result]
+        if len(batches) > 1:
+            self._record_embed_run(len(texts), len(batches), time.monotonic() - started, stats)
+        return all_embeddings
+
+    def _embed_batch_with_retry(
+        self,
+        batch: List[str],
+        input_type: str,
+        embed_model: str,
+        stats: Dict[str, int],
+        stats_lock: Any,
+    ) -> List[List[float]]:
+        limiter = _get_embed_limiter()
+        max_retries = max(0, getattr(app_config, "embedding_max_retries", 5))
+        body = json.dumps({"texts": batch, "input_type": input_type})
+        for attempt in range(max_retries + 1):
+            limiter.acquire()
             try:
                 response = self.client.invoke_model(
                     modelId=embed_model,
@@ -747,16 +898,50 @@ class BedrockService:
                 )
                 response_body = json.loads(response["body"].read())
                 embeddings = response_body.get("embeddings")
-                if isinstance(embeddings, list) and embeddings and isinstance(embeddings[0], list):
-                    all_embeddings.extend(embeddings)
-                elif isinstance(embeddings, dict) and "float" in embeddings:
-                    all_embeddings.extend(embeddings["float"])
-                else:
-                    all_embeddings.extend([[]] * len(batch))
+                if isinstance(embeddings, dict) and "float" in embeddings:
+                    embeddings = embeddings["float"]
+                if isinstance(embeddings, list) and len(embeddings) == len(batch):
+                    limiter.on_success()
+                    return embeddings
+                logger.warning("Embed API returned an unexpected payload for %d texts", len(batch))
+                break
             except ClientError as e:
-                logger.warning(f"Embed API error: {e}")
-                all_embeddings.extend([[0.0] * 1024 for _ in batch])
-        return all_embeddings
+                code = e.response.get("Error", {}).get("Code", "")
+                if code not in _EMBED_RETRYABLE_CODES or attempt == max_retries:
+                    logger.warning(f"Embed API error: {e}")
+                    break
+                if code in ("ThrottlingException", "TooManyRequestsException"):
+                    limiter.on_throttle()
+                    with stats_lock:
+                        stats["throttled"] += 1
+            except Exception as e:
+                # Connection resets / read timeouts
+                if attempt == max_retries:
+                    logger.warning(f"Embed request failed: {e}")
+                    break
+            with stats_lock:
+                stats["retries"] += 1
+            time.sleep(min(20.0, 0.5 * (2 ** attempt)) * (0.5 + random.random()))
+        with stats_lock:
+            stats["failed_batches"] += 1
+        return [[] for _ in batch]
+
+    def _record_embed_run(self, n_texts: int, n_batches: int, seconds: float, stats: Dict[str, int]) -> None:
+        self.last_embed_run = {
+            "texts": n_texts,
+            "batches": n_batches,
+            "seconds": round(seconds, 3),
+            "texts_per_second": round(n_texts / seconds, 1) if seconds > 0 else 0.0,
+            "retries": stats["retries"],
+            "throttled": stats["throttled"],
+            "failed_batches": stats["failed_batches"],
+            "rate_limit": round(_get_embed_limiter().rate, 2),
+        }
+        logger.info(
+            "Embedded %d texts in %d batches: %.1fs (%.1f texts/s, %d retries, %d throttled, %d failed)",
+            n_texts, n_batches, seconds, self.last_embed_run["texts_per_second"],
+            stats["retries"], stats["throttled"], stats["failed_batches"],
+        )
 
     # ------------------------------------------------------------------
     # Token Counting API
@@ -863,10 +1048,7 @@ class BedrockService:
         if not knowledge_base_id:
             return []
         try:
-            kb_client = boto3.client(
-                "bedrock-agent-runtime",
-                region_name=self.region,
-            )
+            kb_client = get_client("bedrock-agent-runtime", self.region)
             response = kb_client.retrieve(
                 knowledgeBaseId=knowledge_base_id,
                 retrievalQuery={"text": query},
@@ -908,7 +1090,7 @@ class BedrockService:
         if not pid:
             return None
         try:
-            agent_client = boto3.client("bedrock-agent", region_name=self.region)
+            agent_client = get_client("bedrock-agent", self.region)
             kwargs: Dict[str, Any] = {"promptIdentifier": pid}
             if pver:
                 kwargs["promptVersion"] = pver
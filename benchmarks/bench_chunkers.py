@@ -0,0 +1,108 @@
+"""
+Micro-benchmark for the regex chunkers in codebase_index (JS/TS and Java).
+
+Generates bundled-style sources of increasing size and times each chunker.
+Linear chunkers keep a flat MB/s as the size doubles; a quadratic one halves.
+
+    python benchmarks/bench_chunkers.py                 # 1, 2, 4 MB
+    python benchmarks/bench_chunkers.py --sizes 2 8 --json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from codebase_index import _chunk_java, _chunk_js_ts  # noqa: E402
+
+
+def _gen_js(target_bytes: int, rnd: random.Random) -> str:
+    out: List[str] = []
+    size = 0
+    i = 0
+    while size < target_bytes:
+        block = [
+            rnd.choice([f"export function handler{i}(req, res) {{", f"class Widget{i} {{",
+                        f"const compute{i} = (x) => {{", f"async function load{i}() {{"]),
+        ]
+        for _ in range(rnd.randint(3, 30)):
+            block.append(rnd.choice(["  const v = req.body[0];", "  if (v) { return v; }",
+                                     "  return fetch('/api/x').then(r => r.json());", ""]))
+        block.append("}")
+        text = "\n".join(block) + "\n"
+        out.append(text)
+        size += len(text)
+        i += 1
+    return "".join(out)
+
+
+def _gen_java(target_bytes: int, rnd: random.Random) -> str:
+    out: List[str] = ["package com.example.generated;\n", "import java.util.List;\n"]
+    size = 0
+    i = 0
+    while size < target_bytes:
+        block = [f"public class Generated{i} {{"]
+        for m in range(rnd.randint(1, 8)):
+            block.append(f"    public int method{m}(int x) throws Exception {{")
+            for _ in range(rnd.randint(2, 12)):
+                block.append(rnd.choice(["        x += 1;", "        if (x > 3) { x -= 2; }",
+                                         "        List<String> s = List.of(\"a\");", ""]))
+            block.append("        return x;")
+            block.append("    }")
+        block.append("}")
+        text = "\n".join(block) + "\n"
+        out.append(text)
+        size += len(text)
+        i += 1
+    return "".join(out)
+
+
+def _time(fn: Callable[[str], Any], content: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(content)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(sizes_mb: List[float], repeat: int, seed: int) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = []
+    for name, gen, fn in (("js_ts", _gen_js, _chunk_js_ts), ("java", _gen_java, _chunk_java)):
+        for mb in sizes_mb:
+            content = gen(int(mb * 1024 * 1024), random.Random(seed))
+            secs = _time(fn, content, repeat)
+            results.append({
+                "chunker": name,
+                "mb": round(len(content) / (1024 * 1024), 2),
+                "chunks": len(fn(content)),
+                "seconds": round(secs, 4),
+                "mb_per_s": round(len(content) / (1024 * 1024) / secs, 2) if secs else None,
+            })
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the JS/TS and Java chunkers on multi-MB sources")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 2, 4], help="source sizes in MB")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size (best is reported)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat, args.seed)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'chunker':<8} {'MB':>6} {'chunks':>8} {'seconds':>9} {'MB/s':>8}")
+    for r in results:
+        print(f"{r['chunker']:<8} {r['mb']:>6} {r['chunks']:>8} {r['seconds']:>9} {r['mb_per_s']:>8}")
+
+
+if __name__ == "__main__":
+    main()
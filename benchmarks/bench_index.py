@@ -0,0 +1,290 @@
+"""
+End-to-end benchmark for CodebaseIndex: build, rebuild and query a synthetic repository.
+
+Generates a Python/JS/Java project of configurable size in a temporary directory and
+indexes it with a deterministic local embedding function (feature-hashed tokens, no
+Bedrock calls), so runs are reproducible and comparable across commits.
+
+Reports cold build, warm rebuild (nothing changed), incremental rebuild (a few files
+edited), load-from-disk time, per-mode query latency p50/p99, process memory and the
+on-disk index size.
+
+    python benchmarks/bench_index.py                       # 600 files, human-readable
+    python benchmarks/bench_index.py --files 5000 --json   # machine-readable, for tracking
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import LocalBackend  # noqa: E402
+from config import app_config  # noqa: E402
+
+# Keep runs hermetic: no shared on-disk embedding cache makes a cold build look warm
+app_config.embedding_cache_enabled = False
+
+import codebase_index  # noqa: E402
+from codebase_index import CodebaseIndex  # noqa: E402
+
+_WORDS = ["user", "order", "payment", "invoice", "session", "token", "cache", "config", "report",
+          "account", "cart", "shipment", "price", "refund", "audit", "email", "queue", "retry"]
+_VERBS = ["get", "load", "save", "validate", "parse", "build", "send", "compute", "find", "update"]
+# Files land in several top-level directories so the sharded vector store is exercised
+_PACKAGES = ["src/core", "src/api", "services/billing", "services/shipping", "lib", "tools"]
+_TOKEN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+def make_hash_embed(dim: int) -> Callable[..., List[List[float]]]:
+    """Deterministic bag-of-tokens embedding via feature hashing (stable across processes)."""
+    def embed(texts: List[str], input_type: str = "search_document") -> List[List[float]]:
+        out = []
+        for text in texts:
+            vec = [0.0] * dim
+            for tok in _TOKEN_RE.findall(text.lower()):
+                h = zlib.crc32(tok.encode("utf-8"))
+                vec[h % dim] += 1.0 if (h >> 16) & 1 else -1.0
+            if not any(vec):
+                vec[0] = 1.0
+            out.append(vec)
+        return out
+    return embed
+
+
+def _name(rnd: random.Random) -> str:
+    return rnd.choice(_VERBS) + "_" + rnd.choice(_WORDS) + "_" + rnd.choice(_WORDS)
+
+
+def _camel(snake: str) -> str:
+    head, *rest = snake.split("_")
+    return head + "".join(p.title() for p in rest)
+
+
+def _gen_python(i: int, rnd: random.Random, modules: List[str]) -> str:
+    lines = [f"import {m}" for m in rnd.sample(modules, min(3, len(modules)))] + ["", ""]
+    for f in range(rnd.randint(3, 12)):
+        name = f"{_name(rnd)}_{i}_{f}"
+        lines.append(f"def {name}(data, limit=10):")
+        lines.append(f'    """{name.replace("_", " ")} for the {rnd.choice(_WORDS)} workflow."""')
+        for _ in range(rnd.randint(2, 15)):
+            lines.append(f"    data = [x for x in data if x.{rnd.choice(_WORDS)} < limit]")
+        lines.append("    return data")
+        lines.append("")
+    lines.append(f"class {rnd.choice(_WORDS).title()}Service{i}:")
+    for m in range(rnd.randint(1, 5)):
+        lines.append(f"    def {_name(rnd)}(self, item):")
+        lines.append(f"        return item.{rnd.choice(_WORDS)} * {m}")
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def _gen_js(i: int, rnd: random.Random) -> str:
+    lines = [f"import {{ {_camel(_name(rnd))} }} from './util{i % 7}';", ""]
+    for f in range(rnd.randint(3, 10)):
+        lines.append(f"export function {_camel(_name(rnd))}{i}_{f}(req, res) {{")
+        for _ in range(rnd.randint(2, 12)):
+            lines.append(f"  const {rnd.choice(_WORDS)} = req.body.{rnd.choice(_WORDS)} || null;")
+        lines.append("  return res.json({ ok: true });")
+        lines.append("}")
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def _gen_java(i: int, rnd: random.Random) -> str:
+    cls = f"{rnd.choice(_WORDS).title()}Handler{i}"
+    lines = ["package com.example.generated;", "", "import java.util.List;", "", f"public class {cls} {{"]
+    for _ in range(rnd.randint(2, 8)):
+        lines.append(f"    public int {_camel(_name(rnd))}(List<Integer> items) {{")
+        lines.append("        int total = 0;")
+        for _ in range(rnd.randint(2, 10)):
+            lines.append(f"        if (items.size() > {rnd.randint(1, 9)}) {{ total += items.get(0); }}")
+        lines.append("        return total;")
+        lines.append("    }")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def generate_repo(root: str, n_files: int, langs: List[str], seed: int) -> List[str]:
+    """Write n_files synthetic sources under root; returns their relative paths."""
+    rnd = random.Random(seed)
+    modules = [f"mod_{k}" for k in range(max(1, n_files // 4))]
+    paths: List[str] = []
+    for i in range(n_files):
+        lang = langs[i % len(langs)]
+        pkg = _PACKAGES[i % len(_PACKAGES)]
+        if lang == "py":
+            rel, content = f"{pkg}/mod_{i}.py", _gen_python(i, rnd, modules)
+        elif lang == "js":
+            rel, content = f"{pkg}/web/handler{i}.js", _gen_js(i, rnd)
+        else:
+            rel, content = f"{pkg}/java/Handler{i}.java", _gen_java(i, rnd)
+        full = os.path.join(root, rel)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        with open(full, "w", encoding="utf-8") as f:
+            f.write(content)
+        paths.append(rel)
+    return paths
+
+
+def make_queries(n: int, seed: int) -> List[str]:
+    rnd = random.Random(seed + 1)
+    out = []
+    for q in range(n):
+        if q % 2:
+            out.append(f"where do we {rnd.choice(_VERBS)} the {rnd.choice(_WORDS)} {rnd.choice(_WORDS)} (#{q})")
+        else:
+            out.append(f"{_camel(_name(rnd))} {rnd.choice(_WORDS)}")
+    return out
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def _rss_mb() -> Optional[float]:
+    """Current resident set size (Linux /proc), None elsewhere."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except Exception:
+        return None
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except Exception:
+        return None
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+def _timed(fn: Callable[[], Any]) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def run(n_files: int, langs: List[str], n_queries: int, dim: int, top_k: int,
+        edit_fraction: float, seed: int, workdir: Optional[str] = None) -> Dict[str, Any]:
+    root = workdir or tempfile.mkdtemp(prefix="bench-index-")
+    index_dir = os.path.join(root, ".bedrock-codex", "index")
+    embed = make_hash_embed(dim)
+    try:
+        paths = generate_repo(root, n_files, langs, seed)
+        backend = LocalBackend(root)
+        rss_before = _rss_mb()
+
+        idx = CodebaseIndex(root, index_dir=index_dir, embed_fn=embed)
+        build_s = _timed(lambda: idx.build(backend, force_reindex=True))
+        rss_after_build = _rss_mb()
+        warm_s = _timed(lambda: idx.build(backend))
+
+        rnd = random.Random(seed + 2)
+        edited = rnd.sample(paths, max(1, int(len(paths) * edit_fraction)))
+        for rel in edited:
+            with open(os.path.join(root, rel), "a", encoding="utf-8") as f:
+                f.write("\n// edited\n" if not rel.endswith(".py") else "\n# edited\n")
+        incremental_s = _timed(lambda: idx.build(backend))
+
+        loaded = CodebaseIndex(root, index_dir=index_dir, embed_fn=embed)
+        load_s = _timed(loaded.load_from_disk)
+        cold_warm_s = _timed(lambda: loaded.build(backend))
+
+        queries = make_queries(n_queries, seed)
+        latency: Dict[str, Dict[str, float]] = {}
+        for mode in ("vector", "lexical", "hybrid"):
+            codebase_index.get_query_cache()._entries.clear()
+            samples = []
+            for q in queries:
+                t0 = time.perf_counter()
+                loaded.retrieve(q, top_k=top_k, mode=mode)
+                samples.append((time.perf_counter() - t0) * 1000.0)
+            latency[mode] = {
+                "p50_ms": round(_percentile(samples, 50), 3),
+                "p99_ms": round(_percentile(samples, 99), 3),
+                "mean_ms": round(sum(samples) / len(samples), 3) if samples else 0.0,
+            }
+
+        stats = loaded.stats()
+        return {
+            "config": {"files": n_files, "langs": langs, "queries": n_queries, "dim": dim,
+                       "top_k": top_k, "edited_files": len(edited), "seed": seed},
+            "index": {"chunks": stats["chunks"], "embedded_chunks": stats["embedded_chunks"],
+                      "files": stats["files"], "shards": stats.get("shards"), "ann": stats["ann"],
+                      "quantization": stats["quantization"]},
+            "build_s": round(build_s, 3),
+            "warm_rebuild_s": round(warm_s, 3),
+            "incremental_rebuild_s": round(incremental_s, 3),
+            "load_s": round(load_s, 3),
+            "load_and_rebuild_s": round(cold_warm_s, 3),
+            "query": latency,
+            "memory": {"rss_before_mb": rss_before, "rss_after_build_mb": rss_after_build,
+                       "rss_end_mb": _rss_mb(), "peak_rss_mb": _peak_rss_mb()},
+            "disk_bytes": _dir_size(index_dir),
+        }
+    finally:
+        if workdir is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark CodebaseIndex build, rebuild and query performance")
+    parser.add_argument("--files", type=int, default=600, help="number of synthetic source files")
+    parser.add_argument("--langs", nargs="+", choices=["py", "js", "java"], default=["py", "js", "java"])
+    parser.add_argument("--queries", type=int, default=200, help="queries per retrieval mode")
+    parser.add_argument("--dim", type=int, default=256, help="embedding dimension of the fake embedder")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--edit-fraction", type=float, default=0.02, help="share of files edited before the incremental rebuild")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="generate the repository here and keep it (default: temporary, removed)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+    result = run(args.files, args.langs, args.queries, args.dim, args.top_k,
+                 args.edit_fraction, args.seed, workdir=args.workdir)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    idx = result["index"]
+    print(f"files={result['config']['files']} chunks={idx['chunks']} shards={idx['shards']} "
+          f"ann={idx['ann']} quantization={idx['quantization']}")
+    for key in ("build_s", "warm_rebuild_s", "incremental_rebuild_s", "load_s", "load_and_rebuild_s"):
+        print(f"{key:<22} {result[key]:>9}")
+    print(f"{'mode':<8} {'p50 ms':>9} {'p99 ms':>9} {'mean ms':>9}")
+    for mode, q in result["query"].items():
+        print(f"{mode:<8} {q['p50_ms']:>9} {q['p99_ms']:>9} {q['mean_ms']:>9}")
+    mem = result["memory"]
+    print(f"rss after build {mem['rss_after_build_mb']} MB, peak {mem['peak_rss_mb']} MB, "
+          f"index on disk {result['disk_bytes'] / (1024 * 1024):.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
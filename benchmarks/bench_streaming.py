@@ -0,0 +1,145 @@
+"""
+Micro-benchmark for the thread -> event loop bridge used to consume model streams.
+
+Compares the previous bridge (queue.Queue polled through run_in_executor with a 0.25 s
+timeout) with agent.streaming.ModelStream (asyncio.Queue fed by call_soon_threadsafe) on a
+synthetic token stream: per-chunk overhead and how long a cancel takes to end the stream
+while the producer is idle between chunks.
+
+    python benchmarks/bench_streaming.py
+    python benchmarks/bench_streaming.py --chunks 50000 --json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.streaming import ModelStream  # noqa: E402
+
+_POLL_TIMEOUT = object()
+
+
+def _tokens(n: int, gap: float = 0.0) -> Iterator[Dict[str, Any]]:
+    for i in range(n):
+        if gap:
+            time.sleep(gap)
+        yield {"type": "text", "content": f"tok{i} "}
+
+
+async def _legacy_consume(produce, should_stop) -> int:
+    """The queue.Queue + run_in_executor polling loop the agent used before ModelStream."""
+    chunk_queue: queue.Queue = queue.Queue(maxsize=256)
+    stop = threading.Event()
+
+    def producer():
+        try:
+            for c in produce():
+                if stop.is_set():
+                    break
+                chunk_queue.put(c)
+            chunk_queue.put(None)
+        except Exception as exc:
+            chunk_queue.put(exc)
+
+    threading.Thread(target=producer, daemon=True).start()
+    loop = asyncio.get_running_loop()
+
+    def poll():
+        try:
+            return chunk_queue.get(timeout=0.25)
+        except queue.Empty:
+            return _POLL_TIMEOUT
+
+    n = 0
+    while True:
+        if should_stop():
+            stop.set()
+            break
+        chunk = await loop.run_in_executor(None, poll)
+        if chunk is _POLL_TIMEOUT:
+            continue
+        if chunk is None:
+            break
+        n += 1
+    return n
+
+
+async def _adapter_consume(produce, should_stop, streams: List[ModelStream]) -> int:
+    stream = ModelStream(produce, should_stop=should_stop).start()
+    streams.append(stream)
+    n = 0
+    async for _ in stream:
+        n += 1
+    return n
+
+
+async def _throughput(kind: str, n_chunks: int) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    if kind == "legacy":
+        got = await _legacy_consume(lambda: _tokens(n_chunks), lambda: False)
+    else:
+        got = await _adapter_consume(lambda: _tokens(n_chunks), lambda: False, [])
+    secs = time.perf_counter() - t0
+    return {"bridge": kind, "chunks": got, "seconds": round(secs, 4),
+            "us_per_chunk": round(secs / max(1, got) * 1e6, 2)}
+
+
+async def _cancel_latency(kind: str, trials: int) -> Dict[str, Any]:
+    """Cancel while the producer waits on the model (a 2 s gap between chunks)."""
+    samples = []
+    for _ in range(trials):
+        cancelled = {"flag": False, "at": 0.0}
+        streams: List[ModelStream] = []
+        should_stop = lambda: cancelled["flag"]  # noqa: E731
+        produce = lambda: _tokens(3, gap=2.0)  # noqa: E731
+        if kind == "legacy":
+            task = asyncio.ensure_future(_legacy_consume(produce, should_stop))
+        else:
+            task = asyncio.ensure_future(_adapter_consume(produce, should_stop, streams))
+        await asyncio.sleep(0.05)
+        cancelled["flag"], cancelled["at"] = True, time.perf_counter()
+        for s in streams:
+            s.wake()  # what Agent.cancel() does for its open streams
+        await task
+        samples.append((time.perf_counter() - cancelled["at"]) * 1000.0)
+    samples.sort()
+    return {"bridge": kind, "trials": trials, "cancel_ms_p50": round(samples[len(samples) // 2], 2),
+            "cancel_ms_max": round(samples[-1], 2)}
+
+
+async def run(n_chunks: int, trials: int) -> Dict[str, Any]:
+    return {
+        "throughput": [await _throughput(k, n_chunks) for k in ("legacy", "adapter")],
+        "cancel": [await _cancel_latency(k, trials) for k in ("legacy", "adapter")],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the model-stream thread/event-loop bridge")
+    parser.add_argument("--chunks", type=int, default=20000, help="chunks per throughput run")
+    parser.add_argument("--trials", type=int, default=8, help="cancellations measured per bridge")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.chunks, args.trials))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'bridge':<8} {'chunks':>8} {'seconds':>9} {'us/chunk':>9}")
+    for r in results["throughput"]:
+        print(f"{r['bridge']:<8} {r['chunks']:>8} {r['seconds']:>9} {r['us_per_chunk']:>9}")
+    print(f"{'bridge':<8} {'cancel p50 ms':>14} {'cancel max ms':>14}")
+    for r in results["cancel"]:
+        print(f"{r['bridge']:<8} {r['cancel_ms_p50']:>14} {r['cancel_ms_max']:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,14 +8,18 @@ Retrieval returns only relevant chunks so the agent never loads whole large file
 
 import ast
 import hashlib
+import heapq
 import json
 import logging
+import math
 import os
 import re
 import time
+from bisect import bisect_right
 from dataclasses import dataclass, field
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Set, Tuple
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +38,26 @@ def _project_key_for_ssh(working_directory: str) -> str:
 
 # Chunk text max length for embedding (Cohere ~512 tokens, ~1500 chars safe)
 CHUNK_TEXT_MAX = 1500
+# On-disk layout (columnar): float32 matrix (mmapped on load) + compact metadata table + text blob
+EMBEDDINGS_FILE = "embeddings.npy"
+CHUNKS_META_FILE = "chunks_meta.json"
+CHUNKS_TEXT_FILE = "chunks_text.bin"
+LEGACY_CHUNKS_FILE = "chunks.json"
+IVF_FILE = "ivf.npz"  # single-store layout (format 2), removed on the next save
+IVF_DIR = "ivf"  # one <shard ordinal>.npz per shard with an IVF index
+CODES_FILE = "codes.npy"
+CODE_SCALES_FILE = "code_scales.npy"  # per-row scales of int8 codes
+# embeddings, text and codes files carry the save generation (embeddings.<gen>.npy) from format 3 on
+_GENERATION_FILE_RE = re.compile(r"^(?:embeddings|chunks_text|codes|code_scales)(?:\.\d+)?\.(?:npy|bin)$")
+SEGMENTS_DIR = "segments"
+QUANTIZATION_MODES = ("none", "int8", "binary")
+INDEX_FORMAT_VERSION = 3
+_TEXT_BLOB_MIN_DEAD_BYTES = 1 << 20  # never rewrite chunks_text.bin for less dead text than this
+_RECONCILE_BATCH_FILES = 50  # files refreshed per write-lock hold during a reconciliation sweep
+_MAX_PENDING_SEGMENTS = 16  # fold segments into the base files (in the background) past this many
+# Monorepo container directories whose children (packages/foo) each get their own shard
+_SHARD_CONTAINER_DIRS = {"packages", "libs", "apps", "services", "modules", "plugins", "crates", "projects"}
+_PARALLEL_SEARCH_MIN_ROWS = 8192  # fan a query out over the search pool only past this many rows
 # Files/dirs to skip (same spirit as .cursorignore)
 INDEX_SKIP_DIRS = {".git", "node_modules", "__pycache__", ".venv", "venv", "dist", "build", ".bedrock-codex"}
 INDEX_SKIP_SUFFIXES = {".min.js", ".min.css", ".lock", ".pyc", ".map", ".sum", ".mod"}
@@ -42,17 +66,28 @@ INDEX_SKIP_EXTENSIONS = {".pyc", ".pyo", ".so", ".dylib", ".o", ".a", ".bin"}
 
 @dataclass
 class CodeChunk:
-    """A single semantic chunk of code with location and optional embedding."""
+    """A single semantic chunk of code with location. Its embedding (if any) lives in the index's vector store.
+
+    Once persisted, ``text`` is dropped and ``text_ref`` = (blob, offset, length) points into the
+    index's chunk text file; use ``load_text()`` to read it.
+    """
     path: str
     start_line: int
     end_line: int
     kind: str  # "function", "class", "module", "block"
     name: str
-    text: str
-    embedding: Optional[List[float]] = None
+    text: Optional[str]
+    text_ref: Optional[Tuple[Any, int, int]] = field(default=None, repr=False, compare=False)
+
+    def load_text(self) -> str:
+        """Chunk text, read from the on-disk blob when it is not resident."""
+        if self.text is None and self.text_ref is not None:
+            blob, offset, length = self.text_ref
+            return blob.read(offset, length)
+        return self.text or ""
 
     def to_search_snippet(self, max_lines: int = 25) -> str:
-        lines = self.text.splitlines()
+        lines = self.load_text().splitlines()
         if len(lines) > max_lines:
             lines = lines[:max_lines] + [f"... ({len(lines) - max_lines} more lines)"]
         return f"{self.path}:{self.start_line}-{self.end_line} [{self.kind}] {self.name}\n" + "\n".join(lines)
@@ -62,19 +97,259 @@ def _file_content_hash(content: str) -> str:
     return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
 
 
-def _chunk_python(content: str) -> List[Tuple[int, int, str, str]]:
-    """Return (start_line_1idx, end_line_1idx, kind, name) for Python."""
-    chunks = []
+def _generation_file(name: str, gen: int) -> str:
+    """embeddings.npy -> embeddings.<gen>.npy"""
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{gen}{ext}"
+
+
+def _replace_file(path: str, write: Any, binary: bool = True) -> None:
+    """Write via a temp file + os.replace so readers never see a half-written file."""
+    tmp = path + ".tmp"
+    with open(tmp, "wb" if binary else "w", **({} if binary else {"encoding": "utf-8"})) as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+class _TextBlob:
+    """Append-only file of UTF-8 chunk texts, read by (offset, length) through a read-only memory map.
+
+    New texts are appended; bytes of replaced chunks stay behind as dead space until the
+    index rewrites the file (see CodebaseIndex._save_chunks).
+    """
+
+    def __init__(self, path: str):
+        import threading
+        self.path = path
+        self._lock = threading.Lock()
+        self._map: Optional[Any] = None
+        self._mapped = 0
+        self._remap()
+
+    def _remap(self) -> None:
+        import mmap
+        size = os.path.getsize(self.path) if os.path.isfile(self.path) else 0
+        if size:
+            with open(self.path, "rb") as f:
+                # The old map is left to the GC: a concurrent read may still be slicing it
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._map = None
+        self._mapped = size
+
+    @property
+    def size(self) -> int:
+        return self._mapped
+
+    def read(self, offset: int, length: int) -> str:
+        m = self._map
+        if m is None or offset + length > len(m):
+            with self._lock:
+                self._remap()
+                m = self._map
+            if m is None:
+                return ""
+        return m[offset:offset + length].decode("utf-8", errors="replace")
+
+    def append(self, parts: List[bytes]) -> int:
+        """Append byte strings back to back; returns the offset of the first one."""
+        with self._lock:
+            with open(self.path, "ab") as f:
+                offset = f.tell()
+                f.write(b"".join(parts))
+            self._remap()
+        return offset
+
+
+class EmbeddingCache:
+    """Global on-disk embedding cache keyed by sha256(model_id, input_type, text).
+
+    Shared across projects, branches and checkouts so identical chunk text is
+    embedded once. Backed by SQLite (WAL) so several server processes can use
+    it; entries are evicted least-recently-used once the vector bytes exceed
+    max_bytes.
+    """
+
+    _EVICT_TO = 0.9  # evict down to this fraction of max_bytes
+
+    def __init__(self, path: str, max_bytes: int):
+        import sqlite3
+        import threading
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vec BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings (last_used)")
+        self._db.commit()
+        self._bytes = self._db.execute("SELECT COALESCE(SUM(LENGTH(vec)), 0) FROM embeddings").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model_id: str, input_type: str, text: str) -> bytes:
+        return hashlib.sha256(f"{model_id}\0{input_type}\0{text}".encode("utf-8")).digest()
+
+    def get_many(self, model_id: str, input_type: str, texts: List[str]) -> List[Optional[Any]]:
+        """Cached float32 vectors for texts (None where missing). Hits are marked recently used."""
+        import numpy as np
+        keys = [self.key(model_id, input_type, t) for t in texts]
+        found: Dict[bytes, bytes] = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vec FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._db.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+                self._db.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return [np.frombuffer(found[k], dtype=np.float32) if k in found else None for k in keys]
+
+    def put_many(self, model_id: str, input_type: str, items: List[Tuple[str, Any]]) -> None:
+        import numpy as np
+        rows = []
+        for text, vec in items:
+            if vec is None or not len(vec):
+                continue
+            rows.append((self.key(model_id, input_type, text), np.asarray(vec, dtype=np.float32).tobytes(), time.time()))
+        if not rows:
+            return
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO embeddings (key, vec, last_used) VALUES (?, ?, ?)", rows)
+            self._bytes += sum(len(r[1]) for r in rows)
+            if self._bytes > self.max_bytes:
+                self._evict()
+            self._db.commit()
+
+    def _evict(self) -> None:
+        """Drop least-recently-used entries until under _EVICT_TO * max_bytes. Caller holds the lock."""
+        target = int(self.max_bytes * self._EVICT_TO)
+        freed = 0
+        doomed = []
+        for key, size in self._db.execute("SELECT key, LENGTH(vec) FROM embeddings ORDER BY last_used"):
+            if self._bytes - freed <= target:
+                break
+            doomed.append((key,))
+            freed += size
+        self._db.executemany("DELETE FROM embeddings WHERE key = ?", doomed)
+        self._bytes -= freed
+        logger.info("Embedding cache: evicted %d entries (%.1f MB)", len(doomed), freed / 1e6)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_failed = False
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Process-wide EmbeddingCache, or None when disabled or unavailable."""
+    global _embedding_cache, _embedding_cache_failed
+    if _embedding_cache is not None or _embedding_cache_failed:
+        return _embedding_cache
     try:
-        tree = ast.parse(content)
+        from config import app_config
+        if not getattr(app_config, "embedding_cache_enabled", True):
+            _embedding_cache_failed = True
+            return None
+        max_mb = getattr(app_config, "embedding_cache_max_mb", 1024)
+        _embedding_cache = EmbeddingCache(
+            os.path.join(_index_cache_root(), "embedding_cache.sqlite3"), max_bytes=max_mb * 1024 * 1024
+        )
+    except Exception as e:
+        logger.warning("Embedding cache unavailable: %s", e)
+        _embedding_cache_failed = True
+    return _embedding_cache
+
+
+class _QueryEmbeddingCache:
+    """Thread-safe LRU with TTL for query embeddings, keyed by (model_id, whitespace-normalized query)."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        from collections import OrderedDict
+        import threading
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model_id: str, query: str) -> Tuple[str, str]:
+        return model_id, " ".join(query.split())
+
+    def get(self, key: Tuple[str, str]) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Tuple[str, str], vec: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), vec)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+
+_query_cache: Optional[_QueryEmbeddingCache] = None
+
+
+def get_query_cache() -> _QueryEmbeddingCache:
+    global _query_cache
+    if _query_cache is None:
+        try:
+            from config import app_config
+            size = getattr(app_config, "query_embedding_cache_size", 512)
+            ttl = getattr(app_config, "query_embedding_cache_ttl", 900.0)
+        except Exception:
+            size, ttl = 512, 900.0
+        _query_cache = _QueryEmbeddingCache(size, ttl)
+    return _query_cache
+
+
+def _embedding_model_id() -> str:
+    try:
+        from config import app_config
+        return getattr(app_config, "embedding_model_id", "cohere.embed-english-v3")
+    except Exception:
+        return "cohere.embed-english-v3"
+
+
+def _python_ranges(tree: Optional[ast.AST], content: str) -> List[Tuple[int, int, str, str]]:
+    """Chunk ranges from a parsed module (None = unparsable: line windows)."""
+    chunks = []
+    if tree is not None:
         for node in ast.walk(tree):
             if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
                 start = node.lineno
                 end = node.end_lineno or node.lineno
                 kind = "class" if isinstance(node, ast.ClassDef) else "function"
                 chunks.append((start, end, kind, node.name))
-    except SyntaxError:
-        pass
     if not chunks:
         # Fallback: line-based windows
         lines = content.splitlines()
@@ -83,23 +358,46 @@ def _chunk_python(content: str) -> List[Tuple[int, int, str, str]]:
     return chunks
 
 
+def _parse_python(content: str) -> Optional[ast.AST]:
+    try:
+        return ast.parse(content)
+    except (SyntaxError, ValueError):
+        return None
+
+
+def _chunk_python(content: str) -> List[Tuple[int, int, str, str]]:
+    """Return (start_line_1idx, end_line_1idx, kind, name) for Python."""
+    return _python_ranges(_parse_python(content), content)
+
+
+def _line_starts(content: str) -> List[int]:
+    """Offset of the first character of every line, for bisect-based offset -> line lookups."""
+    starts = [0]
+    find = content.find
+    i = find("\n")
+    while i != -1:
+        starts.append(i + 1)
+        i = find("\n", i + 1)
+    return starts
+
+
 def _chunk_js_ts(content: str) -> List[Tuple[int, int, str, str]]:
     """Heuristic chunks for JS/TS: function/class/method blocks."""
     chunks = []
     lines = content.splitlines()
+    line_starts = _line_starts(content)
     # Match function, class, export function, etc.
     pattern = re.compile(
         r"^\s*(export\s+)?(async\s+)?(function\s+(\w+)|(?:(\w+)\s*\([^)]*\)\s*=>)|class\s+(\w+))",
         re.MULTILINE,
     )
     for m in pattern.finditer(content):
-        start = content[: m.start()].count("\n") + 1
+        start = bisect_right(line_starts, m.start())
         name = (m.group(4) or m.group(6) or m.group(5) or "anonymous").strip()
         kind = "class" if "class" in (m.group(0) or "") else "function"
-        # Approximate end: next same-indent or +50 lines
-        segment = content[m.start() :]
+        # Approximate end: next same-indent or +80 lines
         end_line = start
-        for i, line in enumerate(segment.splitlines()[:80], start=start):
+        for i, line in enumerate(lines[start - 1:start + 79], start=start):
             end_line = i
             if i > start and line.strip() and not line.startswith(" ") and not line.startswith("\t"):
                 break
@@ -111,9 +409,15 @@ def _chunk_js_ts(content: str) -> List[Tuple[int, int, str, str]]:
 
 
 def _chunk_java(content: str) -> List[Tuple[int, int, str, str]]:
-    """Regex-based Java chunking: classes, interfaces, enums, records, methods."""
+    """Regex-based Java chunking: classes, interfaces, enums, records, methods.
+
+    Linear in file size: match offsets map to lines by bisecting a newline offset
+    table, and block ends come from a prefix brace-depth array plus a
+    "next line with lower depth" table instead of rescanning lines per match.
+    """
     chunks = []
     lines = content.splitlines()
+    line_starts = _line_starts(content)
 
     # Match top-level and nested type declarations
     type_pattern = re.compile(
@@ -128,20 +432,37 @@ def _chunk_java(content: str) -> List[Tuple[int, int, str, str]]:
         re.MULTILINE,
     )
 
+    # depth[k]: net brace depth before line k (rough: ignores strings/comments, good enough for chunking).
+    # next_lower[k]: first k' > k with depth[k'] < depth[k], or -1.
+    depth = [0]
+    for line in lines:
+        depth.append(depth[-1] + line.count("{") - line.count("}"))
+    next_lower = [-1] * len(depth)
+    stack: List[int] = []
+    for k, d in enumerate(depth):
+        while stack and depth[stack[-1]] > d:
+            next_lower[stack.pop()] = k
+        stack.append(k)
+
     def _find_block_end(start_idx: int) -> int:
-        """Find closing brace for a block starting at start_idx (0-based line index)."""
-        depth = 0
-        for i in range(start_idx, min(start_idx + 500, len(lines))):
-            line = lines[i]
-            # Rough brace counting (ignores strings/comments, good enough for chunking)
-            depth += line.count("{") - line.count("}")
-            if depth <= 0 and i > start_idx:
-                return i + 1
+        """Find closing brace for a block starting at start_idx (0-based line index).
+
+        Returns the 1-based line after which the depth is back at or below the depth
+        before start_idx (never the start line itself), looking at most 500 lines ahead.
+        """
+        limit = min(start_idx + 500, len(lines))
+        base = depth[start_idx] if start_idx < len(depth) else 0
+        k = start_idx + 2  # depth after line start_idx + 1
+        # Lines between k and next_lower[k] are all deeper than depth[k] > base: skip them
+        while 0 <= k < len(depth) and depth[k] > base:
+            k = next_lower[k]
+        if 0 < k <= limit:
+            return k
         return min(start_idx + 100, len(lines))
 
     # Collect type-level chunks
     for m in type_pattern.finditer(content):
-        start = content[:m.start()].count("\n")
+        start = bisect_right(line_starts, m.start()) - 1
         name = m.group(1)
         kind_match = re.search(r"(class|interface|enum|record|@interface)", m.group(0))
         kind = kind_match.group(1) if kind_match else "class"
@@ -150,7 +471,7 @@ def _chunk_java(content: str) -> List[Tuple[int, int, str, str]]:
 
     # Collect method-level chunks
     for m in method_pattern.finditer(content):
-        start = content[:m.start()].count("\n")
+        start = bisect_right(line_starts, m.start()) - 1
         name = m.group(1)
         end = _find_block_end(start)
         # Only add if not entirely contained in a type chunk
@@ -182,29 +503,14 @@ def _chunk_java(content: str) -> List[Tuple[int, int, str, str]]:
 def extract_imports(path: str, content: str) -> List[str]:
     """Extract import statements from a file. Returns a list of imported module/class names.
 
-    Supports Python (import X, from X import Y) and Java (import com.example.X).
+    Supports Python (import X, from X import Y; relative imports keep their leading dots),
+    Java (import com.example.X) and JS/TS module specifiers.
     """
     ext = Path(path).suffix.lower()
     imports: List[str] = []
 
     if ext == ".py":
-        try:
-            tree = ast.parse(content)
-            for node in ast.walk(tree):
-                if isinstance(node, ast.Import):
-                    for alias in node.names:
-                        imports.append(alias.name)
-                elif isinstance(node, ast.ImportFrom):
-                    module = node.module or ""
-                    for alias in node.names:
-                        imports.append(f"{module}.{alias.name}" if module else alias.name)
-        except SyntaxError:
-            # Fallback: regex
-            for m in re.finditer(r"^\s*(?:from\s+([\w.]+)\s+)?import\s+([\w., ]+)", content, re.MULTILINE):
-                from_mod = m.group(1) or ""
-                names = [n.strip().split(" as ")[0] for n in m.group(2).split(",")]
-                for n in names:
-                    imports.append(f"{from_mod}.{n}" if from_mod else n)
+        return _python_imports(_parse_python(content), content)
 
     elif ext == ".java":
         for m in re.finditer(r"^\s*import\s+(?:static\s+)?([\w.]+)\s*;", content, re.MULTILINE):
@@ -218,72 +524,298 @@ def extract_imports(path: str, content: str) -> List[str]:
     return imports
 
 
-def build_import_graph(file_imports: Dict[str, List[str]]) -> Dict[str, List[str]]:
-    """Build a reverse import graph: for each module/file, list files that import it.
+def _python_imports(tree: Optional[ast.AST], content: str) -> List[str]:
+    """Imports of a parsed module (None = unparsable: regex fallback)."""
+    imports: List[str] = []
+    if tree is not None:
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    imports.append(alias.name)
+            elif isinstance(node, ast.ImportFrom):
+                # Relative imports keep their leading dots so they resolve against the importer
+                prefix = "." * (node.level or 0)
+                for alias in node.names:
+                    imports.append(f"{prefix}{node.module}.{alias.name}" if node.module else f"{prefix}{alias.name}")
+        return imports
+    for m in re.finditer(r"^\s*(?:from\s+([\w.]+)\s+)?import\s+([\w., ]+)", content, re.MULTILINE):
+        from_mod = m.group(1) or ""
+        names = [n.strip().split(" as ")[0] for n in m.group(2).split(",")]
+        sep = "." if from_mod and not from_mod.endswith(".") else ""
+        for n in names:
+            imports.append(f"{from_mod}{sep}{n}")
+    return imports
+
+
+def _python_symbols(tree: Optional[ast.AST], ranges: List[Tuple[int, int, str, str]]) -> List[List[Any]]:
+    """Definitions of a parsed module: every def/class (from the chunk ranges) plus module-level names."""
+    symbols = _range_symbols(ranges)
+    if tree is not None:
+        for node in getattr(tree, "body", []):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target] if isinstance(node, ast.AnnAssign) else []
+            for t in targets:
+                if isinstance(t, ast.Name):
+                    symbols.append([t.id, "variable", node.lineno, node.end_lineno or node.lineno])
+    return symbols
 
-    file_imports: {file_path: [imported_module_names]}
-    Returns: {module_or_stem: [file_paths_that_import_it]}
+
+
+
+def _range_symbols(ranges: List[Tuple[int, int, str, str]]) -> List[List[Any]]:
+    """[name, kind, start_line, end_line] for every named chunk range (line windows have no name)."""
+    return [[name, kind, start, end] for start, end, kind, name in ranges if name and kind != "block"]
+
+
+_IMPORT_LANGS = {
+    ".py": "py", ".java": "java",
+    ".js": "js", ".ts": "js", ".jsx": "js", ".tsx": "js", ".mjs": "js", ".cjs": "js",
+}
+_PACKAGE_INIT_STEMS = {"py": "__init__", "js": "index"}
+_JS_PATH_ALIASES = ("@/", "~/")
+
+
+class ImportGraph:
+    """Resolved file -> file import graph backed by a module-name resolution table.
+
+    Every source file is registered, per language, under each path suffix of its
+    module path (``src/pkg/mod.py`` -> ``src/pkg/mod``, ``pkg/mod``, ``mod``; a
+    package ``__init__.py`` or ``index.js`` also under its directory), so Python
+    dotted names, Java FQNs and bare JS specifiers resolve with a few dict lookups.
+    Relative imports (``from ..x import y``, ``'./x'``) resolve against the
+    importer's directory only. The longest resolvable prefix wins, so
+    ``from pkg.mod import func`` lands on ``pkg/mod.py``.
+
+    Updates are incremental: setting a file's imports re-resolves that file,
+    registering a new file re-resolves only the importers that looked up one of
+    its names, and removing a file re-resolves its importers.
     """
-    reverse: Dict[str, List[str]] = {}
-    for fpath, imps in file_imports.items():
-        for imp in imps:
-            # Normalize: take last component as a short name
-            short = imp.rsplit(".", 1)[-1] if "." in imp else imp
-            reverse.setdefault(imp, []).append(fpath)
-            if short != imp:
-                reverse.setdefault(short, []).append(fpath)
-    return reverse
+
+    def __init__(self) -> None:
+        self.deps: Dict[str, Set[str]] = {}  # file -> files it imports
+        self.rdeps: Dict[str, Set[str]] = {}  # file -> files importing it
+        self._imports: Dict[str, List[str]] = {}
+        self._files: Set[str] = set()
+        self._roots: Dict[Tuple[str, str], Set[str]] = {}  # (lang, module path from project root) -> files
+        self._suffixes: Dict[Tuple[str, str], Set[str]] = {}  # (lang, any module path suffix) -> files
+        self._waiting: Dict[Tuple[str, str], Set[str]] = {}  # key looked up -> importers that tried it
+        self._tried: Dict[str, List[Tuple[str, str]]] = {}
+
+    @classmethod
+    def from_file_imports(cls, file_imports: Dict[str, List[str]]) -> "ImportGraph":
+        graph = cls()
+        for path in file_imports:
+            graph._register(path)
+        for path, imps in file_imports.items():
+            graph._imports[path] = list(imps)
+            graph._resolve(path)
+        return graph
+
+    @staticmethod
+    def _module_paths(path: str) -> Tuple[Optional[str], List[str]]:
+        root, ext = os.path.splitext(path)
+        lang = _IMPORT_LANGS.get(ext.lower())
+        if lang is None:
+            return None, []
+        paths = [root]
+        head, base = root.rsplit("/", 1) if "/" in root else ("", root)
+        if head and base == _PACKAGE_INIT_STEMS.get(lang):
+            paths.append(head)
+        return lang, paths
+
+    def _register(self, path: str) -> None:
+        if path in self._files:
+            return
+        self._files.add(path)
+        lang, mod_paths = self._module_paths(path)
+        woken: Set[str] = set()
+        for mp in mod_paths:
+            self._roots.setdefault((lang, mp), set()).add(path)
+            parts = mp.split("/")
+            for i in range(len(parts)):
+                key = (lang, "/".join(parts[i:]))
+                self._suffixes.setdefault(key, set()).add(path)
+                woken |= self._waiting.get(key, set())
+        for importer in woken:
+            self._resolve(importer)
+
+    def _unregister(self, path: str) -> None:
+        if path not in self._files:
+            return
+        self._files.discard(path)
+        lang, mod_paths = self._module_paths(path)
+        for mp in mod_paths:
+            parts = mp.split("/")
+            keys = [(self._roots, (lang, mp))] + [(self._suffixes, (lang, "/".join(parts[i:]))) for i in range(len(parts))]
+            for table, key in keys:
+                files = table.get(key)
+                if files is not None:
+                    files.discard(path)
+                    if not files:
+                        del table[key]
+        for importer in list(self.rdeps.get(path, ())):
+            self._resolve(importer)
+        self.rdeps.pop(path, None)
+
+    def set_imports(self, path: str, imports: List[str]) -> None:
+        self._register(path)
+        self._imports[path] = list(imports)
+        self._resolve(path)
+
+    def remove(self, path: str) -> None:
+        self._imports.pop(path, None)
+        self._clear(path)
+        self._unregister(path)
+
+    def _clear(self, path: str) -> None:
+        for target in self.deps.pop(path, ()):
+            importers = self.rdeps.get(target)
+            if importers is not None:
+                importers.discard(path)
+                if not importers:
+                    del self.rdeps[target]
+        for key in self._tried.pop(path, ()):
+            waiting = self._waiting.get(key)
+            if waiting is not None:
+                waiting.discard(path)
+                if not waiting:
+                    del self._waiting[key]
+
+    def _resolve(self, path: str) -> None:
+        self._clear(path)
+        lang = _IMPORT_LANGS.get(os.path.splitext(path)[1].lower())
+        if lang is None:
+            return
+        tried: List[Tuple[str, str]] = []
+        targets: Set[str] = set()
+        for imp in self._imports.get(path, ()):
+            targets |= self._lookup(lang, path, imp, tried)
+        targets.discard(path)
+        if targets:
+            self.deps[path] = targets
+            for target in targets:
+                self.rdeps.setdefault(target, set()).add(path)
+        for key in tried:
+            self._waiting.setdefault(key, set()).add(path)
+        self._tried[path] = tried
+
+    def _lookup(self, lang: str, importer: str, imp: str, tried: List[Tuple[str, str]]) -> Set[str]:
+        """Files an import names; every key looked up is recorded in ``tried``."""
+        importer_dir = importer.rsplit("/", 1)[0] if "/" in importer else ""
+        if lang == "js":
+            spec = imp.split("?", 1)[0]
+            if spec.startswith("."):
+                spec = os.path.normpath(os.path.join(importer_dir, spec)).replace("\\", "/")
+                table = self._roots
+            else:
+                for alias in _JS_PATH_ALIASES:
+                    if spec.startswith(alias):
+                        spec = spec[len(alias):]
+                table = self._suffixes
+            root, ext = os.path.splitext(spec)
+            if ext.lower() in _IMPORT_LANGS:
+                spec = root
+            key = (lang, spec)
+            tried.append(key)
+            return table.get(key, set())
+        level = len(imp) - len(imp.lstrip("."))
+        names = [p for p in imp[level:].split(".") if p and p != "*"]
+        if level:
+            base = importer_dir.split("/") if importer_dir else []
+            if level - 1 > len(base):
+                return set()
+            base = base[:len(base) - (level - 1)]
+            parts, min_len, tables = base + names, max(len(base), 1), (self._roots,)
+        else:
+            parts, min_len, tables = names, 1, (self._roots, self._suffixes)
+        for n in range(len(parts), min_len - 1, -1):
+            key = (lang, "/".join(parts[:n]))
+            tried.append(key)
+            for table in tables:
+                hits = table.get(key)
+                if hits:
+                    return hits
+        return set()
+
+    def neighborhood(self, path: str, hops: int = 1, max_neighbors: int = 8) -> List[str]:
+        """Files within ``hops`` import edges of ``path`` (either direction), nearest first.
+
+        Imports come before importers at each hop; work is bounded by ``max_neighbors``
+        rather than by the size of the project.
+        """
+        seen = {path}
+        out: List[str] = []
+        frontier = [path]
+        for _ in range(max(1, hops)):
+            next_frontier: List[str] = []
+            for f in frontier:
+                for group in (self.deps.get(f, ()), self.rdeps.get(f, ())):
+                    for n in sorted(group):
+                        if n in seen:
+                            continue
+                        seen.add(n)
+                        out.append(n)
+                        next_frontier.append(n)
+                        if len(out) >= max_neighbors:
+                            return out
+            if not next_frontier:
+                break
+            frontier = next_frontier
+        return out
 
 
 def get_dependency_neighborhood(
     file_path: str,
     file_imports: Dict[str, List[str]],
-    reverse_imports: Dict[str, List[str]],
+    reverse_imports: Optional[Dict[str, List[str]]] = None,
     max_neighbors: int = 8,
+    hops: int = 1,
 ) -> List[str]:
-    """Get 1-hop dependency neighborhood: files that `file_path` imports + files that import `file_path`.
+    """Get the dependency neighborhood: files that `file_path` imports + files that import it.
 
-    Returns up to max_neighbors file paths (excluding self).
+    Builds a throwaway ImportGraph; callers holding a CodebaseIndex should use
+    CodebaseIndex.dependency_neighborhood, which keeps the graph up to date incrementally.
+    reverse_imports is accepted for backward compatibility and not needed.
     """
-    neighbors: set = set()
-
-    # Forward: files this file imports
-    direct_imports = file_imports.get(file_path, [])
-    stem = Path(file_path).stem
-
-    for imp in direct_imports:
-        # Try to find a matching file by import name
-        short = imp.rsplit(".", 1)[-1] if "." in imp else imp
-        for candidate_path in file_imports:
-            cand_stem = Path(candidate_path).stem
-            if cand_stem == short or cand_stem == imp:
-                neighbors.add(candidate_path)
+    return ImportGraph.from_file_imports(file_imports).neighborhood(file_path, hops=hops, max_neighbors=max_neighbors)
 
-    # Reverse: files that import this file
-    for key in [stem, file_path]:
-        for importer in reverse_imports.get(key, []):
-            if importer != file_path:
-                neighbors.add(importer)
 
-    neighbors.discard(file_path)
-    return sorted(neighbors)[:max_neighbors]
+def _chunk_ranges(ext: str, content: str) -> List[Tuple[int, int, str, str]]:
+    if ext in (".js", ".ts", ".jsx", ".tsx", ".mjs", ".cjs"):
+        return _chunk_js_ts(content)
+    if ext == ".java":
+        return _chunk_java(content)
+    # Generic: 40-line windows
+    lines = content.splitlines()
+    ranges = []
+    for i in range(0, len(lines), 40):
+        ranges.append((i + 1, min(i + 40, len(lines)), "block", ""))
+    return ranges
 
 
 def chunk_file(path: str, content: str) -> List[CodeChunk]:
     """Split file into semantic chunks. Path is relative to workspace."""
     ext = Path(path).suffix.lower()
+    ranges = _chunk_python(content) if ext == ".py" else _chunk_ranges(ext, content)
+    return _chunks_from_ranges(path, content, ranges)
+
+
+def analyze_file(path: str, content: str) -> Tuple[List[CodeChunk], List[str], List[List[Any]]]:
+    """Chunks, imports and symbol definitions ([name, kind, start_line, end_line]) of a file from
+    a single parse (Python is parsed once; other languages reuse the chunker's ranges)."""
+    ext = Path(path).suffix.lower()
     if ext == ".py":
-        ranges = _chunk_python(content)
-    elif ext in (".js", ".ts", ".jsx", ".tsx", ".mjs", ".cjs"):
-        ranges = _chunk_js_ts(content)
-    elif ext == ".java":
-        ranges = _chunk_java(content)
-    else:
-        # Generic: 40-line windows
-        lines = content.splitlines()
-        ranges = []
-        for i in range(0, len(lines), 40):
-            ranges.append((i + 1, min(i + 40, len(lines)), "block", ""))
+        tree = _parse_python(content)
+        ranges = _python_ranges(tree, content)
+        return _chunks_from_ranges(path, content, ranges), _python_imports(tree, content), _python_symbols(tree, ranges)
+    ranges = _chunk_ranges(ext, content)
+    try:
+        imps = extract_imports(path, content)
+    except Exception:
+        imps = []
+    return _chunks_from_ranges(path, content, ranges), imps, _range_symbols(ranges)
+
+
+def _chunks_from_ranges(path: str, content: str, ranges: List[Tuple[int, int, str, str]]) -> List[CodeChunk]:
     lines = content.splitlines()
     out = []
     for start, end, kind, name in ranges:
@@ -304,6 +836,60 @@ def chunk_file(path: str, content: str) -> List[CodeChunk]:
     return out
 
 
+# Build pipeline sizing
+_LOCAL_READ_WORKERS = 8
+_REMOTE_READ_WORKERS = 2  # SSH reads serialize on the backend lock; keep a small look-ahead only
+_REMOTE_FETCH_BATCH_FILES = 500  # files per bulk (tar) fetch when the backend supports read_files
+_EMBED_BATCH_CHUNKS = 256  # chunks handed to embed_fn per call as the pipeline streams
+_PROCESS_POOL_MIN_FILES = 32  # below this, chunk inline rather than paying process start-up
+
+
+def _analyze_file(path: str, content: str) -> Tuple[str, List[CodeChunk], List[str], List[List[Any]]]:
+    """analyze_file tagged with its path. Module-level so it can run in a worker process."""
+    return (path, *analyze_file(path, content))
+
+
+class _AnalysisPool:
+    """Runs _analyze_file inline for the first few files, then on a process pool.
+
+    Small incremental builds never start worker processes; large ones spread AST
+    parsing across cores. Workers come from a forkserver (spawn where that is
+    unavailable), so they only receive the picklable path and content. If the
+    pool cannot start or breaks, analysis continues inline.
+    """
+
+    def __init__(self) -> None:
+        self._pool: Optional[Any] = None
+        self._submitted = 0
+        self._broken = False
+
+    def submit(self, path: str, content: str) -> Any:
+        """Return the analysis tuple directly (inline) or a Future resolving to it."""
+        self._submitted += 1
+        if self._submitted > _PROCESS_POOL_MIN_FILES and not self._broken:
+            try:
+                if self._pool is None:
+                    import multiprocessing
+                    from concurrent.futures import ProcessPoolExecutor
+                    # Never fork: the server process has live threads (uvicorn, paramiko, the
+                    # reconciler) whose held locks would be copied into the child
+                    methods = multiprocessing.get_all_start_methods()
+                    ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=max(1, min(8, (os.cpu_count() or 2) - 1)), mp_context=ctx,
+                    )
+                return self._pool.submit(_analyze_file, path, content)
+            except Exception as e:
+                logger.debug("Process pool unavailable, chunking inline: %s", e)
+                self._broken = True
+        return _analyze_file(path, content)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
 def _should_index(path: str, gitignore_spec=None) -> bool:
     rel = path.replace("\\", "/")
     parts = rel.split("/")
@@ -316,6 +902,824 @@ def _should_index(path: str, gitignore_spec=None) -> bool:
     return True
 
 
+def _is_indexable_file(rel: str, gitignore_spec=None) -> bool:
+    if not _should_index(rel, gitignore_spec):
+        return False
+    ext = os.path.splitext(rel)[1].lower()
+    return ext not in INDEX_SKIP_EXTENSIONS and ext not in ("", ".md", ".txt")
+
+
+def _stat_unchanged(stored: Optional[List[Any]], current: Tuple[float, int, int]) -> bool:
+    """True if (mtime, size, inode) match. An unknown (zero) mtime never counts as unchanged."""
+    return bool(stored) and current[0] > 0 and tuple(stored) == tuple(current)
+
+
+class _IVFIndex:
+    """Pure-NumPy IVF-flat index: spherical k-means coarse quantizer over normalized rows.
+
+    ``assign[i]`` is the inverted list of store row i, so row removals and appends
+    are mirrored with the same mask/concatenate the vector store uses (returning a
+    new index, so a query holding the old one is unaffected). Each new index groups
+    its rows by list once (``_rows[_offsets[l]:_offsets[l + 1]]`` are the rows of list
+    l), so a query gathers the rows of its ``nprobe`` closest lists without scanning
+    ``assign``.
+    """
+
+    _TRAIN_ITERS = 8
+    _TRAIN_SAMPLE_PER_LIST = 40
+    _ASSIGN_BATCH = 8192
+
+    def __init__(self, centroids: Any, assign: Any, trained_rows: int) -> None:
+        import numpy as np
+        self.centroids = centroids  # (nlist, dim) float32, normalized
+        self.assign = assign  # (rows,) int32
+        self.trained_rows = trained_rows
+        self._rows = np.argsort(assign, kind="stable")  # radix sort: rows grouped by list, ascending
+        self._offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=centroids.shape[0]))])
+
+    @classmethod
+    def train(cls, matrix: Any, seed: int = 0) -> "_IVFIndex":
+        import numpy as np
+        n = matrix.shape[0]
+        nlist = int(min(2048, max(8, np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        sample_n = min(n, nlist * cls._TRAIN_SAMPLE_PER_LIST)
+        sample = np.asarray(matrix[np.sort(rng.choice(n, size=sample_n, replace=False))], dtype=np.float32)
+        centroids = sample[rng.choice(sample_n, size=nlist, replace=False)].copy()
+        for _ in range(cls._TRAIN_ITERS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample_n, size=int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.maximum(norms, 1e-9)
+        centroids = centroids.astype(np.float32)
+        return cls(centroids, cls._assign_rows(centroids, matrix), n)
+
+    @classmethod
+    def _assign_rows(cls, centroids: Any, vectors: Any) -> Any:
+        import numpy as np
+        out = np.empty(vectors.shape[0], dtype=np.int32)
+        for i in range(0, vectors.shape[0], cls._ASSIGN_BATCH):
+            out[i:i + cls._ASSIGN_BATCH] = np.argmax(vectors[i:i + cls._ASSIGN_BATCH] @ centroids.T, axis=1)
+        return out
+
+    def add(self, vectors: Any) -> "_IVFIndex":
+        import numpy as np
+        assign = np.concatenate([self.assign, self._assign_rows(self.centroids, vectors)])
+        return _IVFIndex(self.centroids, assign, self.trained_rows)
+
+    def keep(self, mask: Any) -> "_IVFIndex":
+        return _IVFIndex(self.centroids, self.assign[mask], self.trained_rows)
+
+    def needs_retrain(self) -> bool:
+        """Centroids drift as the corpus changes; retrain after the index grows or shrinks 4x."""
+        n = len(self.assign)
+        return n > 4 * self.trained_rows or n * 4 < self.trained_rows
+
+    def candidates(self, q: Any, nprobe: int) -> Any:
+        import numpy as np
+        nprobe = max(1, min(nprobe, self.centroids.shape[0]))
+        probe = np.argpartition(-(self.centroids @ q), nprobe - 1)[:nprobe]
+        rows = np.concatenate([self._rows[self._offsets[i]:self._offsets[i + 1]] for i in probe])
+        rows.sort()  # ascending row order keeps reads from the memory-mapped matrix sequential
+        return rows
+
+    def save(self, path: str) -> None:
+        import numpy as np
+        _replace_file(path, lambda f: np.savez(
+            f, centroids=self.centroids, assign=self.assign, trained_rows=np.int64(self.trained_rows)
+        ))
+
+    @classmethod
+    def load(cls, path: str) -> Optional["_IVFIndex"]:
+        import numpy as np
+        try:
+            with np.load(path) as data:
+                return cls(data["centroids"], data["assign"], int(data["trained_rows"]))
+        except Exception as e:
+            logger.debug("IVF index load failed: %s", e)
+            return None
+
+
+_POPCOUNT8: Optional[Any] = None
+
+
+def _popcount_rows(bits: Any) -> Any:
+    """Number of set bits per row of a packed uint8 matrix."""
+    import numpy as np
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bits).sum(axis=1, dtype=np.int32)
+    global _POPCOUNT8
+    if _POPCOUNT8 is None:
+        _POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    return _POPCOUNT8[bits].sum(axis=1, dtype=np.int32)
+
+
+class _FloatRows:
+    """Read-only float32 row matrix assembled from blocks without copying them.
+
+    The first block is usually the on-disk memory map of a shard's rows; rows added later
+    are appended as separate blocks. ``rowmap`` maps each live row to its physical row
+    across the blocks (None: every physical row, in order), so removing rows only filters
+    the map. No update ever copies the existing float rows; _save_chunks writes the live
+    rows back out contiguously and the shard starts over from a single mapped block.
+    Supports the slicing, fancy indexing and ``@`` the vector store and IVF training use.
+    """
+
+    __slots__ = ("blocks", "starts", "rowmap")
+    ndim = 2
+
+    def __init__(self, blocks: Tuple[Any, ...], rowmap: Optional[Any] = None) -> None:
+        import numpy as np
+        self.blocks = blocks
+        self.starts = np.cumsum([0] + [len(b) for b in blocks])
+        self.rowmap = rowmap
+
+    @classmethod
+    def of(cls, matrix: Any) -> "_FloatRows":
+        return matrix if isinstance(matrix, cls) else cls((matrix,))
+
+    def __len__(self) -> int:
+        return len(self.rowmap) if self.rowmap is not None else int(self.starts[-1])
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return (len(self), int(self.blocks[0].shape[1]) if self.blocks and self.blocks[0].ndim == 2 else 0)
+
+    @property
+    def resident_bytes(self) -> int:
+        """Bytes held in process memory (memory-mapped blocks live in the page cache)."""
+        import numpy as np
+        total = self.rowmap.nbytes if self.rowmap is not None else 0
+        return total + sum(b.nbytes for b in self.blocks if not isinstance(b, np.memmap))
+
+    def _gather(self, rows: Any) -> Any:
+        import numpy as np
+        phys = self.rowmap[rows] if self.rowmap is not None else rows
+        if len(self.blocks) == 1:
+            return np.asarray(self.blocks[0][phys], dtype=np.float32)
+        which = np.searchsorted(self.starts, phys, side="right") - 1
+        out = np.empty((len(phys), self.shape[1]), dtype=np.float32)
+        for b in np.unique(which):
+            sel = which == b
+            out[sel] = self.blocks[b][phys[sel] - self.starts[b]]
+        return out
+
+    def __getitem__(self, idx: Any) -> Any:
+        import numpy as np
+        if isinstance(idx, (int, np.integer)):
+            return self._gather(np.asarray([idx]))[0]
+        if isinstance(idx, slice):
+            if self.rowmap is None and len(self.blocks) == 1:
+                return self.blocks[0][idx]
+            return self._gather(np.arange(*idx.indices(len(self))))
+        return self._gather(np.asarray(idx))
+
+    def __matmul__(self, q: Any) -> Any:
+        import numpy as np
+        if self.rowmap is None and len(self.blocks) == 1:
+            return self.blocks[0] @ q
+        sims = np.concatenate([b @ q for b in self.blocks])
+        return sims[self.rowmap] if self.rowmap is not None else sims
+
+    def __array__(self, dtype: Any = None, copy: Any = None) -> Any:
+        import numpy as np
+        if self.rowmap is None and len(self.blocks) == 1:
+            return np.asarray(self.blocks[0], dtype=dtype)
+        return self[:].astype(dtype) if dtype is not None else self[:]
+
+    def append(self, block: Any) -> "_FloatRows":
+        import numpy as np
+        rowmap = self.rowmap
+        if rowmap is not None:
+            rowmap = np.concatenate([rowmap, np.arange(self.starts[-1], self.starts[-1] + len(block))])
+        return _FloatRows(self.blocks + (block,), rowmap)
+
+    def keep(self, mask: Any) -> "_FloatRows":
+        import numpy as np
+        rowmap = self.rowmap if self.rowmap is not None else np.arange(self.starts[-1])
+        return _FloatRows(self.blocks, rowmap[mask])
+
+
+class _ShardState(NamedTuple):
+    """Row-aligned contents of a _VectorStore, replaced as a whole on every update."""
+    matrix: Optional[_FloatRows]  # (rows, dim) float32
+    chunks: List[CodeChunk]  # row i -> chunk; never mutated once published
+    ann: Optional[_IVFIndex]
+    codes: Optional[Any]  # (rows, dim) int8 or (rows, dim/8) uint8
+    scales: Optional[Any] = None  # (rows,) float32 max|v_i| / 127 of each int8 row
+
+
+class _VectorStore:
+    """L2-normalized float32 embedding matrix with a row -> chunk map.
+
+    Rows are normalized once on insert so a query is a single matrix-vector
+    product. The matrix is a _FloatRows over the read-only memmap of the
+    on-disk embeddings file: removing a file's chunks filters its row map and
+    adding chunks appends a block, so updates never copy the mapped rows into
+    memory (only rows added since the last save are resident).
+
+    With quantization on, a resident code matrix (int8 scaled per row to its
+    largest component, or packed sign bits) is scanned instead and only the best ``rerank`` candidates are
+    re-scored with exact cosine against the float rows, so the float matrix
+    stays on disk.
+
+    Matrix, chunks, IVF lists and codes live in one _ShardState that updates
+    replace with a single assignment; a search reads the state once, so it never
+    sees rows from one version and chunks from another while a refresh runs.
+    """
+
+    _SCAN_BATCH = 2048  # keeps the int8 -> float32 scratch block cache-resident
+
+    def __init__(self) -> None:
+        self._state = _ShardState(None, [], None, None)
+        self.quantization = "none"
+        self.rerank = 200
+
+    @property
+    def matrix(self) -> Optional[_FloatRows]:
+        return self._state.matrix
+
+    @matrix.setter
+    def matrix(self, value: Optional[_FloatRows]) -> None:
+        self._state = self._state._replace(matrix=value)
+
+    @property
+    def chunks(self) -> List[CodeChunk]:
+        return self._state.chunks
+
+    @property
+    def ann(self) -> Optional[_IVFIndex]:
+        return self._state.ann
+
+    @ann.setter
+    def ann(self, value: Optional[_IVFIndex]) -> None:
+        self._state = self._state._replace(ann=value)
+
+    @property
+    def codes(self) -> Optional[Any]:
+        return self._state.codes
+
+    @property
+    def scales(self) -> Optional[Any]:
+        return self._state.scales
+
+    def _set_codes(self, codes: Optional[Any], scales: Optional[Any] = None) -> None:
+        self._state = self._state._replace(codes=codes, scales=scales)
+
+    def __len__(self) -> int:
+        return len(self._state.chunks)
+
+    @property
+    def dim(self) -> int:
+        return int(self.matrix.shape[1]) if self.matrix is not None and self.matrix.ndim == 2 else 0
+
+    def reset(self, matrix: Optional[Any] = None, chunks: Optional[List[CodeChunk]] = None) -> None:
+        self._state = _ShardState(_FloatRows.of(matrix) if matrix is not None else None,
+                                  list(chunks or []), None, None)
+
+    def _quantize(self, block: Any) -> Tuple[Any, Optional[Any]]:
+        """(codes, scales) of normalized rows. A unit vector's components are mostly far below 1,
+        so int8 rows are scaled to their own largest component to use the full [-127, 127] range."""
+        import numpy as np
+        if self.quantization == "binary":
+            return np.packbits(block > 0, axis=1), None
+        peak = np.abs(block).max(axis=1)
+        peak[peak < 1e-12] = 1.0
+        codes = np.rint(block * (127.0 / peak)[:, None]).astype(np.int8)
+        return codes, (peak / 127.0).astype(np.float32)
+
+    def configure_quantization(self, mode: str, rerank: int, codes: Optional[Any] = None,
+                               codes_mode: Optional[str] = None, scales: Optional[Any] = None) -> None:
+        """Switch quantization mode, reusing persisted codes (and int8 row scales) when they
+        match the mode and rows."""
+        import numpy as np
+        mode = mode if mode in QUANTIZATION_MODES else "none"
+        self.rerank = max(1, rerank)
+        if mode == "none":
+            self.quantization = mode
+            self._set_codes(None)
+            return
+        if mode == self.quantization and self.codes is not None and len(self.codes) == len(self.chunks):
+            return
+        self.quantization = mode
+        if (codes is not None and codes_mode == mode and len(codes) == len(self.chunks)
+                and (mode == "binary" or (scales is not None and len(scales) == len(codes)))):
+            self._set_codes(codes, scales if mode == "int8" else None)
+        elif self.chunks:
+            parts = [self._quantize(np.asarray(self.matrix[i:i + self._SCAN_BATCH]))
+                     for i in range(0, len(self.chunks), self._SCAN_BATCH)]
+            self._set_codes(np.concatenate([c for c, _ in parts]),
+                            np.concatenate([sc for _, sc in parts]) if mode == "int8" else None)
+        else:
+            self._set_codes(None)
+
+    def configure_ann(self, mode: str, min_chunks: int) -> None:
+        """Train, keep or drop the IVF index according to the configured mode and index size."""
+        want = mode == "ivf" or (mode == "auto" and len(self.chunks) >= min_chunks)
+        if not want or len(self.chunks) < 64:
+            self.ann = None
+            return
+        if self.ann is None or len(self.ann.assign) != len(self.chunks) or self.ann.needs_retrain():
+            t0 = time.time()
+            self.ann = _IVFIndex.train(self.matrix)
+            logger.info("IVF index trained: %d lists over %d rows in %.1fs",
+                        self.ann.centroids.shape[0], len(self.chunks), time.time() - t0)
+
+    def add(self, chunks: List[CodeChunk], vectors: List[Any]) -> List[CodeChunk]:
+        """Normalize and append vectors for chunks. Returns the chunks actually added
+        (empty, zero-norm or wrong-dimension vectors are skipped)."""
+        import numpy as np
+        pairs = [(c, v) for c, v in zip(chunks, vectors) if v is not None and len(v)]
+        if not pairs:
+            return []
+        dim = self.dim or len(pairs[0][1])
+        pairs = [(c, v) for c, v in pairs if len(v) == dim]
+        if not pairs:
+            return []
+        block = np.asarray([v for _, v in pairs], dtype=np.float32)
+        norms = np.linalg.norm(block, axis=1)
+        ok = norms > 1e-9
+        block = block[ok] / norms[ok, None]
+        added = [c for (c, _), keep in zip(pairs, ok) if keep]
+        st = self._state
+        if st.matrix is None or not len(st.chunks):
+            codes, scales = self._quantize(block) if self.quantization != "none" else (None, None)
+            self._state = _ShardState(_FloatRows.of(np.ascontiguousarray(block)), added, None, codes, scales)
+        else:
+            codes, scales = self._quantize(block) if st.codes is not None else (None, None)
+            self._state = _ShardState(
+                st.matrix.append(block),
+                st.chunks + added,
+                st.ann.add(block) if st.ann is not None else None,
+                np.concatenate([st.codes, codes]) if codes is not None else None,
+                np.concatenate([st.scales, scales]) if scales is not None and st.scales is not None else None,
+            )
+        return added
+
+    def remove_paths(self, paths: Set[str]) -> None:
+        """Drop the rows of every chunk belonging to one of paths."""
+        import numpy as np
+        st = self._state
+        if not paths or not st.chunks:
+            return
+        keep = np.fromiter((c.path not in paths for c in st.chunks), dtype=bool, count=len(st.chunks))
+        if keep.all():
+            return
+        self._state = _ShardState(
+            st.matrix.keep(keep),
+            [c for c, k in zip(st.chunks, keep) if k],
+            st.ann.keep(keep) if st.ann is not None else None,
+            st.codes[keep] if st.codes is not None else None,
+            st.scales[keep] if st.scales is not None else None,
+        )
+
+    def search(self, query_vec: Any, top_k: int, nprobe: int = 16) -> List[CodeChunk]:
+        """Return the top_k chunks by cosine similarity to query_vec."""
+        return [c for _, c in self.search_scored(query_vec, top_k, nprobe)]
+
+    def search_scored(self, query_vec: Any, top_k: int, nprobe: int = 16,
+                      scope: str = "") -> List[Tuple[float, CodeChunk]]:
+        """(cosine, chunk) pairs for the top_k rows, best first. With an IVF index only rows
+        in the nprobe closest lists are scored; scope limits the search to the rows of
+        chunks under that subtree."""
+        import numpy as np
+        st = self._state
+        if not st.chunks or top_k <= 0:
+            return []
+        q = np.asarray(query_vec, dtype=np.float32)
+        q_norm = np.linalg.norm(q)
+        if st.matrix is None or q.shape[0] != st.matrix.shape[1] or q_norm < 1e-9:
+            return []
+        q = q / q_norm
+        restrict = None
+        if scope:
+            restrict = np.fromiter((i for i, c in enumerate(st.chunks) if _in_scope(c.path, scope)), dtype=np.int64)
+            if not len(restrict):
+                return []
+        rows = st.ann.candidates(q, nprobe) if st.ann is not None else None
+        if rows is not None and restrict is not None:
+            rows = np.intersect1d(rows, restrict, assume_unique=True)
+        if rows is not None and len(rows) < top_k:
+            rows = None
+        if rows is None:
+            rows = restrict
+        if st.codes is not None:
+            # Coarse scan over resident codes, exact cosine re-rank of the best candidates
+            coarse = self._coarse_scores(st.codes, st.scales, q, rows)
+            n_cand = min(max(self.rerank, top_k), coarse.shape[0])
+            cand = np.sort(np.argpartition(-coarse, n_cand - 1)[:n_cand])
+            rows = rows[cand] if rows is not None else cand
+        sim = st.matrix[rows] @ q if rows is not None else st.matrix @ q
+        k = min(top_k, sim.shape[0])
+        top = np.argpartition(-sim, k - 1)[:k]
+        order = top[np.argsort(-sim[top])]
+        top = rows[order] if rows is not None else order
+        return [(float(sim[j]), st.chunks[i]) for j, i in zip(order, top)]
+
+    def _coarse_scores(self, codes: Any, scales: Optional[Any], q: Any, rows: Optional[Any]) -> Any:
+        """Approximate similarity of q to each candidate row (all rows if rows is None)."""
+        import numpy as np
+        codes = codes[rows] if rows is not None else codes
+        if scales is not None and rows is not None:
+            scales = scales[rows]
+        if self.quantization == "binary":
+            # Fewer differing sign bits = closer; negate Hamming distance so larger is better
+            qbits = np.packbits(q > 0)
+            out = np.empty(codes.shape[0], dtype=np.int32)
+            for i in range(0, codes.shape[0], self._SCAN_BATCH):
+                out[i:i + self._SCAN_BATCH] = -_popcount_rows(np.bitwise_xor(codes[i:i + self._SCAN_BATCH], qbits))
+            return out
+        out = np.empty(codes.shape[0], dtype=np.float32)
+        for i in range(0, codes.shape[0], self._SCAN_BATCH):
+            out[i:i + self._SCAN_BATCH] = codes[i:i + self._SCAN_BATCH].astype(np.float32) @ q
+        if scales is not None:
+            out *= scales
+        return out
+
+
+def _shard_key(path: str) -> str:
+    """Shard of a relative path: its top-level directory, or the package directory one level
+    down inside monorepo containers (packages/foo, services/bar). Root-level files share ""."""
+    parts = path.replace("\\", "/").split("/")
+    if len(parts) == 1:
+        return ""
+    if parts[0] in _SHARD_CONTAINER_DIRS and len(parts) > 2:
+        return f"{parts[0]}/{parts[1]}"
+    return parts[0]
+
+
+def _normalize_scope(scope: Optional[str]) -> str:
+    """Subtree filter as a clean relative directory ("" = whole project)."""
+    if not scope:
+        return ""
+    scope = scope.replace("\\", "/").strip()
+    while scope.startswith("./"):
+        scope = scope[2:]
+    return scope.strip("/") if scope not in (".", "/") else ""
+
+
+def _in_scope(path: str, scope: str) -> bool:
+    return not scope or path == scope or path.startswith(scope + "/")
+
+
+_search_pool: Optional[Any] = None
+
+
+def get_search_pool() -> Any:
+    """Process-wide thread pool for per-shard query fan-out."""
+    global _search_pool
+    if _search_pool is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _search_pool = ThreadPoolExecutor(max_workers=max(1, min(8, os.cpu_count() or 2)),
+                                          thread_name_prefix="index-search")
+    return _search_pool
+
+
+class _ShardedVectorStore:
+    """One _VectorStore per shard (top-level directory or package, see _shard_key).
+
+    Each shard owns its matrix, codes and IVF lists, so adding or removing a file's
+    rows copies only that shard's arrays and IVF retraining is per shard. A query is
+    scored against every shard in scope (in parallel on a thread pool once the index
+    is large; NumPy releases the GIL in the matrix products) and the per-shard top_k
+    lists are merged by cosine score. Persisted as one matrix with each shard's rows
+    contiguous, so a loaded shard is a slice of the same memory map. ``shards`` is
+    copied on write, so a query can iterate the dict it read while a refresh adds
+    or drops shards.
+    """
+
+    def __init__(self) -> None:
+        self.shards: Dict[str, _VectorStore] = {}
+        self.quantization = "none"
+        self.rerank = 200
+        self.ann_version = 0  # bumped whenever any shard trains or drops its IVF index
+
+    def __len__(self) -> int:
+        return sum(len(s) for s in self.shards.values())
+
+    @property
+    def dim(self) -> int:
+        for s in self.shards.values():
+            if s.dim:
+                return s.dim
+        return 0
+
+    @property
+    def ann_shards(self) -> int:
+        return sum(1 for s in self.shards.values() if s.ann is not None)
+
+    @property
+    def codes_active(self) -> bool:
+        return self.quantization != "none" and all(s.codes is not None for s in self.shards.values())
+
+    def ordered(self) -> List[Tuple[str, _VectorStore]]:
+        return sorted(self.shards.items())
+
+    def _new_shard(self) -> _VectorStore:
+        shard = _VectorStore()
+        shard.quantization, shard.rerank = self.quantization, self.rerank
+        return shard
+
+    def reset(self) -> None:
+        self.shards = {}
+
+    def load_shard(self, key: str, matrix: Any, chunks: List[CodeChunk]) -> _VectorStore:
+        shard = self._new_shard()
+        shard.reset(matrix, chunks)
+        self.shards = {**self.shards, key: shard}
+        return shard
+
+    def configure_quantization(self, mode: str, rerank: int, codes: Optional[Dict[str, Any]] = None,
+                               codes_mode: Optional[str] = None, scales: Optional[Dict[str, Any]] = None) -> None:
+        """Apply the quantization mode to every shard; codes and scales map shard -> persisted arrays."""
+        self.quantization = mode if mode in QUANTIZATION_MODES else "none"
+        self.rerank = max(1, rerank)
+        for key, shard in self.shards.items():
+            shard.configure_quantization(mode, rerank, (codes or {}).get(key), codes_mode, (scales or {}).get(key))
+
+    def configure_ann(self, mode: str, min_chunks: int) -> None:
+        """Train, keep or drop each shard's IVF index (min_chunks applies per shard)."""
+        for shard in self.shards.values():
+            before = shard.ann
+            shard.configure_ann(mode, min_chunks)
+            if shard.ann is not before:
+                self.ann_version += 1
+
+    def drop_ann(self) -> None:
+        for shard in self.shards.values():
+            if shard.ann is not None:
+                shard.ann = None
+                self.ann_version += 1
+
+    def needs_retrain(self) -> bool:
+        return any(s.ann is not None and s.ann.needs_retrain() for s in self.shards.values())
+
+    def add(self, chunks: List[CodeChunk], vectors: List[Any]) -> List[CodeChunk]:
+        """Route chunks to their shards. Returns the chunks actually added."""
+        groups: Dict[str, Tuple[List[CodeChunk], List[Any]]] = {}
+        dim = self.dim
+        for c, v in zip(chunks, vectors):
+            if v is None or not len(v):
+                continue
+            if not dim:
+                dim = len(v)
+            if len(v) != dim:
+                continue
+            group = groups.setdefault(_shard_key(c.path), ([], []))
+            group[0].append(c)
+            group[1].append(v)
+        added: List[CodeChunk] = []
+        shards = dict(self.shards)
+        for key, (group_chunks, group_vectors) in groups.items():
+            shard = shards.get(key)
+            if shard is None:
+                shard = shards[key] = self._new_shard()
+            added.extend(shard.add(group_chunks, group_vectors))
+            if not len(shard):
+                del shards[key]
+        self.shards = shards
+        return added
+
+    def remove_paths(self, paths: Set[str]) -> None:
+        """Drop the rows of paths; only the shards holding them are rewritten."""
+        groups: Dict[str, Set[str]] = {}
+        for path in paths:
+            groups.setdefault(_shard_key(path), set()).add(path)
+        shards = dict(self.shards)
+        for key, group in groups.items():
+            shard = shards.get(key)
+            if shard is None:
+                continue
+            shard.remove_paths(group)
+            if not len(shard):
+                del shards[key]
+        self.shards = shards
+
+    def vectors_for(self, chunks: List[CodeChunk]) -> List[Optional[Any]]:
+        """Stored (normalized) vector of each chunk, None for chunks without one."""
+        rows_by_shard: Dict[str, Tuple[_ShardState, Dict[int, int]]] = {}
+        out: List[Optional[Any]] = []
+        shards = self.shards
+        for c in chunks:
+            key = _shard_key(c.path)
+            shard = shards.get(key)
+            if shard is None:
+                out.append(None)
+                continue
+            entry = rows_by_shard.get(key)
+            if entry is None:
+                st = shard._state
+                entry = rows_by_shard[key] = (st, {id(sc): i for i, sc in enumerate(st.chunks)})
+            st, rows = entry
+            row = rows.get(id(c))
+            out.append(st.matrix[row] if row is not None else None)
+        return out
+
+    def search(self, query_vec: Any, top_k: int, nprobe: int = 16, scope: str = "") -> List[CodeChunk]:
+        """Top_k chunks over every shard that overlaps scope, merged by cosine score."""
+        targets: List[Tuple[_VectorStore, str]] = []
+        for key, shard in self.shards.items():
+            if not scope or _in_scope(key, scope):
+                targets.append((shard, ""))
+            elif _in_scope(scope, key) and key:
+                # Scope is a subtree inside this shard: score only its rows
+                targets.append((shard, scope))
+        if not targets:
+            return []
+        if len(targets) > 1 and sum(len(s) for s, _ in targets) >= _PARALLEL_SEARCH_MIN_ROWS:
+            pool = get_search_pool()
+            futures = [pool.submit(s.search_scored, query_vec, top_k, nprobe, sub) for s, sub in targets]
+            results = [f.result() for f in futures]
+        else:
+            results = [s.search_scored(query_vec, top_k, nprobe, sub) for s, sub in targets]
+        best = heapq.nlargest(top_k, (hit for hits in results for hit in hits), key=lambda hit: hit[0])
+        return [c for _, c in best]
+
+
+_IDENT_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|[0-9]+")
+_IDENT_PART_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+# Natural-language filler that shows up in agent queries; indexed normally, ignored in queries
+_QUERY_STOPWORDS = frozenset({
+    "a", "an", "and", "are", "by", "do", "does", "for", "from", "how", "in", "is", "it",
+    "of", "on", "or", "the", "this", "to", "what", "when", "where", "which", "who", "why", "with",
+})
+_RRF_K = 60  # reciprocal rank fusion damping constant (Cormack et al.)
+
+
+@lru_cache(maxsize=65536)
+def _identifier_terms(word: str) -> Tuple[str, ...]:
+    """Lowercased identifier plus its camelCase / snake_case parts: getUserName -> getusername, get, user, name."""
+    low = word.lower()
+    terms = [low] if len(low) > 1 else []
+    parts = _IDENT_PART_RE.findall(word)
+    if len(parts) > 1:
+        terms.extend(p.lower() for p in parts if len(p) > 1 and p.lower() != low)
+    return tuple(terms)
+
+
+def _lexical_terms(text: str) -> List[str]:
+    """Identifier-aware tokens for BM25 (documents and queries use the same tokenizer)."""
+    out: List[str] = []
+    for word in _IDENT_RE.findall(text):
+        out.extend(_identifier_terms(word))
+    return out
+
+
+class _LexicalIndex:
+    """BM25 inverted index over chunk text, name and path.
+
+    Exact identifiers (``parseConfig``, ``MAX_RETRIES``) are where embeddings are
+    weakest, so tokens keep the whole identifier as well as its camelCase /
+    snake_case parts. Chunk names and file names are counted ``NAME_WEIGHT``
+    times. Postings are keyed by an internal doc id and grouped by path so a
+    file's chunks can be dropped and re-added without rebuilding the index.
+    Updates and searches hold ``_lock`` (tokenizing happens outside it), so a
+    query never walks a postings dict that a refresh is changing.
+    """
+
+    K1 = 1.2
+    B = 0.75
+    NAME_WEIGHT = 3
+
+    def __init__(self) -> None:
+        import threading
+        self._lock = threading.Lock()
+        self._postings: Dict[str, Dict[int, int]] = {}  # term -> {doc: tf}
+        self._docs: Dict[int, CodeChunk] = {}
+        self._doc_len: Dict[int, int] = {}
+        self._doc_terms: Dict[int, Tuple[str, ...]] = {}  # for removal
+        self._path_docs: Dict[str, List[int]] = {}
+        self._total_len = 0
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, chunks: List[CodeChunk]) -> None:
+        for c in chunks:
+            terms = _lexical_terms(c.load_text())
+            terms.extend(_lexical_terms(f"{c.name} {os.path.basename(c.path)}") * self.NAME_WEIGHT)
+            if not terms:
+                continue
+            tf: Dict[str, int] = {}
+            for t in terms:
+                tf[t] = tf.get(t, 0) + 1
+            with self._lock:
+                self._insert(c, tf, len(terms))
+
+    def _insert(self, c: CodeChunk, tf: Dict[str, int], length: int) -> None:
+        doc = self._next_id
+        self._next_id += 1
+        for t, n in tf.items():
+            posting = self._postings.get(t)
+            if posting is None:
+                posting = self._postings[t] = {}
+            posting[doc] = n
+        self._docs[doc] = c
+        self._doc_len[doc] = length
+        self._doc_terms[doc] = tuple(tf)
+        self._path_docs.setdefault(c.path, []).append(doc)
+        self._total_len += length
+
+    def remove_paths(self, paths: Set[str]) -> None:
+        with self._lock:
+            for path in paths:
+                for doc in self._path_docs.pop(path, ()):
+                    for t in self._doc_terms.pop(doc):
+                        posting = self._postings[t]
+                        del posting[doc]
+                        if not posting:
+                            del self._postings[t]
+                    del self._docs[doc]
+                    self._total_len -= self._doc_len.pop(doc)
+
+    def search(self, query: str, top_k: int, scope: str = "") -> List[CodeChunk]:
+        """BM25 top_k; scope limits results to one subtree (collection statistics stay global)."""
+        terms = {t for t in _lexical_terms(query) if t not in _QUERY_STOPWORDS}
+        with self._lock:
+            return self._search(terms, top_k, scope)
+
+    def _search(self, terms: Set[str], top_k: int, scope: str) -> List[CodeChunk]:
+        n_docs = len(self._docs)
+        if not n_docs:
+            return []
+        avgdl = self._total_len / n_docs
+        k1, b = self.K1, self.B
+        doc_len = self._doc_len
+        scores: Dict[int, float] = {}
+        for t in terms:
+            posting = self._postings.get(t)
+            if not posting:
+                continue
+            df = len(posting)
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc, tf in posting.items():
+                denom = tf + k1 * (1.0 - b + b * doc_len[doc] / avgdl)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (k1 + 1.0) / denom
+        candidates = scores.items()
+        if scope:
+            candidates = [(doc, sc) for doc, sc in candidates if _in_scope(self._docs[doc].path, scope)]
+        best = heapq.nlargest(top_k, candidates, key=lambda kv: kv[1])
+        return [self._docs[doc] for doc, _ in best]
+
+
+def _reciprocal_rank_fusion(rankings: List[List[CodeChunk]], top_k: int) -> List[CodeChunk]:
+    """Fuse ranked lists by sum of 1 / (k + rank); scores from different retrievers need no calibration."""
+    scores: Dict[int, float] = {}
+    by_id: Dict[int, CodeChunk] = {}
+    for ranking in rankings:
+        for rank, c in enumerate(ranking, 1):
+            scores[id(c)] = scores.get(id(c), 0.0) + 1.0 / (_RRF_K + rank)
+            by_id[id(c)] = c
+    best = heapq.nlargest(top_k, scores.items(), key=lambda kv: kv[1])
+    return [by_id[cid] for cid, _ in best]
+
+
+class _SymbolIndex:
+    """Definitions by name (path, kind, start_line, end_line), fed per file from analyze_file and
+    updated in place on change."""
+
+    def __init__(self) -> None:
+        import threading
+        self._lock = threading.Lock()  # lookups run on query threads while a refresh updates files
+        self._defs: Dict[str, List[Tuple[str, str, int, int]]] = {}
+        self._file_defs: Dict[str, Tuple[str, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self._defs)
+
+    def set_file(self, path: str, symbols: List[List[Any]]) -> None:
+        """Replace the definitions recorded for path."""
+        with self._lock:
+            self._remove_defs(path)
+            names = []
+            for name, kind, start, end in symbols:
+                self._defs.setdefault(name, []).append((path, kind, start, end))
+                names.append(name)
+            self._file_defs[path] = tuple(dict.fromkeys(names))
+
+    def remove(self, path: str) -> None:
+        with self._lock:
+            self._remove_defs(path)
+
+    def _remove_defs(self, path: str) -> None:
+        for name in self._file_defs.pop(path, ()):
+            kept = [d for d in self._defs.get(name, ()) if d[0] != path]
+            if kept:
+                self._defs[name] = kept
+            else:
+                self._defs.pop(name, None)
+
+    def definitions(self, name: str) -> List[Tuple[str, str, int, int]]:
+        with self._lock:
+            return sorted(self._defs.get(name, ()))
+
+
 class CodebaseIndex:
     """
     In-memory vector index over code chunks. Persists chunks and embeddings to disk
@@ -334,15 +1738,150 @@ class CodebaseIndex:
         self.chunks: List[CodeChunk] = []
         self.file_hashes: Dict[str, str] = {}
         self.file_mtimes: Dict[str, float] = {}  # track file modification times
-        self._embeddings_array: Optional[Any] = None
+        self.file_stats: Dict[str, List[Any]] = {}  # [mtime, size, inode] seen when the file was last hashed
+        self._vectors = _ShardedVectorStore()
+        self._lexical = _LexicalIndex()
+        self._blob: Optional[_TextBlob] = None  # chunk text file backing persisted chunks
+        self._generation = 0  # suffix of the base files chunks_meta.json points at
+        self._base_seq = 0  # last segment folded into the base files
+        self._segment_seq = 0  # last segment written or replayed
+        self._compacting = False
+        import threading
+        self._write_lock = threading.RLock()  # serializes build, refresh and compaction
+        self._lexical_ready = threading.Event()  # cleared while BM25 is built in the background
+        self._lexical_ready.set()
+        self._lexical_gen = 0
+        self._reconciler: Optional[Any] = None
+        self._reconcile_stop: Optional[Any] = None
+        self._reconcile_backend: Optional[Any] = None
         self._dirty_paths: Set[str] = set()
         # Import tracking
         self.file_imports: Dict[str, List[str]] = {}
-        self.reverse_imports: Dict[str, List[str]] = {}
+        self.file_symbols: Dict[str, List[List[Any]]] = {}  # rel -> [name, kind, start_line, end_line]
+        self._symbols = _SymbolIndex()
+        self.import_graph = ImportGraph()
+
+    def _configure_quantization(self, codes: Optional[Any] = None, codes_mode: Optional[str] = None,
+                                scales: Optional[Any] = None) -> None:
+        try:
+            from config import app_config
+            mode = getattr(app_config, "codebase_index_quantization", "none")
+            rerank = getattr(app_config, "codebase_index_rerank_candidates", 200)
+        except Exception:
+            mode, rerank = "none", 200
+        self._vectors.configure_quantization(mode, rerank, codes, codes_mode, scales)
+
+    def _configure_ann(self) -> None:
+        try:
+            from config import app_config
+            mode = getattr(app_config, "codebase_index_ann", "auto")
+            min_chunks = getattr(app_config, "codebase_index_ann_min_chunks", 20000)
+        except Exception:
+            mode, min_chunks = "auto", 20000
+        try:
+            self._vectors.configure_ann(mode, min_chunks)
+        except Exception as e:
+            logger.warning("IVF index training failed, using exact search: %s", e)
+            self._vectors.drop_ann()
+
+    def _embed_chunks(self, chunks: List[CodeChunk]) -> None:
+        """Embed chunks into the vector store. A file with any chunk left without a vector
+        forgets its hash so the next build re-embeds it instead of indexing it half-blind."""
+        if not self.embed_fn or not chunks:
+            return
+        texts = [c.load_text() for c in chunks]
+        cache = get_embedding_cache()
+        model_id = _embedding_model_id()
+        embeddings: List[Any] = cache.get_many(model_id, "search_document", texts) if cache else [None] * len(texts)
+        missing = [i for i, v in enumerate(embeddings) if v is None]
+        if missing:
+            try:
+                fresh = self.embed_fn([texts[i] for i in missing], input_type="search_document")
+            except Exception as e:
+                logger.warning("Embedding failed: %s", e)
+                fresh = []
+            for i, vec in zip(missing, fresh):
+                embeddings[i] = vec
+            if cache and fresh:
+                cache.put_many(model_id, "search_document", [(texts[i], vec) for i, vec in zip(missing, fresh)])
+        added = {id(c) for c in self._vectors.add(chunks, embeddings)}
+        for c in chunks:
+            if id(c) not in added:
+                self.file_hashes.pop(c.path, None)
+                self.file_stats.pop(c.path, None)
+
+    def _drop_paths(self, paths: Set[str]) -> None:
+        """Remove every chunk of these files from the chunk list, vector store and lexical index."""
+        self.chunks = [c for c in self.chunks if c.path not in paths]
+        self._vectors.remove_paths(paths)
+        if self._lexical_ready.is_set():
+            self._lexical.remove_paths(paths)
+
+    def _add_chunks(self, chunks: List[CodeChunk]) -> None:
+        """Embed and index new chunks (lexical indexing needs no embedding model)."""
+        self._embed_chunks(chunks)
+        if self._lexical_ready.is_set():
+            self._lexical.add(chunks)
+        self.chunks = self.chunks + chunks
+
+    def _set_file_imports(self, rel: str, imps: List[str]) -> None:
+        """Record a file's imports and update the resolved import graph in place."""
+        self.file_imports[rel] = imps
+        self.import_graph.set_imports(rel, imps)
+
+    def _forget_file_imports(self, rel: str) -> None:
+        self.file_imports.pop(rel, None)
+        self.import_graph.remove(rel)
+
+    def _set_file_analysis(self, rel: str, imps: List[str], symbols: List[List[Any]]) -> None:
+        """Record what analyze_file found in a file besides its chunks."""
+        self._set_file_imports(rel, imps)
+        self.file_symbols[rel] = symbols
+        self._symbols.set_file(rel, symbols)
+
+    def _forget_file_analysis(self, rel: str) -> None:
+        self._forget_file_imports(rel)
+        self.file_symbols.pop(rel, None)
+        self._symbols.remove(rel)
+
+    def find_definitions(self, name: str, scope: Optional[str] = None) -> List[Tuple[str, str, int, int]]:
+        """(path, kind, start_line, end_line) of every indexed definition of name under scope."""
+        scope = _normalize_scope(scope)
+        return [d for d in self._symbols.definitions(name) if _in_scope(d[0], scope)]
+
+    def dependency_neighborhood(self, file_path: str, max_neighbors: int = 8, hops: int = 1) -> List[str]:
+        """Files within `hops` resolved import edges of file_path (imports and importers)."""
+        return self.import_graph.neighborhood(file_path, hops=hops, max_neighbors=max_neighbors)
+
+    def _relative_path(self, file_path: str) -> Optional[str]:
+        """Workspace-relative form of a relative or absolute path; None if it is outside the workspace."""
+        path = file_path.replace("\\", "/")
+        if path.startswith("/") or os.path.isabs(file_path):
+            root = self.working_directory.replace("\\", "/").rstrip("/") + "/"
+            if not path.startswith(root):
+                return None
+            path = path[len(root):]
+        path = os.path.normpath(path).replace("\\", "/")
+        if path in ("", ".") or path.startswith("../"):
+            return None
+        return path
+
+    def scope_for(self, file_path: str) -> str:
+        """The subtree of file_path's shard ("" for root-level or outside files): the natural
+        retrieval scope for a query asked while that file is active."""
+        path = self._relative_path(file_path)
+        return _shard_key(path) if path else ""
 
     def notify_file_changed(self, rel_path: str) -> None:
-        """Mark a file as dirty so the next retrieval refreshes it."""
-        self._dirty_paths.add(rel_path)
+        """Mark a file as dirty so the next retrieval (or reconciliation sweep) refreshes it.
+        Accepts paths relative to the workspace or absolute paths inside it; others are ignored."""
+        path = self._relative_path(rel_path)
+        if path is None:
+            return
+        parts = path.split("/")
+        if any(p in INDEX_SKIP_DIRS or p.startswith(".") for p in parts[:-1]) or not _is_indexable_file(path):
+            return
+        self._dirty_paths.add(path)
 
     def _load_metadata(self) -> None:
         meta_path = os.path.join(self.index_dir, "meta.json")
@@ -352,51 +1891,65 @@ class CodebaseIndex:
                     data = json.load(f)
                 self.file_hashes = data.get("file_hashes", {})
                 self.file_mtimes = data.get("file_mtimes", {})
+                self.file_stats = data.get("file_stats", {})
                 self.file_imports = data.get("file_imports", {})
-                if self.file_imports:
-                    self.reverse_imports = build_import_graph(self.file_imports)
+                self.file_symbols = data.get("file_symbols", {})
+                self._symbols = _SymbolIndex()
+                for rel, symbols in self.file_symbols.items():
+                    self._symbols.set_file(rel, symbols)
+                self.import_graph = ImportGraph.from_file_imports(self.file_imports)
             except Exception as e:
                 logger.debug("Index meta load failed: %s", e)
 
     def _save_metadata(self) -> None:
         os.makedirs(self.index_dir, exist_ok=True)
-        meta_path = os.path.join(self.index_dir, "meta.json")
-        with open(meta_path, "w", encoding="utf-8") as f:
-            json.dump({
-                "file_hashes": self.file_hashes,
-                "file_mtimes": self.file_mtimes,
-                "file_imports": self.file_imports,
-            }, f, indent=0)
-
-    def _get_stale_files(self, backend: Any) -> List[str]:
-        """Get list of files that have been modified since last indexing."""
+        data = {
+            "file_hashes": self.file_hashes,
+            "file_mtimes": self.file_mtimes,
+            "file_stats": self.file_stats,
+            "file_imports": self.file_imports,
+            "file_symbols": self.file_symbols,
+        }
+        _replace_file(os.path.join(self.index_dir, "meta.json"), lambda f: json.dump(data, f, indent=0), binary=False)
+
+    def _stale_from_scan(self, scan: Dict[str, Tuple[float, int, int]]) -> List[str]:
+        """Files in a directory scan that are new or modified since they were last indexed."""
         stale_files = []
-        try:
-            files = self._list_indexable_files(backend)
-            for rel_path in files:
-                try:
-                    # Get current file mtime via backend
-                    if hasattr(backend, 'stat'):
-                        st = backend.stat(rel_path)
-                        current_mtime = st.get("st_mtime", 0) if isinstance(st, dict) else getattr(st, "st_mtime", 0)
-                    else:
-                        abs_path = os.path.join(self.working_directory, rel_path)
-                        current_mtime = os.path.getmtime(abs_path)
-                    
-                    stored_mtime = self.file_mtimes.get(rel_path, 0)
-                    if current_mtime > stored_mtime:
-                        stale_files.append(rel_path)
-                except Exception:
-                    # If we can't get mtime, treat as stale to be safe
+        for rel_path, st in scan.items():
+            stored = self.file_stats.get(rel_path)
+            if stored is not None:
+                if not _stat_unchanged(stored, st):
                     stale_files.append(rel_path)
-        except Exception as e:
-            logger.debug("Error detecting stale files: %s", e)
-        
+            elif st[0] <= 0 or st[0] > self.file_mtimes.get(rel_path, 0):
+                # If we can't get mtime, treat as stale to be safe
+                stale_files.append(rel_path)
         return stale_files
 
-    def _list_indexable_files_remote(self, backend: Any) -> List[str]:
-        """List relative paths of indexable files via backend (SSH). BFS over list_dir."""
-        out: List[str] = []
+    def _scan_indexable_files_remote(self, backend: Any,
+                                     hashes: Optional[Dict[str, str]] = None) -> Dict[str, Tuple[float, int, int]]:
+        """Scan indexable files via backend (SSH).
+
+        Prefers one find command on the host (backend.scan_files), which with ``hashes`` also
+        returns content sha256 digests. Falls back to BFS over list_dir, stats from the listing.
+        """
+        out: Dict[str, Tuple[float, int, int]] = {}
+        if hasattr(backend, "scan_files"):
+            excludes = sorted({f"*{e}" for e in INDEX_SKIP_EXTENSIONS | INDEX_SKIP_SUFFIXES | {".md", ".txt"}})
+            try:
+                listing = backend.scan_files(INDEX_SKIP_DIRS, excludes, with_hashes=hashes is not None)
+            except Exception as e:
+                logger.debug("Remote scan command failed, listing directories instead: %s", e)
+                listing = None
+            if listing is not None:
+                for e in listing:
+                    rel = e["path"]
+                    if not _is_indexable_file(rel):
+                        continue
+                    # Whole seconds, matching what SFTP stat reports when a single file is refreshed
+                    out[rel] = (float(int(e["mtime"])), int(e["size"]), 0)
+                    if hashes is not None and e.get("sha256"):
+                        hashes[rel] = e["sha256"]
+                return out
         try:
             queue: List[str] = ["."]
             while queue:
@@ -417,22 +1970,19 @@ class CodebaseIndex:
                         continue
                     rel = (rel_dir + "/" + name) if rel_dir != "." else name
                     rel = rel.replace("\\", "/")
-                    if rel.startswith(".bedrock-codex/") or "/.bedrock-codex/" in rel:
+                    if not _is_indexable_file(rel):
                         continue
-                    if not _should_index(rel):
-                        continue
-                    ext = os.path.splitext(name)[1].lower()
-                    if f".{ext}" in INDEX_SKIP_EXTENSIONS or ext in ("", ".md", ".txt"):
-                        continue
-                    out.append(rel)
+                    out[rel] = (float(e.get("mtime") or 0), int(e.get("size") or 0), 0)
         except Exception as e:
             logger.warning("List indexable files (remote) failed: %s", e)
         return out
 
-    def _list_indexable_files(self, backend: Any) -> List[str]:
-        """List relative paths of indexable files under working_directory (local or via backend)."""
+    def _scan_indexable_files(self, backend: Any,
+                              hashes: Optional[Dict[str, str]] = None) -> Dict[str, Tuple[float, int, int]]:
+        """Map relative path -> (mtime, size, inode) for every indexable file, from one directory scan.
+        For remote backends that can hash on the host, ``hashes`` is filled with path -> sha256 hex."""
         if backend is not None and getattr(backend, "_host", None) is not None:
-            return self._list_indexable_files_remote(backend)
+            return self._scan_indexable_files_remote(backend, hashes)
 
         # Load .gitignore for filtering
         gi = None
@@ -442,33 +1992,65 @@ class CodebaseIndex:
         except Exception:
             pass
 
-        out = []
+        out: Dict[str, Tuple[float, int, int]] = {}
+        stack = [""]
         try:
-            for root, dirs, files in os.walk(self.working_directory):
-                dirs[:] = [d for d in dirs if d not in INDEX_SKIP_DIRS and not d.startswith(".")]
-                rel_root = os.path.relpath(root, self.working_directory)
-                if rel_root.startswith(".bedrock-codex") or ".." in rel_root:
-                    dirs.clear()
+            while stack:
+                rel_dir = stack.pop()
+                try:
+                    it = os.scandir(os.path.join(self.working_directory, rel_dir) if rel_dir else self.working_directory)
+                except OSError:
                     continue
-                # Filter dirs by gitignore
-                if gi:
-                    dirs[:] = [d for d in dirs if not gi.match_file(
-                        (os.path.join(rel_root, d) if rel_root != "." else d).replace("\\", "/") + "/"
-                    )]
-                for f in files:
-                    if f.startswith("."):
-                        continue
-                    rel = os.path.join(rel_root, f).replace("\\", "/")
-                    if not _should_index(rel, gi):
-                        continue
-                    ext = os.path.splitext(f)[1].lower()
-                    if f".{ext}" in INDEX_SKIP_EXTENSIONS or ext in ("", ".md", ".txt"):
-                        continue
-                    out.append(rel)
+                with it:
+                    for entry in it:
+                        name = entry.name
+                        if name.startswith("."):
+                            continue
+                        rel = f"{rel_dir}/{name}" if rel_dir else name
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if name in INDEX_SKIP_DIRS or (gi and gi.match_file(rel + "/")):
+                                    continue
+                                stack.append(rel)
+                            elif entry.is_file() and _is_indexable_file(rel, gi):
+                                st = entry.stat()
+                                out[rel] = (st.st_mtime, st.st_size, st.st_ino)
+                        except OSError:
+                            continue
         except Exception as e:
             logger.warning("List indexable files failed: %s", e)
         return out
 
+    def _stat_file(self, backend: Any, rel: str) -> Tuple[float, int, int]:
+        """(mtime, size, inode) for one file; zeros if it cannot be stat'ed."""
+        try:
+            if backend is not None and hasattr(backend, "stat"):
+                st = backend.stat(rel)
+                return float(st.get("st_mtime", 0)), int(st.get("st_size", 0)), 0
+            st = os.stat(os.path.join(self.working_directory, rel))
+            return st.st_mtime, st.st_size, st.st_ino
+        except Exception:
+            return 0.0, 0, 0
+
+    def _read_for_index(self, backend: Any, rel: str) -> Optional[Tuple[str, str, str]]:
+        """Read and hash one file. Runs on the read thread pool."""
+        try:
+            content = backend.read_file(rel)
+        except Exception:
+            return None
+        return rel, content, _file_content_hash(content)
+
+    def _read_batch_for_index(self, backend: Any, rels: List[str]) -> List[Tuple[str, str, str]]:
+        """Read and hash files. Runs on the read thread pool; batches go through the backend's bulk
+        read (one tar stream over SSH) when it has one, otherwise file by file."""
+        if len(rels) > 1 and hasattr(backend, "read_files"):
+            try:
+                contents = backend.read_files(rels)
+                return [(rel, content, _file_content_hash(content)) for rel, content in contents.items()]
+            except Exception as e:
+                logger.debug("Bulk read of %d files failed, reading one by one: %s", len(rels), e)
+        return [r for r in (self._read_for_index(backend, rel) for rel in rels) if r is not None]
+
     def build(
         self,
         backend: Any,
@@ -478,106 +2060,583 @@ class CodebaseIndex:
         """
         Build or update the index. Only re-chunks and re-embeds files whose content hash changed.
         Returns number of chunks indexed.
+
+        Freshness is two-level: files whose (mtime, size, inode) from the directory scan match
+        the last indexed values are skipped without being read; the rest are read and hashed.
+        Staged pipeline: a thread pool reads and hashes files, changed files are chunked on a
+        process pool (AST parsing is CPU-bound), and finished chunks are embedded in batches
+        as they arrive instead of after the whole tree has been chunked.
+        Small updates are persisted as a segment (see _write_segment) rather than a full rewrite.
         """
-        import numpy as np
         if backend is None:
             logger.debug("Codebase index build skipped (no backend)")
             return len(self.chunks)
-        self._load_metadata()
+        with self._write_lock:
+            return self._build(backend, force_reindex, on_progress)
+
+    def _build(self, backend: Any, force_reindex: bool, on_progress: Optional[Any]) -> int:
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+        remote_hashes: Dict[str, str] = {}
         try:
-            files = self._list_indexable_files(backend)
+            stats = self._scan_indexable_files(backend, remote_hashes)
         except Exception:
-            files = []
+            stats = {}
+        files = list(stats)
         if not files:
             logger.info("No indexable files found")
             return 0
-        to_index: List[Tuple[str, str]] = []
+        t0 = time.time()
+        touched: Set[str] = set()  # files whose metadata changed
+        to_read = []
         for rel in files:
-            try:
-                content = backend.read_file(rel)
-            except Exception:
+            # Files analyzed before symbols were recorded are read (not re-embedded) once more
+            analyzed = rel in self.file_symbols
+            if not force_reindex and analyzed and rel in self.file_hashes and _stat_unchanged(self.file_stats.get(rel), stats[rel]):
                 continue
-            h = _file_content_hash(content)
-            if force_reindex or self.file_hashes.get(rel) != h:
-                to_index.append((rel, content))
-            self.file_hashes[rel] = h
-            # Track file modification time
-            try:
-                if hasattr(backend, 'stat'):
-                    st = backend.stat(rel)
-                    mtime = st.get("st_mtime", 0) if isinstance(st, dict) else getattr(st, "st_mtime", 0)
-                else:
-                    abs_path = os.path.join(self.working_directory, rel)
-                    mtime = os.path.getmtime(abs_path)
-                self.file_mtimes[rel] = mtime
-            except Exception:
-                self.file_mtimes[rel] = time.time()
-        # Drop chunks for files we're re-indexing
-        reindex_paths = {p for p, _ in to_index}
-        self.chunks = [c for c in self.chunks if c.path not in reindex_paths]
-        # Chunk and embed new/changed files
-        all_new_chunks: List[CodeChunk] = []
-        for i, (rel, content) in enumerate(to_index):
-            if on_progress:
-                on_progress(i + 1, len(to_index), rel)
-            for c in chunk_file(rel, content):
-                all_new_chunks.append(c)
-            # Extract imports
+            digest = remote_hashes.get(rel)
+            if not force_reindex and analyzed and digest and self.file_hashes.get(rel) == digest[:16]:
+                # Hashed on the host and unchanged (touched, or checked out again): no transfer needed
+                self.file_mtimes[rel] = stats[rel][0]
+                self.file_stats[rel] = list(stats[rel])
+                touched.add(rel)
+                continue
+            to_read.append(rel)
+        is_remote = getattr(backend, "_host", None) is not None
+        indexed_paths = {c.path for c in self.chunks}
+        reindex_paths: Set[str] = set()
+        added: List[CodeChunk] = []
+        analysis_only: Set[str] = set()  # unchanged content, only imports/symbols were missing
+        pending: List[Tuple[str, List[CodeChunk]]] = []
+        pending_count = 0
+        done = 0
+
+        def flush() -> None:
+            nonlocal pending, pending_count
+            if not pending:
+                return
+            paths = {rel for rel, _ in pending}
+            stale = paths & indexed_paths
+            if stale:
+                self._drop_paths(stale)
+                indexed_paths.difference_update(stale)
+            new_chunks = [c for _, chunks in pending for c in chunks]
+            pending, pending_count = [], 0
+            self._add_chunks(new_chunks)
+            added.extend(new_chunks)
+
+        def accept(rel: str, chunks: List[CodeChunk], imps: List[str], symbols: List[List[Any]]) -> None:
+            nonlocal pending_count
+            self._set_file_analysis(rel, imps, symbols)
+            if rel in analysis_only:
+                return
+            pending.append((rel, chunks))
+            pending_count += len(chunks)
+            if pending_count >= _EMBED_BATCH_CHUNKS:
+                flush()
+
+        analysis_pool = _AnalysisPool()
+        analysis_futures: Dict[Any, Tuple[str, str]] = {}
+        try:
+            with ThreadPoolExecutor(max_workers=_REMOTE_READ_WORKERS if is_remote else _LOCAL_READ_WORKERS) as readers:
+                batch = _REMOTE_FETCH_BATCH_FILES if is_remote and hasattr(backend, "read_files") else 1
+                read_futures = {
+                    readers.submit(self._read_batch_for_index, backend, to_read[i:i + batch]): min(batch, len(to_read) - i)
+                    for i in range(0, len(to_read), batch)
+                }
+                while read_futures or analysis_futures:
+                    finished, _ = wait(read_futures.keys() | analysis_futures.keys(), return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        if fut in read_futures:
+                            done += read_futures.pop(fut)
+                            for rel, content, h in fut.result():
+                                if rel not in stats:
+                                    continue
+                                touched.add(rel)
+                                self.file_mtimes[rel] = stats[rel][0]
+                                self.file_stats[rel] = list(stats[rel])
+                                changed = force_reindex or self.file_hashes.get(rel) != h
+                                self.file_hashes[rel] = h
+                                if on_progress:
+                                    on_progress(done, len(to_read), rel)
+                                if not changed:
+                                    if rel in self.file_symbols:
+                                        continue
+                                    analysis_only.add(rel)
+                                else:
+                                    reindex_paths.add(rel)
+                                analysis = analysis_pool.submit(rel, content)
+                                if isinstance(analysis, tuple):
+                                    accept(*analysis)
+                                else:
+                                    analysis_futures[analysis] = (rel, content)
+                        else:
+                            rel, content = analysis_futures.pop(fut)
+                            try:
+                                accept(*fut.result())
+                            except Exception as e:
+                                logger.debug("Worker chunking failed for %s, retrying inline: %s", rel, e)
+                                accept(*_analyze_file(rel, content))
+            flush()
+        finally:
+            analysis_pool.shutdown()
+        # Files that no longer exist or are no longer indexable
+        gone = (indexed_paths | set(self.file_hashes)) - set(files)
+        if gone:
+            self._drop_paths(gone)
+            for table in (self.file_hashes, self.file_mtimes, self.file_stats):
+                for rel in gone:
+                    table.pop(rel, None)
+            for rel in gone:
+                self._forget_file_analysis(rel)
+        if not reindex_paths and not gone:
+            if touched:
+                self._write_segment(set(), [], touched, set())
+            return len(self.chunks)
+        ann_version, quantization = self._vectors.ann_version, self._vectors.quantization
+        self._configure_quantization()
+        self._configure_ann()
+        reconfigured = self._vectors.ann_version != ann_version or self._vectors.quantization != quantization
+        if force_reindex or reconfigured or len(added) > len(self.chunks) // 2:
+            self._save_metadata()
+            self._save_chunks()
+        else:
+            self._write_segment(reindex_paths | gone, added, touched, gone)
+        logger.info("Codebase index: %d chunks (%d files, %d re-indexed) in %.1fs",
+                    len(self.chunks), len(self.file_hashes), len(reindex_paths), time.time() - t0)
+        return len(self.chunks)
+
+    def _save_chunks(self) -> None:
+        """Persist chunks in the columnar layout and re-open the matrix as a memory map.
+
+        embeddings.<g>.npy   float32 (rows, dim), L2-normalized — shard matrices back to back
+        chunks_text.<g>.bin  UTF-8 chunk texts, append-only: texts already in the file keep their offsets
+        codes.<g>.npy        quantized rows, when quantization is on
+        code_scales.<g>.npy  float32 per-row scale of int8 codes
+        ivf/<g>.<n>.npz      IVF lists of the n-th shard, for shards that have one
+        chunks_meta.json     [path_idx, start, end, kind, name, text_offset, text_len, emb_row] per chunk,
+                             [key, first_row, end_row, has_ivf] per shard, and the names of the files above
+        Each save writes its files under a new generation g and replaces the metadata table last, so
+        it acts as the commit point: a crash before it leaves the previous generation intact, and
+        that generation is deleted only after it. Once dead text (from replaced chunks) outweighs
+        live text the text file is rewritten with live texts only (appends go to the current file,
+        past the offsets the previous metadata table refers to). Afterwards every chunk drops its
+        resident text and reads it back from the file on demand.
+        """
+        import numpy as np
+        os.makedirs(self.index_dir, exist_ok=True)
+        emb_rows: Dict[int, int] = {}
+        shard_rows: List[List[Any]] = []
+        for key, shard in self._vectors.ordered():
+            start = len(emb_rows)
+            emb_rows.update((id(c), start + i) for i, c in enumerate(shard.chunks))
+            shard_rows.append([key, start, len(emb_rows), shard.ann is not None])
+        paths: List[str] = []
+        path_ids: Dict[str, int] = {}
+        rows: List[List[Any]] = []
+        gen = self._generation + 1
+        blob = self._blob
+        if blob is not None and os.path.dirname(blob.path) != os.path.normpath(self.index_dir):
+            blob = None
+        blob_end = blob.size if blob is not None else 0
+        new_parts: List[bytes] = []
+        new_rows: List[List[Any]] = []
+        appended = live = 0
+        for c in self.chunks:
+            pid = path_ids.get(c.path)
+            if pid is None:
+                pid = path_ids[c.path] = len(paths)
+                paths.append(c.path)
+            ref = c.text_ref
+            row = [pid, c.start_line, c.end_line, c.kind, c.name, 0, 0, emb_rows.get(id(c), -1)]
+            if blob is not None and c.text is None and ref is not None and ref[0] is blob:
+                row[5], row[6] = ref[1], ref[2]
+            else:
+                data = c.load_text().encode("utf-8")
+                row[5], row[6] = blob_end + appended, len(data)
+                new_parts.append(data)
+                new_rows.append(row)
+                appended += len(data)
+            live += row[6]
+            rows.append(row)
+        if blob is None or blob_end + appended - live > max(live, _TEXT_BLOB_MIN_DEAD_BYTES):
+            parts: List[bytes] = []
+            offset = 0
+            for row, c in zip(rows, self.chunks):
+                data = c.load_text().encode("utf-8")
+                row[5], row[6] = offset, len(data)
+                parts.append(data)
+                offset += len(data)
+            text_path = os.path.join(self.index_dir, _generation_file(CHUNKS_TEXT_FILE, gen))
+            _replace_file(text_path, lambda f: f.write(b"".join(parts)))
+            blob = _TextBlob(text_path)
+        elif new_parts:
+            shift = blob.append(new_parts) - blob_end  # non-zero only if a crashed save left a tail
+            if shift:
+                for row in new_rows:
+                    row[5] += shift
+        shards = self._vectors.ordered()
+        if emb_rows:
+            matrix = np.concatenate([np.asarray(shard.matrix) for _, shard in shards])
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        emb_name = _generation_file(EMBEDDINGS_FILE, gen)
+        emb_path = os.path.join(self.index_dir, emb_name)
+        _replace_file(emb_path, partial(np.save, arr=matrix))
+        del matrix
+        codes_active = self._vectors.codes_active and bool(emb_rows)
+        codes_name = scales_name = None
+        if codes_active:
+            codes_name = _generation_file(CODES_FILE, gen)
+            codes = np.concatenate([shard.codes for _, shard in shards])
+            _replace_file(os.path.join(self.index_dir, codes_name), partial(np.save, arr=codes))
+            del codes
+            if self._vectors.quantization == "int8":
+                scales_name = _generation_file(CODE_SCALES_FILE, gen)
+                scales = np.concatenate([shard.scales for _, shard in shards])
+                _replace_file(os.path.join(self.index_dir, scales_name), partial(np.save, arr=scales))
+        ivf_dir = os.path.join(self.index_dir, IVF_DIR)
+        ivf_names = set()
+        for n, (_, shard) in enumerate(shards):
+            if shard.ann is not None:
+                os.makedirs(ivf_dir, exist_ok=True)
+                shard.ann.save(os.path.join(ivf_dir, f"{gen}.{n}.npz"))
+                ivf_names.add(f"{gen}.{n}.npz")
+        meta = {
+            "version": INDEX_FORMAT_VERSION,
+            "generation": gen,
+            "embeddings_file": emb_name,
+            "text_file": os.path.basename(blob.path),
+            "codes_file": codes_name,
+            "code_scales_file": scales_name,
+            "rows_with_embedding": len(emb_rows),
+            "quantization": self._vectors.quantization if codes_active else "none",
+            "segment_seq": self._segment_seq,
+            "paths": paths,
+            "chunks": rows,
+            "shards": shard_rows,
+        }
+        _replace_file(
+            os.path.join(self.index_dir, CHUNKS_META_FILE),
+            lambda f: json.dump(meta, f, separators=(",", ":")),
+            binary=False,
+        )
+        for row, c in zip(rows, self.chunks):
+            c.text_ref = (blob, row[5], row[6])
+            c.text = None
+        self._blob = blob
+        self._generation = gen
+        self._base_seq = self._segment_seq
+        self._remove_segments(self._base_seq)
+        # Serve queries from the page cache instead of a private in-memory copy
+        if emb_rows:
+            mapped = np.load(emb_path, mmap_mode="r")
+            for (_, shard), (_, start, end, _) in zip(shards, shard_rows):
+                shard.matrix = _FloatRows.of(mapped[start:end])
+        self._remove_stale_files({emb_name, meta["text_file"], codes_name, scales_name}, ivf_names)
+
+    def _remove_stale_files(self, keep: Set[Optional[str]], keep_ivf: Set[str]) -> None:
+        """Delete base files of earlier generations (and older layouts) once nothing points at them."""
+        stale = [os.path.join(self.index_dir, name) for name in (LEGACY_CHUNKS_FILE, IVF_FILE)]
+        stale.extend(os.path.join(self.index_dir, name) for name in os.listdir(self.index_dir)
+                     if _GENERATION_FILE_RE.match(name) and name not in keep)
+        ivf_dir = os.path.join(self.index_dir, IVF_DIR)
+        if os.path.isdir(ivf_dir):
+            stale.extend(os.path.join(ivf_dir, name) for name in os.listdir(ivf_dir) if name not in keep_ivf)
+        for path in stale:
             try:
-                imps = extract_imports(rel, content)
-                if imps:
-                    self.file_imports[rel] = imps
-            except Exception:
+                if os.path.isfile(path):
+                    os.remove(path)
+            except OSError:
                 pass
-        # Also extract imports from files that didn't change (already indexed)
-        for rel in files:
-            if rel not in reindex_paths and rel not in self.file_imports:
+
+    def _segment_files(self) -> List[Tuple[int, str]]:
+        """(seq, path of the .json commit file) for every segment on disk, oldest first."""
+        seg_dir = os.path.join(self.index_dir, SEGMENTS_DIR)
+        out: List[Tuple[int, str]] = []
+        try:
+            names = os.listdir(seg_dir)
+        except OSError:
+            return out
+        for name in names:
+            stem, ext = os.path.splitext(name)
+            if ext == ".json" and stem.isdigit():
+                out.append((int(stem), os.path.join(seg_dir, name)))
+        return sorted(out)
+
+    def _remove_segments(self, upto: int) -> None:
+        for seq, path in self._segment_files():
+            if seq > upto:
+                break
+            for p in (path, path[:-len(".json")] + ".npy"):
                 try:
-                    content = backend.read_file(rel)
-                    imps = extract_imports(rel, content)
-                    if imps:
-                        self.file_imports[rel] = imps
-                except Exception:
+                    os.remove(p)
+                except OSError:
                     pass
-        # Build reverse import graph
-        self.reverse_imports = build_import_graph(self.file_imports)
-        if not all_new_chunks or not self.embed_fn:
+
+    def _write_segment(self, dropped: Set[str], added: List[CodeChunk], touched: Set[str], forgotten: Set[str]) -> None:
+        """Persist one incremental update in O(changed chunks) I/O instead of rewriting the index.
+
+        Texts of added chunks are appended to chunks_text.bin, then
+        segments/<seq>.npy  L2-normalized embeddings of the added chunks that have one
+        segments/<seq>.json tombstoned paths, added chunk rows, and file metadata of touched and
+                            forgotten files; written last, so it is the segment's commit point.
+        load_from_disk replays segments newer than the base files in order.
+        """
+        import numpy as np
+        if self._blob is None:
+            # Nothing on disk to append to yet
             self._save_metadata()
-            return len(self.chunks)
-        texts = [c.text for c in all_new_chunks]
+            self._save_chunks()
+            return
+        seg_dir = os.path.join(self.index_dir, SEGMENTS_DIR)
+        os.makedirs(seg_dir, exist_ok=True)
+        seq = self._segment_seq + 1
+        stored = self._vectors.vectors_for(added) if added else []
+        rows: List[List[Any]] = []
+        parts: List[bytes] = []
+        vec_rows: List[Any] = []
+        offset = 0
+        for c, vec in zip(added, stored):
+            data = c.load_text().encode("utf-8")
+            rows.append([c.path, c.start_line, c.end_line, c.kind, c.name, offset, len(data),
+                         len(vec_rows) if vec is not None else -1])
+            if vec is not None:
+                vec_rows.append(vec)
+            parts.append(data)
+            offset += len(data)
+        if parts:
+            start = self._blob.append(parts)
+            for row in rows:
+                row[5] += start
+        base = os.path.join(seg_dir, f"{seq:08d}")
+        if vec_rows:
+            vectors = np.asarray(vec_rows, dtype=np.float32)
+            _replace_file(base + ".npy", lambda f: np.save(f, vectors))
+        segment = {
+            "seq": seq,
+            "drop": sorted(dropped),
+            "forget": sorted(forgotten),
+            "chunks": rows,
+            "files": {
+                rel: {
+                    "hash": self.file_hashes.get(rel),
+                    "mtime": self.file_mtimes.get(rel),
+                    "stat": self.file_stats.get(rel),
+                    "imports": self.file_imports.get(rel),
+                    "symbols": self.file_symbols.get(rel),
+                }
+                for rel in touched
+            },
+        }
+        _replace_file(base + ".json", lambda f: json.dump(segment, f, separators=(",", ":")), binary=False)
+        for c, row in zip(added, rows):
+            c.text_ref = (self._blob, row[5], row[6])
+            c.text = None
+        self._segment_seq = seq
+        if seq - self._base_seq >= _MAX_PENDING_SEGMENTS:
+            self._schedule_compaction()
+
+    def _apply_segments(self) -> int:
+        """Replay segments written after the base files. Returns how many were applied."""
+        import numpy as np
+        applied = 0
+        for seq, path in self._segment_files():
+            if seq <= self._base_seq:
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    segment = json.load(f)
+                npy = path[:-len(".json")] + ".npy"
+                vectors = np.load(npy) if os.path.isfile(npy) else None
+            except Exception as e:
+                logger.warning("Skipping unreadable index segment %s: %s", path, e)
+                continue
+            dropped = set(segment.get("drop", []))
+            if dropped:
+                self._drop_paths(dropped)
+            chunks: List[CodeChunk] = []
+            embedded: List[Tuple[CodeChunk, Any]] = []
+            for rel, start, end, kind, name, off, length, emb_row in segment.get("chunks", []):
+                chunk = CodeChunk(path=rel, start_line=start, end_line=end, kind=kind, name=name,
+                                  text=None, text_ref=(self._blob, off, length))
+                chunks.append(chunk)
+                if emb_row >= 0 and vectors is not None:
+                    embedded.append((chunk, vectors[emb_row]))
+            self._vectors.add([c for c, _ in embedded], [v for _, v in embedded])
+            if self._lexical_ready.is_set():
+                self._lexical.add(chunks)
+            self.chunks = self.chunks + chunks
+            for rel in segment.get("forget", []):
+                for table in (self.file_hashes, self.file_mtimes, self.file_stats):
+                    table.pop(rel, None)
+                self._forget_file_analysis(rel)
+            for rel, info in segment.get("files", {}).items():
+                for key, table in (("hash", self.file_hashes), ("mtime", self.file_mtimes), ("stat", self.file_stats)):
+                    if info.get(key) is None:
+                        table.pop(rel, None)
+                    else:
+                        table[rel] = info[key]
+                if info.get("imports") is not None:
+                    self._set_file_imports(rel, info["imports"])
+                if info.get("symbols") is not None:
+                    self.file_symbols[rel] = info["symbols"]
+                    self._symbols.set_file(rel, info["symbols"])
+            self._segment_seq = seq
+            applied += 1
+        return applied
+
+    def _schedule_compaction(self) -> None:
+        if self._compacting:
+            return
+        import threading
+        self._compacting = True
+        threading.Thread(target=self.compact, name="codebase-index-compaction", daemon=True).start()
+
+    def compact(self) -> None:
+        """Fold pending segments into the base files and delete them."""
         try:
-            embeddings = self.embed_fn(texts, input_type="search_document")
+            with self._write_lock:
+                if self._segment_seq > self._base_seq:
+                    t0 = time.time()
+                    self._save_metadata()
+                    self._save_chunks()
+                    logger.info("Codebase index compacted in %.1fs", time.time() - t0)
         except Exception as e:
-            logger.warning("Embedding failed: %s", e)
-            embeddings = []
-        for i, c in enumerate(all_new_chunks):
-            if i < len(embeddings):
-                c.embedding = embeddings[i]
-        self.chunks.extend(all_new_chunks)
-        self._embeddings_array = None
-        self._save_metadata()
-        # Persist chunks to disk for large repos
-        chunks_path = os.path.join(self.index_dir, "chunks.json")
-        os.makedirs(self.index_dir, exist_ok=True)
-        serialized = []
-        for c in self.chunks:
-            serialized.append({
-                "path": c.path,
-                "start_line": c.start_line,
-                "end_line": c.end_line,
-                "kind": c.kind,
-                "name": c.name,
-                "text": c.text,
-                "embedding": c.embedding,
-            })
-        with open(chunks_path, "w", encoding="utf-8") as f:
-            json.dump(serialized, f, indent=0)
-        logger.info("Codebase index: %d chunks (%d files)", len(self.chunks), len(self.file_hashes))
-        return len(self.chunks)
+            logger.warning("Index compaction failed: %s", e)
+        finally:
+            self._compacting = False
+
+    def _start_lexical_build(self) -> None:
+        """Rebuild BM25 over self.chunks on a background thread.
+
+        Tokenizing every chunk is most of the load time on a large index, so loading
+        doesn't wait for it: until the build finishes, updates skip the lexical index and
+        retrieve answers from vectors alone (or waits up to CODEBASE_INDEX_LEXICAL_WAIT
+        seconds, when it has nothing else to offer).
+        """
+        import threading
+        self._lexical_gen += 1
+        self._lexical_ready.clear()
+        self._lexical = _LexicalIndex()
+        threading.Thread(target=self._build_lexical, args=(self._lexical_gen,),
+                         name="codebase-index-bm25", daemon=True).start()
+
+    def _build_lexical(self, gen: int) -> None:
+        t0 = time.time()
+        lexical = _LexicalIndex()
+        try:
+            snapshot = self.chunks
+            lexical.add(snapshot)
+        except Exception as e:
+            logger.warning("Lexical index build failed: %s", e)
+            snapshot = None
+        with self._write_lock:
+            if gen != self._lexical_gen:
+                return  # superseded by a later load
+            try:
+                if snapshot is not None:
+                    # Catch up with files that changed while the snapshot was being indexed
+                    before = {id(c) for c in snapshot}
+                    after = {id(c) for c in self.chunks}
+                    changed = {c.path for c in snapshot if id(c) not in after}
+                    changed.update(c.path for c in self.chunks if id(c) not in before)
+                    if changed:
+                        lexical.remove_paths(changed)
+                        lexical.add([c for c in self.chunks if c.path in changed])
+                self._lexical = lexical
+            except Exception as e:
+                logger.warning("Lexical index catch-up failed: %s", e)
+            finally:
+                # Never leave retrieve waiting on a build that is over
+                self._lexical_ready.set()
+        logger.debug("Lexical index built in %.1fs (%d chunks)", time.time() - t0, len(lexical))
 
     def load_from_disk(self) -> bool:
-        """Load chunks (and optionally embeddings) from disk."""
-        chunks_path = os.path.join(self.index_dir, "chunks.json")
+        """Load chunks from disk. Embeddings stay on disk as a read-only memory map."""
+        meta_path = os.path.join(self.index_dir, CHUNKS_META_FILE)
+        if not os.path.isfile(meta_path):
+            return self._load_legacy_chunks()
+        try:
+            import numpy as np
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            version = meta.get("version")
+            if version not in (1, 2, INDEX_FORMAT_VERSION):
+                logger.info("Index format version changed; full rebuild required")
+                return False
+            n_emb = meta.get("rows_with_embedding", 0)
+            matrix = None
+            if n_emb:
+                matrix = np.load(os.path.join(self.index_dir, meta.get("embeddings_file") or EMBEDDINGS_FILE), mmap_mode="r")
+                if matrix.ndim != 2 or matrix.shape[0] != n_emb:
+                    logger.warning("Index embeddings do not match metadata; full rebuild required")
+                    return False
+            blob = _TextBlob(os.path.join(self.index_dir, meta.get("text_file") or CHUNKS_TEXT_FILE))
+            paths = meta.get("paths", [])
+            self.chunks = []
+            emb_chunks: List[Tuple[int, CodeChunk]] = []
+            for pid, start, end, kind, name, off, length, emb_row in meta.get("chunks", []):
+                chunk = CodeChunk(
+                    path=paths[pid],
+                    start_line=start,
+                    end_line=end,
+                    kind=kind,
+                    name=name,
+                    text=None,
+                    text_ref=(blob, off, length),
+                )
+                self.chunks.append(chunk)
+                if emb_row >= 0:
+                    emb_chunks.append((emb_row, chunk))
+            self._blob = blob
+            gen = meta.get("generation")
+            self._generation = int(gen or 0)
+            self._base_seq = self._segment_seq = int(meta.get("segment_seq", 0))
+            self._load_metadata()
+            emb_chunks.sort(key=lambda rc: rc[0])
+            self._vectors.reset()
+            self._start_lexical_build()
+            if version == INDEX_FORMAT_VERSION:
+                codes_mode = meta.get("quantization", "none")
+                codes_path = os.path.join(self.index_dir, meta.get("codes_file") or CODES_FILE)
+                all_codes = np.load(codes_path) if codes_mode != "none" and os.path.isfile(codes_path) else None
+                # int8 codes saved without row scales are re-quantized from the float rows
+                scales_name = meta.get("code_scales_file")
+                all_scales = np.load(os.path.join(self.index_dir, scales_name)) if scales_name else None
+                codes: Dict[str, Any] = {}
+                scales: Dict[str, Any] = {}
+                rows_of = [r for r, _ in emb_chunks]
+                for n, (key, start, end, has_ivf) in enumerate(meta.get("shards", [])):
+                    lo, hi = bisect_right(rows_of, start - 1), bisect_right(rows_of, end - 1)
+                    shard = self._vectors.load_shard(key, matrix[start:end], [c for _, c in emb_chunks[lo:hi]])
+                    ivf_path = os.path.join(self.index_dir, IVF_DIR, f"{gen}.{n}.npz" if gen else f"{n}.npz")
+                    if has_ivf and os.path.isfile(ivf_path):
+                        shard.ann = _IVFIndex.load(ivf_path)
+                    if all_codes is not None and len(all_codes) == n_emb:
+                        codes[key] = all_codes[start:end]
+                    if all_scales is not None and len(all_scales) == n_emb:
+                        scales[key] = all_scales[start:end]
+                self._configure_quantization(codes, codes_mode, scales)
+                self._configure_ann()
+            elif matrix is not None:
+                # Formats 1 (raw embeddings) and 2 (a single unsharded matrix): normalize and
+                # regroup by shard once, then rewrite
+                self._vectors.add([c for _, c in emb_chunks], list(np.asarray(matrix)))
+                self._configure_quantization()
+                self._configure_ann()
+                self._save_chunks()
+            replayed = self._apply_segments()
+            if replayed and self._vectors.needs_retrain():
+                self._configure_ann()
+            logger.info("Loaded index: %d chunks (%d embedded, %d segments)", len(self.chunks), len(self._vectors), replayed)
+            return True
+        except Exception as e:
+            logger.warning("Load index failed: %s", e)
+            return False
+
+    def _load_legacy_chunks(self) -> bool:
+        """Load a pre-columnar chunks.json index and migrate it to the columnar layout."""
+        chunks_path = os.path.join(self.index_dir, LEGACY_CHUNKS_FILE)
         if not os.path.isfile(chunks_path):
             return False
         try:
@@ -593,95 +2652,264 @@ class CodebaseIndex:
                         kind=d["kind"],
                         name=d["name"],
                         text=d["text"],
-                        embedding=d.get("embedding"),
                     )
                 )
             self._load_metadata()
-            self._embeddings_array = None
-            logger.info("Loaded index: %d chunks", len(self.chunks))
+            self._vectors.reset()
+            self._vectors.add(self.chunks, [d.get("embedding") for d in data])
+            self._start_lexical_build()
+            self._save_chunks()
+            logger.info("Loaded legacy index: %d chunks (migrated to columnar layout)", len(self.chunks))
             return True
         except Exception as e:
             logger.warning("Load index failed: %s", e)
             return False
 
-    def retrieve(self, query: str, top_k: int = 10) -> List[CodeChunk]:
-        """Semantic search: return top_k chunks most relevant to query."""
-        import numpy as np
-        if not self.chunks or not self.embed_fn:
-            return []
-        chunks_with_emb = [c for c in self.chunks if c.embedding]
-        if not chunks_with_emb:
-            return []
+    def _embed_query(self, query: str) -> Optional[Any]:
+        """Embed a search query, served from the in-process query cache when possible."""
+        cache = get_query_cache()
+        key = cache.key(_embedding_model_id(), query)
+        vec = cache.get(key)
+        if vec is not None:
+            return vec
         try:
-            query_emb = self.embed_fn([query], input_type="search_query")[0]
+            vec = self.embed_fn([query], input_type="search_query")[0]
         except Exception as e:
             logger.warning("Query embed failed: %s", e)
+            return None
+        if vec is None or not len(vec):
+            return None
+        cache.put(key, vec)
+        return vec
+
+    def stats(self) -> Dict[str, Any]:
+        """Index size and cache counters (for diagnostics endpoints and logs)."""
+        emb_cache = get_embedding_cache()
+        return {
+            "chunks": len(self.chunks),
+            "embedded_chunks": len(self._vectors),
+            "files": len(self.file_hashes),
+            "dim": self._vectors.dim,
+            "lexical_terms": len(self._lexical._postings),
+            "lexical_ready": self._lexical_ready.is_set(),
+            "symbols": len(self._symbols),
+            "shards": len(self._vectors.shards),
+            "resident_float_bytes": sum(s.matrix.resident_bytes for s in self._vectors.shards.values()
+                                        if s.matrix is not None),
+            "ann": "ivf" if self._vectors.ann_shards else "off",
+            "quantization": self._vectors.quantization if self._vectors.codes_active else "none",
+            "dirty_files": len(self._dirty_paths),
+            "pending_segments": self._segment_seq - self._base_seq,
+            "query_cache": get_query_cache().stats(),
+            "embedding_cache": emb_cache.stats() if emb_cache else None,
+        }
+
+    def _vector_search(self, query: str, top_k: int, scope: str = "") -> List[CodeChunk]:
+        if not self.embed_fn or not len(self._vectors):
             return []
-        matrix = np.array([c.embedding for c in chunks_with_emb], dtype=np.float32)
-        q = np.array(query_emb, dtype=np.float32)
-        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
-        q_norm = np.linalg.norm(q)
-        if q_norm < 1e-9 or np.any(norms < 1e-9):
+        query_emb = self._embed_query(query)
+        if query_emb is None:
+            return []
+        try:
+            from config import app_config
+            nprobe = getattr(app_config, "codebase_index_ann_nprobe", 16)
+        except Exception:
+            nprobe = 16
+        return self._vectors.search(query_emb, top_k, nprobe=nprobe, scope=scope)
+
+    def retrieve(self, query: str, top_k: int = 10, mode: Optional[str] = None,
+                 scope: Optional[str] = None) -> List[CodeChunk]:
+        """Return the top_k chunks most relevant to query.
+
+        mode: "vector" (embeddings only), "lexical" (BM25 only) or "hybrid" (both, fused by
+        reciprocal rank). Defaults to CODEBASE_INDEX_RETRIEVAL_MODE. Without an embedding model
+        (or before any chunk is embedded) vector and hybrid fall back to lexical. While BM25 is
+        still being built after a load, hybrid returns the vector hits alone, and lexical waits
+        at most CODEBASE_INDEX_LEXICAL_WAIT seconds for it before doing the same.
+        scope: relative directory to search under (e.g. scope_for(active_file)); only the
+        shards overlapping it are scored.
+        """
+        if not self.chunks:
             return []
-        sim = (matrix @ q) / (norms.ravel() * q_norm)
-        top_indices = np.argsort(sim)[::-1][:top_k]
-        return [chunks_with_emb[i] for i in top_indices]
+        scope = _normalize_scope(scope)
+        try:
+            from config import app_config
+            lexical_wait = getattr(app_config, "codebase_index_lexical_wait", 5.0)
+            if mode is None:
+                mode = getattr(app_config, "codebase_index_retrieval_mode", "hybrid")
+        except Exception:
+            lexical_wait = 5.0
+            mode = mode or "hybrid"
+        vector_hits = None
+        if mode != "lexical":
+            pool = top_k if mode == "vector" else max(top_k * 4, 50)
+            vector_hits = self._vector_search(query, pool, scope)
+            if vector_hits:
+                if mode == "vector" or not self._lexical_ready.is_set():
+                    return vector_hits[:top_k]
+                return _reciprocal_rank_fusion([vector_hits, self._lexical.search(query, pool, scope)], top_k)
+        if not self._lexical_ready.wait(lexical_wait):
+            logger.debug("Lexical index still building; answering from embeddings only")
+            if vector_hits is None:
+                vector_hits = self._vector_search(query, top_k, scope)
+            return vector_hits[:top_k]
+        return self._lexical.search(query, top_k, scope)
+
+    def retrieve_with_refresh(
+        self,
+        query: str,
+        top_k: int = 10,
+        backend: Optional[Any] = None,
+        mode: Optional[str] = None,
+        scope: Optional[str] = None,
+    ) -> List[CodeChunk]:
+        """Search after refreshing files reported changed (notify_file_changed).
+
+        No tree scan happens here: edits made outside the agent reach the index through the
+        web file watcher or the periodic reconciliation sweep (start_reconciler; get_index
+        starts it for any loaded index it is given a backend for).
+        """
+        self.refresh_dirty(backend)
+        return self.retrieve(query, top_k, mode=mode, scope=scope)
 
-    def retrieve_with_refresh(self, query: str, top_k: int = 10, backend: Optional[Any] = None) -> List[CodeChunk]:
-        """Semantic search with staleness check: refresh dirty/stale files before retrieval."""
-        paths_to_refresh: set = set(self._dirty_paths)
+    def refresh_dirty(self, backend: Optional[Any] = None) -> None:
+        """Refresh files reported changed before answering a query from the index."""
+        # Cap to avoid long delays; the rest stay dirty for the next query or sweep
+        refresh_list = sorted(self._dirty_paths)[:50]
+        if refresh_list:
+            with self._write_lock:
+                self._refresh_files(refresh_list, backend)
 
-        # Also check mtime-based staleness when backend is available
-        if backend is not None:
-            try:
-                stale_files = self._get_stale_files(backend)
-                paths_to_refresh.update(stale_files)
-            except Exception as e:
-                logger.debug("Error detecting stale files: %s", e)
+    def _file_exists(self, backend: Optional[Any], rel: str) -> bool:
+        try:
+            if backend is not None:
+                return bool(backend.file_exists(rel))
+            return os.path.isfile(os.path.join(self.working_directory, rel))
+        except Exception:
+            return True  # unknown: keep what is indexed
 
-        # Cap to avoid long delays
-        refresh_list = list(paths_to_refresh)[:50]
+    def _refresh_files(self, refresh_list: List[str], backend: Optional[Any]) -> None:
+        """Re-chunk and re-embed changed files, drop deleted ones, and persist the change as one segment.
 
-        if refresh_list:
-            logger.debug("Refreshing %d files in index", len(refresh_list))
-            refresh_set = set(refresh_list)
-            # Remove old chunks for these files
-            self.chunks = [c for c in self.chunks if c.path not in refresh_set]
-            self._embeddings_array = None
-
-            new_chunks: List[CodeChunk] = []
-            for rel_path in refresh_list:
-                try:
-                    if backend is not None:
-                        content = backend.read_file(rel_path)
-                    else:
-                        abs_path = os.path.join(self.working_directory, rel_path)
-                        with open(abs_path, "r", encoding="utf-8", errors="replace") as f:
-                            content = f.read()
-                    h = _file_content_hash(content)
-                    self.file_hashes[rel_path] = h
-                    self.file_mtimes[rel_path] = time.time()
-                    for chunk in chunk_file(rel_path, content):
-                        new_chunks.append(chunk)
-                except Exception as e:
+        Files whose content hash is unchanged (touched, or reverted) only get their stats updated.
+        """
+        logger.debug("Refreshing %d files in index", len(refresh_list))
+        new_chunks: List[CodeChunk] = []
+        touched: Set[str] = set()
+        changed: Set[str] = set()
+        gone: Set[str] = set()
+        prefetched: Dict[str, str] = {}
+        if backend is not None and len(refresh_list) > 1 and hasattr(backend, "read_files"):
+            try:
+                prefetched = backend.read_files(refresh_list)
+            except Exception as e:
+                logger.debug("Bulk read for refresh failed: %s", e)
+        for rel_path in refresh_list:
+            try:
+                if rel_path in prefetched:
+                    content = prefetched[rel_path]
+                elif backend is not None:
+                    content = backend.read_file(rel_path)
+                else:
+                    abs_path = os.path.join(self.working_directory, rel_path)
+                    with open(abs_path, "r", encoding="utf-8", errors="replace") as f:
+                        content = f.read()
+            except Exception as e:
+                if not self._file_exists(backend, rel_path):
+                    gone.add(rel_path)
+                else:
                     logger.debug("Failed to refresh file %s: %s", rel_path, e)
+                continue
+            try:
+                st = self._stat_file(backend, rel_path)
+                self.file_mtimes[rel_path] = st[0] or time.time()
+                self.file_stats[rel_path] = list(st)
+                touched.add(rel_path)
+                h = _file_content_hash(content)
+                if self.file_hashes.get(rel_path) == h:
+                    continue
+                self.file_hashes[rel_path] = h
+                changed.add(rel_path)
+                chunks, imps, symbols = analyze_file(rel_path, content)
+                self._set_file_analysis(rel_path, imps, symbols)
+                new_chunks.extend(chunks)
+            except Exception as e:
+                logger.debug("Failed to refresh file %s: %s", rel_path, e)
+
+        # Remove old chunks, then embed and index new ones so they appear in search results
+        self._drop_paths(changed | gone)
+        for rel in gone:
+            for table in (self.file_hashes, self.file_mtimes, self.file_stats):
+                table.pop(rel, None)
+            self._forget_file_analysis(rel)
+        self._add_chunks(new_chunks)
+        if self._vectors.needs_retrain():
+            self._configure_ann()
+            self._schedule_compaction()  # persist the retrained IVF lists with the base files
+
+        self._dirty_paths.difference_update(refresh_list)
+        if not (touched or gone):
+            return
+        try:
+            self._write_segment(changed | gone, new_chunks, touched, gone)
+        except Exception as e:
+            logger.warning("Persisting refreshed files failed: %s", e)
+
+    def reconcile(self, backend: Any, stop: Optional[Any] = None) -> int:
+        """One reconciliation sweep: scan the tree once and refresh modified, new and deleted
+        files (plus pending dirty ones) in small batches. Returns the number of files refreshed.
 
-            # Embed new chunks so they appear in search results
-            if new_chunks and self.embed_fn:
+        This is the only place that stats the whole tree after the initial build; queries
+        only refresh files reported through notify_file_changed.
+        """
+        scan = self._scan_indexable_files(backend)
+        if not scan:
+            return 0  # an empty or failed scan must not wipe the index
+        todo = set(self._stale_from_scan(scan)) | set(self._dirty_paths)
+        todo |= ({c.path for c in self.chunks} | set(self.file_hashes)) - set(scan)
+        todo = sorted(todo)
+        for i in range(0, len(todo), _RECONCILE_BATCH_FILES):
+            if stop is not None and stop.is_set():
+                break
+            with self._write_lock:
+                self._refresh_files(todo[i:i + _RECONCILE_BATCH_FILES], backend)
+            time.sleep(0.05)  # let queries and the agent get at the lock between batches
+        if todo:
+            logger.info("Codebase index reconciled %d files", len(todo))
+        return len(todo)
+
+    def start_reconciler(self, backend: Any, interval: Optional[float] = None, sweep_now: bool = True) -> None:
+        """Start the periodic low-priority reconciliation sweep (or point a running one at a new backend).
+        With sweep_now the first sweep runs right away, catching edits made while the index was on disk."""
+        if interval is None:
+            try:
+                from config import app_config
+                interval = getattr(app_config, "codebase_index_reconcile_interval", 300.0)
+            except Exception:
+                interval = 300.0
+        self._reconcile_backend = backend
+        if interval <= 0 or (self._reconciler is not None and self._reconciler.is_alive()):
+            return
+        import threading
+        stop = threading.Event()
+
+        def _loop() -> None:
+            delay = 0.0 if sweep_now else interval
+            while not stop.wait(delay):
                 try:
-                    texts = [c.text for c in new_chunks]
-                    embeddings = self.embed_fn(texts, input_type="search_document")
-                    for i, c in enumerate(new_chunks):
-                        if i < len(embeddings):
-                            c.embedding = embeddings[i]
+                    self.reconcile(self._reconcile_backend, stop)
                 except Exception as e:
-                    logger.warning("Embedding refresh failed: %s", e)
+                    logger.debug("Index reconciliation failed: %s", e)
+                delay = interval
 
-            self.chunks.extend(new_chunks)
-            self._dirty_paths.clear()
-            self._save_metadata()
+        self._reconcile_stop = stop
+        self._reconciler = threading.Thread(target=_loop, name="codebase-index-reconcile", daemon=True)
+        self._reconciler.start()
 
-        return self.retrieve(query, top_k)
+    def stop_reconciler(self) -> None:
+        if self._reconcile_stop is not None:
+            self._reconcile_stop.set()
+        self._reconciler = None
 
 
 _global_embed_fn: Optional[Any] = None
@@ -707,6 +2935,8 @@ def get_index(
 ) -> CodebaseIndex:
     """Get or create the codebase index for this workspace.
     Cached by normalized working directory so all callers share one instance.
+    With a backend, a loaded index gets a reconciler (start_reconciler) so edits made
+    outside the agent reach it; an empty index is left for the caller to build.
     """
     norm_wd = os.path.normpath(os.path.abspath(working_directory))
     cached = _index_cache.get(norm_wd)
@@ -714,6 +2944,8 @@ def get_index(
         # Update embed_fn if a newer one is provided
         if embed_fn is not None:
             cached.embed_fn = embed_fn
+        if backend is not None and cached.chunks and cached._reconciler is None:
+            cached.start_reconciler(backend)
         return cached
 
     index_dir: Optional[str] = None
@@ -728,6 +2960,8 @@ def get_index(
     )
     index.load_from_disk()
     _index_cache[norm_wd] = index
+    if backend is not None and index.chunks:
+        index.start_reconciler(backend)
     return index
 
 
@@ -25,6 +25,12 @@ class AWSConfig:
     # AWS docs recommend at least 3600s for Claude 4+ models with extended thinking
     connect_timeout: int = int(os.getenv("AWS_CONNECT_TIMEOUT", "10"))
     read_timeout: int = int(os.getenv("AWS_READ_TIMEOUT", "3600"))
+
+    # Shared boto3 clients (one per service/region/credentials, reused by every
+    # BedrockService): HTTP pool size, TCP keepalive and retry policy
+    max_pool_connections: int = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "50"))
+    tcp_keepalive: bool = os.getenv("AWS_TCP_KEEPALIVE", "true").lower() == "true"
+    max_attempts: int = int(os.getenv("AWS_MAX_ATTEMPTS", "3"))
     
     def has_explicit_credentials(self) -> bool:
         return bool(self.access_key_id and self.secret_access_key)
@@ -108,6 +114,40 @@ class AppConfig:
     # Enterprise: semantic codebase index (Cursor-style)
     codebase_index_enabled: bool = os.getenv("CODEBASE_INDEX_ENABLED", "true").lower() == "true"
     embedding_model_id: str = os.getenv("EMBEDDING_MODEL_ID", "cohere.embed-english-v3")
+    # Embedding throughput: texts per InvokeModel call (Cohere Embed v3 accepts up to 96), requests in
+    # flight at once, and a process-wide request rate that adapts down on throttling and back up on success.
+    embedding_batch_size: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "96"))
+    embedding_max_concurrency: int = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+    embedding_requests_per_second: float = float(os.getenv("EMBEDDING_REQUESTS_PER_SECOND", "10"))
+    embedding_max_retries: int = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+    # Content-addressed embedding cache shared by all projects (~/.bedrock-codex/embedding_cache.sqlite3),
+    # keyed by (model, input type, text); least-recently-used entries are evicted past the size cap.
+    embedding_cache_enabled: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    embedding_cache_max_mb: int = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "1024"))
+    # In-process LRU for query embeddings (auto-context, scout and agent often repeat a query within a task)
+    query_embedding_cache_size: int = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "512"))
+    query_embedding_cache_ttl: float = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "900"))
+    # Approximate nearest-neighbour search for the codebase index (pure NumPy IVF-flat).
+    # The index is sharded by top-level directory; "auto" gives a shard IVF lists once it holds
+    # CODEBASE_INDEX_ANN_MIN_CHUNKS embedded chunks; "ivf" always; "off" never.
+    codebase_index_ann: str = os.getenv("CODEBASE_INDEX_ANN", "auto")
+    codebase_index_ann_min_chunks: int = int(os.getenv("CODEBASE_INDEX_ANN_MIN_CHUNKS", "20000"))
+    # Recall vs latency knob: IVF lists probed per query (higher = better recall, slower queries)
+    codebase_index_ann_nprobe: int = int(os.getenv("CODEBASE_INDEX_ANN_NPROBE", "16"))
+    # Resident embedding codes: "none" (float32), "int8" (4x smaller) or "binary" (1-bit signs, 32x smaller).
+    # Quantized modes scan the codes and re-rank the top CODEBASE_INDEX_RERANK_CANDIDATES with exact cosine
+    # against the memory-mapped float32 matrix on disk.
+    codebase_index_quantization: str = os.getenv("CODEBASE_INDEX_QUANTIZATION", "none")
+    codebase_index_rerank_candidates: int = int(os.getenv("CODEBASE_INDEX_RERANK_CANDIDATES", "200"))
+    # Default retrieval: "hybrid" fuses BM25 (exact identifiers) with embeddings by reciprocal rank;
+    # "vector" or "lexical" use one side only. Without an embedding model retrieval is lexical.
+    codebase_index_retrieval_mode: str = os.getenv("CODEBASE_INDEX_RETRIEVAL_MODE", "hybrid")
+    # Seconds a lexical-only query waits for BM25 to finish building after a load before it
+    # answers from embeddings alone.
+    codebase_index_lexical_wait: float = float(os.getenv("CODEBASE_INDEX_LEXICAL_WAIT", "5"))
+    # Seconds between background sweeps that reconcile the index with files changed outside the
+    # agent and the file watcher (deleted files, git checkouts). Queries never scan the tree. 0 disables.
+    codebase_index_reconcile_interval: float = float(os.getenv("CODEBASE_INDEX_RECONCILE_INTERVAL", "300"))
     # Extended context window (1M tokens via Anthropic beta flag).
     # When enabled and the model supports it, uses 1M context instead of 200K.
     # Set to false if your Bedrock account/region doesn't support the 1M context beta.
@@ -0,0 +1,129 @@
+"""
+Tests for bedrock_service: prompt-cache breakpoint placement and batched embedding.
+"""
+
+import io
+import json
+import threading
+import time
+import types
+
+import pytest
+from botocore.exceptions import ClientError
+
+import bedrock_service as bs
+from config import model_config, supports_caching
+
+
+def _history(turns):
+    messages = []
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"question {i}"})
+        messages.append({"role": "assistant", "content": [{"type": "text", "text": f"answer {i}"}]})
+    messages.append({"role": "user", "content": [{"type": "tool_result", "tool_use_id": "t", "content": "ok"}]})
+    return messages
+
+
+def test_breakpoint_indices_pick_latest_previous_and_stable_anchor():
+    messages = _history(10)
+    picks = bs.BedrockService._cache_breakpoint_indices(messages, stable_prefix=7)
+    assert picks == [20, 18, 6]
+    assert all(messages[i]["role"] == "user" for i in picks)
+    assert bs.BedrockService._cache_breakpoint_indices(messages, stable_prefix=None) == [20, 18]
+    assert bs.BedrockService._cache_breakpoint_indices([{"role": "assistant", "content": "x"}], 3) == []
+
+
+@pytest.mark.skipif(not supports_caching(model_config.model_id), reason="default model has no prompt caching")
+@pytest.mark.parametrize("system_prompt,tools", [
+    ("You are a coding agent.", [{"name": "read_file", "description": "d", "input_schema": {"type": "object"}}]),
+    ("You are a coding agent.", None),
+    ("", [{"name": "read_file", "description": "d", "input_schema": {"type": "object"}}]),
+    ("", None),
+])
+@pytest.mark.parametrize("turns,stable_prefix", [(1, None), (3, 2), (12, 9), (12, 23)])
+def test_request_stays_within_four_breakpoints(system_prompt, tools, turns, stable_prefix):
+    svc = object.__new__(bs.BedrockService)  # formatting needs no AWS client
+    config = bs.GenerationConfig(cache_stable_prefix=stable_prefix, volatile_context="Active file: a.py")
+    body = svc._format_messages_anthropic(_history(turns), system_prompt, model_config.model_id, config, tools=tools)
+    count = json.dumps(body).count('"cache_control"')
+    assert 1 <= count <= bs._MAX_CACHE_BREAKPOINTS
+    last = body["messages"][-1]["content"]
+    assert last[-1]["text"] == "Active file: a.py" and "cache_control" not in last[-1]
+
+
+class _FakeEmbedClient:
+    """invoke_model stand-in: each text embeds to [len(text), 1.0]; the first request for a
+    batch listed in fail_first raises that error code once."""
+
+    def __init__(self, fail_first=None, payload=None, slow_first=0.0):
+        self.fail_first = dict(fail_first or {})
+        self.payload = payload
+        self.slow_first = slow_first
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def invoke_model(self, modelId, body, contentType, accept):
+        texts = json.loads(body)["texts"]
+        with self._lock:
+            self.calls.append(texts)
+            code = self.fail_first.pop(texts[0], None)
+        if code:
+            raise ClientError({"Error": {"Code": code, "Message": code}}, "InvokeModel")
+        if self.slow_first and texts[0] == "t0":
+            time.sleep(self.slow_first)  # the first batch finishes last
+        payload = self.payload if self.payload is not None else {"embeddings": [[float(len(t)), 1.0] for t in texts]}
+        return {"body": io.BytesIO(json.dumps(payload).encode())}
+
+
+@pytest.fixture
+def embed_service(monkeypatch):
+    from config import app_config
+    monkeypatch.setattr(app_config, "embedding_batch_size", 2, raising=False)
+    monkeypatch.setattr(app_config, "embedding_max_concurrency", 4, raising=False)
+    monkeypatch.setattr(app_config, "embedding_max_retries", 2, raising=False)
+    monkeypatch.setattr(bs, "_embed_limiter", bs._EmbedRateLimiter(rate=1000.0, burst=8))
+    # No backoff sleeps; the limiter keeps its clock
+    monkeypatch.setattr(bs, "time", types.SimpleNamespace(sleep=lambda s: None, monotonic=time.monotonic))
+
+    def make(client):
+        svc = object.__new__(bs.BedrockService)  # embedding needs only the client
+        svc.client = client
+        return svc
+
+    return make
+
+
+def test_embed_texts_keeps_input_order_across_concurrent_batches(embed_service):
+    texts = [f"t{i}" + "x" * i for i in range(9)]
+    texts[0] = "t0"
+    svc = embed_service(_FakeEmbedClient(slow_first=0.1))
+    assert svc.embed_texts(texts) == [[float(len(t)), 1.0] for t in texts]
+    assert svc.last_embed_run["batches"] == 5 and svc.last_embed_run["failed_batches"] == 0
+
+
+def test_embed_texts_retries_throttled_batches(embed_service):
+    client = _FakeEmbedClient(fail_first={"t2": "ThrottlingException", "t4": "ServiceUnavailableException"})
+    svc = embed_service(client)
+    texts = [f"t{i}" for i in range(6)]
+    assert svc.embed_texts(texts) == [[2.0, 1.0]] * 6
+    assert len(client.calls) == 5
+    assert svc.last_embed_run["retries"] == 2 and svc.last_embed_run["throttled"] == 1
+    assert bs._embed_limiter.rate < bs._embed_limiter.max_rate
+
+
+def test_failed_batches_yield_empty_vectors_not_zeros(embed_service):
+    client = _FakeEmbedClient(fail_first={"t2": "ValidationException"})
+    svc = embed_service(client)
+    vectors = svc.embed_texts([f"t{i}" for i in range(6)])
+    assert vectors[2:4] == [[], []]
+    assert all(v == [2.0, 1.0] for i, v in enumerate(vectors) if i not in (2, 3))
+    assert svc.last_embed_run["failed_batches"] == 1
+
+
+def test_unexpected_payload_is_not_counted_as_success(embed_service):
+    limiter = bs._embed_limiter
+    limiter.on_throttle()
+    throttled_rate = limiter.rate
+    svc = embed_service(_FakeEmbedClient(payload={"embeddings": [[0.5, 0.5]]}))
+    assert svc.embed_texts(["a", "b"]) == [[], []]
+    assert limiter.rate == throttled_rate
@@ -0,0 +1,425 @@
+"""
+Behavior tests for the codebase index: persistence, vector search, import graph,
+lexical retrieval, symbol tables and background reconciliation.
+"""
+
+import hashlib
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import codebase_index as ci
+from backend import LocalBackend
+
+
+def fake_embed(texts, input_type=None):
+    """Deterministic pseudo-embeddings: same text, same vector, across processes."""
+    out = []
+    for t in texts:
+        seed = int.from_bytes(hashlib.sha256(t.encode("utf-8")).digest()[:4], "little")
+        out.append(list(np.random.default_rng(seed).standard_normal(32)))
+    return out
+
+
+@pytest.fixture(autouse=True)
+def _no_embedding_cache(monkeypatch):
+    monkeypatch.setattr(ci, "get_embedding_cache", lambda: None)
+
+
+def make_workspace(root, files):
+    for rel, text in files.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+    return root
+
+
+def build_index(root, embed_fn=fake_embed):
+    idx = ci.CodebaseIndex(str(root), embed_fn=embed_fn)
+    idx.build(LocalBackend(str(root)))
+    return idx
+
+
+def chunk_names(idx):
+    return {c.name for c in idx.chunks}
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def segment_files(root):
+    seg_dir = root / ".bedrock-codex" / "index" / ci.SEGMENTS_DIR
+    return sorted(seg_dir.glob("*.json")) if seg_dir.is_dir() else []
+
+
+def test_refresh_writes_segment_replayed_on_load(tmp_path):
+    root = make_workspace(tmp_path, {
+        "pkg/a.py": "def alpha():\n    return 1\n",
+        "pkg/b.py": "def beta():\n    return 2\n",
+    })
+    idx = build_index(root)
+    assert {"alpha", "beta"} <= chunk_names(idx)
+
+    (root / "pkg/a.py").write_text("def gamma():\n    return 3\n")
+    (root / "pkg/b.py").unlink()
+    idx.notify_file_changed("pkg/a.py")
+    idx.notify_file_changed("pkg/b.py")
+    idx.refresh_dirty(LocalBackend(str(root)))
+    assert segment_files(root)
+
+    loaded = ci.CodebaseIndex(str(root), embed_fn=fake_embed)
+    assert loaded.load_from_disk()
+    assert "gamma" in chunk_names(loaded)
+    assert not {"alpha", "beta"} & chunk_names(loaded)
+    assert "pkg/b.py" not in loaded.file_hashes
+    assert len(loaded._vectors) == len(idx._vectors)
+    assert sorted(c.load_text() for c in loaded.chunks) == sorted(c.load_text() for c in idx.chunks)
+
+
+@pytest.mark.parametrize("mode", ["int8", "binary"])
+def test_quantized_search_reranks_to_exact_order(mode):
+    rng = np.random.default_rng(7)
+    vectors = rng.standard_normal((400, 64))
+    chunks = [ci.CodeChunk(f"f{i}.py", 1, 1, "block", f"c{i}", "") for i in range(len(vectors))]
+    store = ci._VectorStore()
+    store.configure_quantization(mode, 200)
+    store.add(chunks, list(vectors))
+    assert store.codes is not None and len(store.codes) == len(chunks)
+
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    for _ in range(5):
+        q = rng.standard_normal(64)
+        exact = [chunks[i] for i in np.argsort(-(normed @ q))[:5]]
+        assert store.search(q, 5) == exact
+
+
+def test_int8_recall_with_small_rerank():
+    # 1024-d unit vectors have components around 0.03; unscaled int8 codes keep only a few levels
+    rng = np.random.default_rng(7)
+    vectors = rng.standard_normal((2000, 1024))
+    chunks = [ci.CodeChunk(f"f{i}.py", 1, 1, "block", f"c{i}", "") for i in range(len(vectors))]
+    store = ci._VectorStore()
+    store.configure_quantization("int8", 12)
+    store.add(chunks, list(vectors))
+    assert store.scales is not None and len(store.scales) == len(chunks)
+
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    hits = 0
+    for _ in range(50):
+        q = rng.standard_normal(1024)
+        exact = {chunks[i].name for i in np.argsort(-(normed @ q))[:10]}
+        hits += len(exact & {c.name for c in store.search(q, 10)})
+    assert hits / 500 >= 0.99
+
+
+def test_ivf_candidates_come_from_the_probed_lists():
+    rng = np.random.default_rng(5)
+    vectors = rng.standard_normal((1500, 32)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ivf = ci._IVFIndex.train(vectors)
+    ivf = ivf.add(vectors[:300]).keep(rng.random(1800) > 0.3)
+    for _ in range(10):
+        q = rng.standard_normal(32).astype(np.float32)
+        probe = np.argsort(-(ivf.centroids @ q))[:4]
+        assert np.array_equal(ivf.candidates(q, 4), np.flatnonzero(np.isin(ivf.assign, probe)))
+
+
+def test_quantized_index_keeps_floats_on_disk(tmp_path, monkeypatch):
+    from config import app_config
+    monkeypatch.setattr(app_config, "codebase_index_quantization", "int8", raising=False)
+    monkeypatch.setattr(app_config, "codebase_index_ann", "off", raising=False)
+    root = make_workspace(tmp_path, {f"src/m{i}.py": f"def f{i}(x):\n    return x + {i}\n" for i in range(20)})
+    build_index(root)
+
+    idx = ci.CodebaseIndex(str(root), embed_fn=fake_embed)
+    assert idx.load_from_disk()
+    stats = idx.stats()
+    assert stats["quantization"] == "int8"
+    assert all(shard.scales is not None for shard in idx._vectors.shards.values())
+    assert stats["resident_float_bytes"] == 0
+
+    (root / "src/m3.py").write_text("def g3(y):\n    return y * 3\n")
+    idx.notify_file_changed("src/m3.py")
+    idx.refresh_dirty(LocalBackend(str(root)))
+    g3 = next(c for c in idx.chunks if c.name == "g3")
+    assert idx._vectors.search(fake_embed([g3.load_text()])[0], 1) == [g3]
+    assert 0 < idx.stats()["resident_float_bytes"] < 1024
+
+
+def test_import_graph_resolves_relative_imports_against_importer():
+    files = {
+        "pkg/sub/m.py": "from ..util import helper\nfrom .sibling import thing\n",
+        "pkg/util.py": "",
+        "pkg/sub/sibling.py": "",
+        "other/util.py": "",
+        "web/src/app.js": "import x from './b'\nimport y from '../lib/c'\n",
+        "web/src/b.js": "",
+        "web/lib/c.js": "",
+        "lib/c.js": "",
+    }
+    graph = ci.ImportGraph.from_file_imports({p: ci.extract_imports(p, text) for p, text in files.items()})
+    assert graph.deps["pkg/sub/m.py"] == {"pkg/util.py", "pkg/sub/sibling.py"}
+    assert graph.deps["web/src/app.js"] == {"web/src/b.js", "web/lib/c.js"}
+    assert "pkg/sub/m.py" in graph.rdeps["pkg/util.py"]
+    assert "other/util.py" not in graph.rdeps
+
+
+def test_import_graph_updates_incrementally():
+    graph = ci.ImportGraph()
+    graph.set_imports("app/main.py", ci.extract_imports("app/main.py", "from .models import User\n"))
+    assert not graph.deps.get("app/main.py")
+
+    graph.set_imports("app/models.py", [])
+    assert graph.deps["app/main.py"] == {"app/models.py"}
+
+    graph.remove("app/models.py")
+    assert not graph.deps.get("app/main.py")
+    assert "app/models.py" not in graph.rdeps
+
+
+def test_bm25_matches_identifier_parts():
+    lexical = ci._LexicalIndex()
+    chunks = [
+        ci.CodeChunk("cfg/loader.py", 1, 3, "function", "parseConfig", "def parseConfig(path):\n    return load(path)\n"),
+        ci.CodeChunk("net/retry.py", 1, 2, "block", "lines_1_2", "MAX_RETRIES = 3\nBACKOFF = 0.5\n"),
+        ci.CodeChunk("util/text.py", 1, 2, "function", "slugify", "def slugify(s):\n    return s.lower()\n"),
+    ]
+    lexical.add(chunks)
+    assert lexical.search("parseConfig", 1) == [chunks[0]]
+    assert lexical.search("parse config", 1) == [chunks[0]]
+    assert lexical.search("max retries", 1) == [chunks[1]]
+    assert lexical.search("slugify", 3, scope="cfg") == []
+
+    lexical.remove_paths({"cfg/loader.py"})
+    assert lexical.search("parseConfig", 3) == []
+    assert len(lexical) == 2
+
+
+def test_reciprocal_rank_fusion_favors_agreement():
+    a, b, c, d = (ci.CodeChunk(f"{n}.py", 1, 1, "block", n, n) for n in "abcd")
+    fused = ci._reciprocal_rank_fusion([[a, b, c], [c, d, b]], 3)
+    assert [x.name for x in fused] == ["c", "b", "a"]
+    assert ci._reciprocal_rank_fusion([[a], []], 5) == [a]
+
+
+def test_hybrid_retrieve_after_background_bm25_build(tmp_path):
+    root = make_workspace(tmp_path, {
+        "cfg/loader.py": "def parseConfig(path):\n    return open(path).read()\n",
+        "util/text.py": "def slugify(s):\n    return s.lower()\n",
+    })
+    build_index(root)
+    idx = ci.CodebaseIndex(str(root), embed_fn=fake_embed)
+    assert idx.load_from_disk()
+    assert idx._lexical_ready.wait(5)
+    assert idx.retrieve("parseConfig", top_k=1, mode="lexical")[0].name == "parseConfig"
+    hits = idx.retrieve("parseConfig", top_k=2, mode="hybrid")
+    assert hits[0].name == "parseConfig"
+    assert idx.stats()["lexical_ready"]
+
+
+def test_lexical_retrieve_stops_waiting_for_a_slow_bm25_build(tmp_path, monkeypatch):
+    import threading
+    from config import app_config
+    monkeypatch.setattr(app_config, "codebase_index_lexical_wait", 0.05, raising=False)
+    root = make_workspace(tmp_path, {
+        "cfg/loader.py": "def parseConfig(path):\n    return open(path).read()\n",
+        "util/text.py": "def slugify(s):\n    return s.lower()\n",
+    })
+    build_index(root)
+    release = threading.Event()
+    build_lexical = ci.CodebaseIndex._build_lexical
+
+    def stalled_build(self, gen):
+        release.wait(5)
+        build_lexical(self, gen)
+
+    monkeypatch.setattr(ci.CodebaseIndex, "_build_lexical", stalled_build)
+    idx = ci.CodebaseIndex(str(root), embed_fn=fake_embed)
+    assert idx.load_from_disk()
+    t0 = time.monotonic()
+    hits = idx.retrieve("parseConfig", top_k=2, mode="lexical")
+    assert time.monotonic() - t0 < 2
+    assert {c.name for c in hits} == {"parseConfig", "slugify"}  # vector hits while BM25 builds
+    release.set()
+    assert idx._lexical_ready.wait(5)
+    assert idx.retrieve("parseConfig", top_k=1, mode="lexical")[0].name == "parseConfig"
+
+
+def test_compaction_folds_segments_into_base_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(ci, "_MAX_PENDING_SEGMENTS", 3)
+    root = make_workspace(tmp_path, {f"pkg/m{i}.py": f"def f{i}():\n    return {i}\n" for i in range(4)})
+    idx = build_index(root)
+    backend = LocalBackend(str(root))
+    for i in range(3):
+        (root / f"pkg/m{i}.py").write_text(f"def g{i}():\n    return -{i}\n")
+        idx.notify_file_changed(f"pkg/m{i}.py")
+        idx.refresh_dirty(backend)
+    # The third segment crosses the threshold and compacts on a background thread
+    assert wait_for(lambda: not idx._compacting and not segment_files(root))
+    assert idx.stats()["pending_segments"] == 0
+
+    loaded = ci.CodebaseIndex(str(root), embed_fn=fake_embed)
+    assert loaded.load_from_disk()
+    assert chunk_names(loaded) == chunk_names(idx) == {"g0", "g1", "g2", "f3"}
+    assert [c.load_text() for c in idx.chunks if c.name == "g1"] == ["def g1():\n    return -1"]
+
+
+def test_interrupted_save_leaves_previous_generation_loadable(tmp_path, monkeypatch):
+    root = make_workspace(tmp_path, {f"pkg/m{i}.py": f"def f{i}():\n    return {i}\n" for i in range(4)})
+    idx = build_index(root)
+    (root / "pkg/m1.py").write_text("def g1():\n    return -1\n\n\ndef h1():\n    return 1\n")
+    idx.notify_file_changed("pkg/m1.py")
+    idx.refresh_dirty(LocalBackend(str(root)))
+
+    replace_file = ci._replace_file
+
+    def crash_at_commit(path, write, binary=True):
+        if path.endswith(ci.CHUNKS_META_FILE):
+            raise OSError("disk full")
+        replace_file(path, write, binary)
+
+    monkeypatch.setattr(ci, "_replace_file", crash_at_commit)
+    with pytest.raises(OSError):
+        idx._save_chunks()
+    monkeypatch.setattr(ci, "_replace_file", replace_file)
+
+    loaded = ci.CodebaseIndex(str(root), embed_fn=fake_embed)
+    assert loaded.load_from_disk()
+    assert chunk_names(loaded) == chunk_names(idx) == {"f0", "g1", "h1", "f2", "f3"}
+    assert len(loaded._vectors) == len(idx._vectors)
+
+    loaded._save_chunks()
+    index_dir = root / ".bedrock-codex" / "index"
+    assert len(list(index_dir.glob("embeddings*.npy"))) == 1
+    assert len(list(index_dir.glob("chunks_text*.bin"))) == 1
+    again = ci.CodebaseIndex(str(root), embed_fn=fake_embed)
+    assert again.load_from_disk()
+    assert sorted(c.load_text() for c in again.chunks) == sorted(c.load_text() for c in idx.chunks)
+
+
+def test_reconcile_picks_up_external_edits(tmp_path):
+    root = make_workspace(tmp_path, {"app/a.py": "def alpha():\n    return 1\n", "app/b.py": "def beta():\n    return 2\n"})
+    idx = build_index(root)
+    (root / "app/c.py").write_text("def made_outside():\n    return 3\n")
+    (root / "app/b.py").unlink()
+
+    idx.reconcile(LocalBackend(str(root)))
+    assert "made_outside" in chunk_names(idx)
+    assert "beta" not in chunk_names(idx)
+    assert idx.retrieve("made_outside", top_k=1, mode="lexical")[0].path == "app/c.py"
+
+
+def test_get_index_starts_reconciler_for_loaded_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(ci, "_index_cache", {})
+    root = make_workspace(tmp_path, {"app/a.py": "def alpha():\n    return 1\n"})
+    build_index(root)
+    (root / "app/late.py").write_text("def edited_while_closed():\n    return 2\n")
+
+    idx = ci.get_index(str(root), embed_fn=fake_embed, backend=LocalBackend(str(root)))
+    try:
+        assert idx._reconciler is not None
+        assert wait_for(lambda: "edited_while_closed" in chunk_names(idx))
+    finally:
+        idx.stop_reconciler()
+
+
+def test_queries_run_safely_during_refresh(tmp_path):
+    import threading
+    root = make_workspace(tmp_path, {f"{d}/m{i}.py": f"def f_{d}{i}(x):\n    return x + {i}\n"
+                                     for d in "ab" for i in range(40)})
+    idx = build_index(root)
+    backend = LocalBackend(str(root))
+    stop = threading.Event()
+    errors = []
+
+    def query():
+        while not stop.is_set():
+            try:
+                for mode in ("hybrid", "vector", "lexical"):
+                    idx.retrieve("f_a3 return", top_k=5, mode=mode, scope="b")
+                idx.find_definitions("f_a3", scope="b")
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+                return
+
+    readers = [threading.Thread(target=query) for _ in range(2)]
+    for t in readers:
+        t.start()
+    try:
+        for r in range(10):
+            for i in range(r * 4, r * 4 + 8):
+                rel = f"{'ab'[i % 2]}/m{i % 40}.py"
+                (root / rel).write_text(f"def g{r}_{i}(y):\n    return y * {i}\n" * (1 + r % 3))
+                idx.notify_file_changed(rel)
+            idx.refresh_dirty(backend)
+    finally:
+        stop.set()
+        for t in readers:
+            t.join()
+    assert not errors
+
+
+def test_symbol_index_tracks_definitions(tmp_path):
+    root = make_workspace(tmp_path, {
+        "pkg/core.py": "def parse_config(path):\n    return path\n\nclass Loader:\n    pass\n",
+        "pkg/use.py": "from pkg.core import parse_config\n\nparse_config('x')\n",
+        "tools/other.py": "def unrelated():\n    return 0\n",
+    })
+    idx = build_index(root)
+    assert idx.find_definitions("parse_config") == [("pkg/core.py", "function", 1, 2)]
+    assert [d[:2] for d in idx.find_definitions("Loader")] == [("pkg/core.py", "class")]
+    assert idx.find_definitions("parse_config", scope="tools") == []
+
+    (root / "pkg/core.py").write_text("\n\ndef parse_config(path, strict=False):\n    return path\n")
+    (root / "pkg/use.py").unlink()
+    idx.notify_file_changed("pkg/core.py")
+    idx.notify_file_changed("pkg/use.py")
+    idx.refresh_dirty(LocalBackend(str(root)))
+    assert idx.find_definitions("parse_config") == [("pkg/core.py", "function", 3, 4)]
+    assert idx.find_definitions("Loader") == []
+
+
+class RegexSearchBackend(LocalBackend):
+    """LocalBackend whose search uses Python regexes, so ripgrep-style patterns work without rg."""
+
+    def search(self, pattern, path, include=None, cwd="."):
+        import re
+        rx = re.compile(pattern)
+        hits = []
+        for file in sorted(p for p in (Path(self.working_directory) / path).rglob("*") if p.is_file()):
+            if ".bedrock-codex" in file.parts:
+                continue
+            for n, line in enumerate(file.read_text(errors="replace").splitlines(), 1):
+                if rx.search(line):
+                    hits.append(f"{file}:{n}:{line}")
+        return "\n".join(hits)
+
+
+def test_find_symbol_merges_index_and_regex_definitions(tmp_path, monkeypatch):
+    from tools.search_ops import find_symbol
+    monkeypatch.setattr(ci, "_index_cache", {})
+    root = make_workspace(tmp_path, {
+        "py/widget.py": "class Widget:\n    pass\n",
+        "go/widget.go": "package w\n\ntype Widget struct {}\n",
+        "web/ui.js": "export const Widget = (props) => props\n",
+        "README.md": "Widget renders a widget.\n",
+    })
+    backend = RegexSearchBackend(str(root))
+    idx = ci.get_index(str(root), backend=backend)
+    idx.build(backend)
+    assert [d[0] for d in idx.find_definitions("Widget")] == ["py/widget.py"]
+
+    out = find_symbol("Widget", backend=backend, working_directory=str(root)).output
+    definitions, references = out.split("References:")
+    assert definitions.count("py/widget.py:1:") == 1  # index and regex hit, reported once
+    assert "go/widget.go:3:type Widget struct {}" in definitions
+    assert "web/ui.js:1:export const Widget" in definitions
+    assert "README.md:1:" in references
@@ -0,0 +1,68 @@
+"""
+Tests for ModelStream: the bridge from a blocking model stream to the agent's event loop.
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from agent.streaming import ModelStream
+
+
+async def _collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_yields_every_chunk_in_order():
+    async def run():
+        return await _collect(ModelStream(lambda: ({"i": i} for i in range(500)), maxsize=8).start())
+
+    assert asyncio.run(run()) == [{"i": i} for i in range(500)]
+
+
+def test_producer_error_is_raised_after_earlier_chunks():
+    def produce():
+        yield {"type": "text", "content": "partial"}
+        raise ValueError("throttled")
+
+    async def run():
+        got = []
+        with pytest.raises(ValueError, match="throttled"):
+            async for chunk in ModelStream(produce).start():
+                got.append(chunk)
+        return got
+
+    assert asyncio.run(run()) == [{"type": "text", "content": "partial"}]
+
+
+def test_cancel_ends_a_stalled_stream_and_closes_the_producer():
+    release = threading.Event()
+    closed = threading.Event()
+
+    def produce():
+        try:
+            yield {"type": "text", "content": "first"}
+            release.wait(5)  # the model stalls mid-response
+            yield {"type": "text", "content": "late"}
+        finally:
+            closed.set()
+
+    async def run():
+        state = {"cancelled": False}
+        stream = ModelStream(produce, should_stop=lambda: state["cancelled"]).start()
+        got = [await stream.__anext__()]
+
+        def cancel():  # e.g. the user presses stop while no chunk is arriving
+            state["cancelled"] = True
+            stream.wake()
+
+        threading.Timer(0.05, cancel).start()
+        got.extend(await asyncio.wait_for(_collect(stream), timeout=2))
+        return stream, got
+
+    stream, got = asyncio.run(run())
+    assert got == [{"type": "text", "content": "first"}]
+    assert stream.interrupted
+    release.set()
+    assert closed.wait(5)
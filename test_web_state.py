@@ -0,0 +1,74 @@
+"""
+Tests for the WebSocket delta coalescer in web.state.
+"""
+
+import asyncio
+
+import pytest
+
+from web import state
+from web.state import _DeltaCoalescer
+
+
+@pytest.fixture(autouse=True)
+def _slow_windows(monkeypatch):
+    # Windows long enough that test timing never decides what gets merged
+    monkeypatch.setattr(state, "_COALESCE_MIN_WINDOW", 0.2)
+    monkeypatch.setattr(state, "_COALESCE_MAX_WINDOW", 0.4)
+
+
+def _coalescer():
+    frames, flushed = [], []
+
+    async def send(msg):
+        frames.append(msg)
+
+    return _DeltaCoalescer(send, on_flush=lambda t, c: flushed.append((t, c))), frames, flushed
+
+
+def test_merges_deltas_and_flushes_before_other_messages():
+    async def run():
+        deltas, frames, flushed = _coalescer()
+        await deltas.delta("text", "Hel")  # idle stream: sent at once
+        await deltas.delta("text", "lo, ")
+        await deltas.delta("text", "world")
+        assert len(frames) == 1
+        await deltas.send({"type": "tool_call", "name": "read_file"})
+        return frames, flushed
+
+    frames, flushed = asyncio.run(run())
+    assert frames == [
+        {"type": "text", "content": "Hel"},
+        {"type": "text", "content": "lo, world"},
+        {"type": "tool_call", "name": "read_file"},
+    ]
+    assert flushed == [("text", "Hel"), ("text", "lo, world")]
+
+
+def test_type_switch_and_timer_keep_event_order():
+    async def run():
+        deltas, frames, _ = _coalescer()
+        await deltas.delta("thinking", "hmm")
+        await deltas.delta("thinking", " ok")
+        await deltas.delta("text", "Answer")  # flushes the pending thinking first
+        await asyncio.sleep(state._COALESCE_MAX_WINDOW * 2)  # window timer sends the text
+        return frames
+
+    assert asyncio.run(run()) == [
+        {"type": "thinking", "content": "hmm"},
+        {"type": "thinking", "content": " ok"},
+        {"type": "text", "content": "Answer"},
+    ]
+
+
+def test_large_batches_flush_at_byte_threshold():
+    async def run():
+        deltas, frames, _ = _coalescer()
+        await deltas.delta("text", "a")
+        chunk = "x" * (state._COALESCE_MAX_BYTES // 4)
+        for _ in range(4):
+            await deltas.delta("text", chunk)
+        return frames
+
+    frames = asyncio.run(run())
+    assert [f["content"] for f in frames] == ["a", "x" * (state._COALESCE_MAX_BYTES // 4 * 4)]
@@ -56,9 +56,12 @@ def semantic_retrieve(
     top_k: int = 10,
     backend: Optional[Backend] = None,
     working_directory: str = ".",
+    mode: Optional[str] = None,
+    path: Optional[str] = None,
     **kw: Any,
 ) -> ToolResult:
-    """Semantic search over the codebase index, optionally augmented by Bedrock Knowledge Bases."""
+    """Hybrid (BM25 + embedding) search over the codebase index, optionally augmented by Bedrock Knowledge Bases.
+    path limits the index search to one subtree."""
     all_lines: List[str] = []
 
     # --- Bedrock Knowledge Bases (if configured) ---
@@ -105,7 +108,7 @@ def semantic_retrieve(
             pass
         if idx is None:
             idx = get_index(wd, embed_fn=embed_fn, backend=backend)
-        if not idx.chunks and embed_fn and backend:
+        if not idx.chunks and backend:
             idx.build(backend, force_reindex=False)
         if not idx.chunks:
             if all_lines:
@@ -116,7 +119,9 @@ def semantic_retrieve(
                 error="Index empty. Ensure CODEBASE_INDEX_ENABLED=true and the project has been indexed.",
             )
         k = max(1, min(20, top_k))
-        chunks = idx.retrieve_with_refresh(query.strip(), top_k=k, backend=backend)
+        if mode not in ("hybrid", "vector", "lexical"):
+            mode = None
+        chunks = idx.retrieve_with_refresh(query.strip(), top_k=k, backend=backend, mode=mode, scope=path)
         if not chunks and not all_lines:
             return ToolResult(success=True, output="No relevant chunks found for this query. Try a different query or use search.")
         if chunks:
@@ -123,12 +123,14 @@ TOOL_DEFINITIONS: List[Dict[str, Any]] = [
     {
         "type": "custom",
         "name": "semantic_retrieve",
-        "description": "Semantic codebase search — finds code by meaning, not exact text. Returns the most relevant code chunks (functions, classes) ranked by semantic similarity. START HERE for code discovery and exploration. Ask complete questions: 'where is user authentication validated?', 'how are database connections pooled?', 'what happens when a payment fails?'. Then use Read with offset/limit on returned paths for full context. Much more effective than grep for understanding; use search() only for exact strings or regex patterns. Cost-efficient: queries a pre-built embedding index.",
+        "description": "Semantic codebase search — finds code by meaning, not exact text. Returns the most relevant code chunks (functions, classes) ranked by semantic similarity fused with exact identifier (BM25) matches. START HERE for code discovery and exploration. Ask complete questions: 'where is user authentication validated?', 'how are database connections pooled?', 'what happens when a payment fails?'. Then use Read with offset/limit on returned paths for full context. Much more effective than grep for understanding; use search() only for exact strings or regex patterns. Cost-efficient: queries a pre-built embedding index.",
         "input_schema": {
             "type": "object",
             "properties": {
                 "query": {"type": "string", "description": "Natural-language description of what you are looking for, e.g. 'where is user authentication validated' or 'handler for POST /api/orders'"},
                 "top_k": {"type": "integer", "description": "Number of chunks to return (default 10, max 20)"},
+                "mode": {"type": "string", "enum": ["hybrid", "vector", "lexical"], "description": "Ranking: 'hybrid' (default) fuses meaning and exact identifier matches; 'lexical' ranks by keywords/identifiers only; 'vector' by meaning only"},
+                "path": {"type": "string", "description": "Only search under this directory (relative to working directory), e.g. 'services/billing'. Default: whole project"},
             },
             "required": ["query"],
         },
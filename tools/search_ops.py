@@ -41,9 +41,98 @@ def search(pattern: str, path: Optional[str] = None, include: Optional[str] = No
         return ToolResult(success=False, output="", error=str(e))
 
 
+_IDENTIFIER_RE = re.compile(r"[A-Za-z_$][A-Za-z0-9_$]*")
+_MAX_DEFINITION_LINES = 120
+
+
+def _symbol_index(backend: Optional[Backend], working_directory: str) -> Optional[Any]:
+    """The codebase index if it has symbol tables for this workspace, else None (regex fallback)."""
+    try:
+        from config import app_config
+        if not getattr(app_config, "codebase_index_enabled", True):
+            return None
+        idx = None
+        try:
+            import web.state as _ws
+            idx = getattr(_ws, "_bg_codebase_index", None)
+        except Exception:
+            pass
+        if idx is None:
+            from codebase_index import get_index
+            is_ssh = backend is not None and getattr(backend, "_host", None) is not None
+            idx = get_index(working_directory if is_ssh else os.path.abspath(working_directory), backend=backend)
+        if not getattr(idx, "file_symbols", None):
+            return None
+        idx.refresh_dirty(backend)
+        return idx
+    except Exception as e:
+        logger.debug(f"Symbol index unavailable: {e}")
+        return None
+
+
+def _matches_include(rel: str, include: Optional[str]) -> bool:
+    if not include:
+        return True
+    import fnmatch
+    return fnmatch.fnmatch(rel if "/" in include else os.path.basename(rel), include)
+
+
+def _read_many(b: Backend, paths: List[str]) -> Dict[str, str]:
+    """Read files in one bulk transfer when the backend supports it (SSH), else one by one."""
+    if len(paths) > 1 and hasattr(b, "read_files"):
+        try:
+            return b.read_files(paths)
+        except Exception as e:
+            logger.debug(f"Bulk read failed, reading files one by one: {e}")
+    out: Dict[str, str] = {}
+    for p in paths:
+        try:
+            out[p] = b.read_file(p)
+        except Exception:
+            pass
+    return out
+
+
+def _indexed_definitions(idx: Any, b: Backend, symbol: str, path: Optional[str],
+                         include: Optional[str]) -> List[str]:
+    """Definition lines for symbol from the index's symbol tables (only the defining files are
+    read). A recorded line that no longer mentions the symbol (the file changed since it was
+    analyzed) is skipped; the regex search reports where the definition is now."""
+    defs = [d for d in idx.find_definitions(symbol, scope=path) if _matches_include(d[0], include)]
+    if not defs:
+        return []
+    word = re.compile(rf"(?<![A-Za-z0-9_$]){re.escape(symbol)}(?![A-Za-z0-9_$])")
+    contents = _read_many(b, sorted({d[0] for d in defs}))
+    def_lines = []
+    for rel, _, start, _ in defs[:_MAX_DEFINITION_LINES]:
+        lines = contents.get(rel, "").splitlines()
+        text = lines[start - 1] if 0 < start <= len(lines) else ""
+        if word.search(text):
+            def_lines.append(f"{rel}:{start}:{text}")
+    return def_lines
+
+
+_HIT_RE = re.compile(r"^(.*?):(\d+):")
+
+
+def _hit_location(line: str, root: str) -> str:
+    """'path:line' of a search hit with the path made workspace-relative, for de-duplication."""
+    m = _HIT_RE.match(line)
+    if not m:
+        return line
+    hit_path = m.group(1)
+    if os.path.isabs(hit_path):
+        hit_path = os.path.relpath(hit_path, root)
+    return f"{os.path.normpath(hit_path)}:{m.group(2)}"
+
+
 def find_symbol(symbol: str, kind: str = "all", path: Optional[str] = None, include: Optional[str] = None,
                 backend: Optional[Backend] = None, working_directory: str = ".", **kw: Any) -> ToolResult:
-    """Find symbol definitions/references with language-aware regex heuristics."""
+    """Find symbol definitions/references. Definitions are the codebase index's symbol tables
+    (when built) merged with language-aware regex heuristics (one ripgrep pass per pattern), so
+    forms the indexer doesn't record (arrow functions, methods, Go/Rust type items) and files it
+    doesn't cover are still reported. References always come from ripgrep, which also sees files
+    the index skips (docs, hidden or gitignored files) and edits it has not caught up with yet."""
     try:
         b = backend or LocalBackend(working_directory)
         target = path or "."
@@ -70,18 +159,24 @@ def find_symbol(symbol: str, kind: str = "all", path: Optional[str] = None, incl
         outputs: List[str] = []
         if kind in ("all", "definition", "definitions", "def"):
             def_hits: List[str] = []
+            if _IDENTIFIER_RE.fullmatch(symbol.strip()):
+                idx = _symbol_index(backend, working_directory)
+                if idx is not None:
+                    def_hits.extend(_indexed_definitions(idx, b, symbol.strip(), path, include))
             for pat in definition_patterns:
                 res = b.search(pat, target, include=include, cwd=".")
                 if res:
                     def_hits.extend([ln for ln in res.split("\n") if ln.strip()])
+            root = b.working_directory if hasattr(b, "working_directory") else os.path.abspath(working_directory)
             seen = set()
             dedup_defs = []
             for line in def_hits:
-                if line not in seen:
-                    seen.add(line)
+                loc = _hit_location(line, root)
+                if loc not in seen:
+                    seen.add(loc)
                     dedup_defs.append(line)
             if dedup_defs:
-                outputs.append("Definitions:\n" + "\n".join(dedup_defs[:120]))
+                outputs.append("Definitions:\n" + "\n".join(dedup_defs[:_MAX_DEFINITION_LINES]))
             else:
                 outputs.append("Definitions:\nNo matches found.")
 
@@ -257,7 +257,7 @@ async def api_find_symbol(symbol: str = Query(...), kind: str = Query("definitio
         locations = []
         for line in (result.output or "").split("\n"):
             line = line.strip()
-            if not line or line.startswith("Found") or line.startswith("No "):
+            if not line or line.startswith("Found") or line.startswith("No ") or line in ("Definitions:", "References:"):
                 continue
             if ":" in line:
                 parts = line.split(":", 2)
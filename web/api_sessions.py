@@ -94,6 +94,15 @@ async def info():
     }
 
 
+@router.get("/api/index-stats")
+async def index_stats():
+    """Return codebase index size and embedding/query cache hit rates."""
+    idx = _state._bg_codebase_index
+    if idx is None:
+        return {"ready": False}
+    return {"ready": True, **idx.stats()}
+
+
 @router.get("/api/sessions")
 async def list_sessions():
     def _session_wd_key() -> str:
@@ -32,7 +32,7 @@ from config import (
 
 from web.state import (
     _reconnect_sessions, _active_save_fns,
-    _WSRef,
+    _WSRef, _DeltaCoalescer,
 )
 import web.state as _state
 from web.context import (
@@ -470,6 +470,17 @@ async def websocket_endpoint(ws: WebSocket, session_id: Optional[str] = None):
     # Event bridge: AgentEvent → WebSocket JSON
     # ------------------------------------------------------------------
 
+    def _track_delta(event_type: str, content: str):
+        """Called by the coalescer with each merged delta as it is sent."""
+        nonlocal _current_thinking_text, _current_text_buffer
+        if event_type == "thinking":
+            _current_thinking_text += content
+        else:
+            _current_text_buffer += content
+
+    # text/thinking deltas are merged into ~16-33ms frames instead of one frame per token
+    _deltas = _DeltaCoalescer(wsr.send_json, on_flush=_track_delta)
+
     async def on_event(event: AgentEvent):
         nonlocal awaiting_keep_revert, _last_save_time, _cancel_ack_sent
         nonlocal _current_thinking_text, _current_text_buffer
@@ -477,7 +488,24 @@ async def websocket_endpoint(ws: WebSocket, session_id: Optional[str] = None):
         if event.type == "cancelled" and _cancel_ack_sent:
             return
 
+        if event.type in ("thinking", "text") and not event.data:
+            if event.content:
+                await _deltas.delta(event.type, event.content)
+            # Mid-stream save every 5s so kills lose minimal content
+            if time.time() - _last_save_time >= 5:
+                await _deltas.flush()
+                _last_save_time = time.time()
+                try:
+                    await asyncio.to_thread(save_session)
+                except Exception:
+                    pass
+            return
+
+        # Everything else goes out after the buffered deltas it follows
+        await _deltas.flush()
+
         # Track in-progress thinking/text so reconnects can resume blocks
+        # (deltas are appended by _track_delta as they are sent)
         if event.type == "thinking_start":
             _current_thinking_text = ""
         elif event.type == "thinking":
@@ -521,15 +549,13 @@ async def websocket_endpoint(ws: WebSocket, session_id: Optional[str] = None):
                 "plan_title": plan_title,
             }
 
-        await wsr.send_json(msg)
+        await _deltas.send(msg)
 
-        # ── Periodic auto-save: save after key events or every 5s during streaming ──
+        # ── Periodic auto-save: save after key events (deltas save every 5s above) ──
         now = time.time()
         should_save = False
         if event.type in ("tool_result", "thinking_end", "text_end", "done"):
             should_save = True  # natural save points
-        elif event.type in ("thinking", "text") and now - _last_save_time >= 5:
-            should_save = True  # save mid-stream every 5s so kills lose minimal content
         elif now - _last_save_time >= 10:
             should_save = True  # general time-based fallback
         if should_save:
@@ -667,7 +693,7 @@ async def websocket_endpoint(ws: WebSocket, session_id: Optional[str] = None):
                     except (asyncio.TimeoutError, asyncio.CancelledError, Exception):
                         _agent_task.cancel()
                 _agent_task = None
-                await wsr.send_json({"type": "cancelled"})
+                await _deltas.send({"type": "cancelled"})
                 # Show keep/revert bar if the agent modified files before being stopped
                 if agent._file_snapshots:
                     awaiting_keep_revert = True
@@ -1036,6 +1062,7 @@ async def websocket_endpoint(ws: WebSocket, session_id: Optional[str] = None):
                     "output_tokens": agent._total_output_tokens,
                     "cache_read": agent._cache_read_tokens,
                     "cache_write": agent._cache_write_tokens,
+                    "last_turn_cache": getattr(agent, "_last_turn_cache", {}),
                     "context_usage_pct": round(ctx_est / ctx_window * 100) if ctx_window else 0,
                 })
             except Exception:
@@ -1406,6 +1433,17 @@ async def websocket_endpoint(ws: WebSocket, session_id: Optional[str] = None):
 
         # ── Background file watcher ────────────────────────────
         _file_mtimes: Dict[str, float] = {}
+
+        def _notify_index(paths: List[str]) -> None:
+            """Feed external edits to the codebase index so queries never scan the tree."""
+            if not paths:
+                return
+            try:
+                from codebase_index import notify_file_changed_global
+                for rel in paths:
+                    notify_file_changed_global(rel, agent_wd)
+            except Exception:
+                pass
         async def _file_watcher_local():
             """Lightweight polling watcher that detects external file changes (local)."""
             POLL_INTERVAL = 3  # seconds
@@ -1425,6 +1463,7 @@ async def websocket_endpoint(ws: WebSocket, session_id: Optional[str] = None):
                     await asyncio.sleep(POLL_INTERVAL)
                     agent_busy = _agent_task is not None and not _agent_task.done()
                     changed = []
+                    index_changed = []  # new files too, and edits made while the agent runs
                     for root, dirs, files in os.walk(agent_wd):
                         dirs[:] = [d for d in dirs if d not in IGNORE_DIRS and not d.startswith(".")]
                         for fname in files[:200]:
@@ -1434,11 +1473,14 @@ async def websocket_endpoint(ws: WebSocket, session_id: Optional[str] = None):
                                 prev = _file_mtimes.get(fpath)
                                 if prev is None or mtime > prev + 0.1:
                                     _file_mtimes[fpath] = mtime
+                                    rel = os.path.relpath(fpath, agent_wd)
+                                    index_changed.append(rel)
                                     if not agent_busy and prev is not None:
-                                        changed.append(os.path.relpath(fpath, agent_wd))
+                                        changed.append(rel)
                             except OSError:
                                 pass
 
+                    _notify_index(index_changed)
                     for rel in changed[:10]:  # cap events per poll
                         try:
                             await wsr.send_json({"type": "file_changed", "path": rel})
@@ -1494,6 +1536,7 @@ async def websocket_endpoint(ws: WebSocket, session_id: Optional[str] = None):
                         if rel and not rel.startswith(".bedrock-codex/"):
                             changed.append(rel)
 
+                    _notify_index(changed)
                     for rel in changed[:10]:
                         try:
                             await wsr.send_json({"type": "file_changed", "path": rel})
@@ -47,6 +47,10 @@ async def _build_index_background(backend: Backend, working_directory: str):
         if not idx.chunks:
             await asyncio.to_thread(lambda: idx.build(backend))
 
+        previous = _state._bg_codebase_index
+        if previous is not None and previous is not idx:
+            previous.stop_reconciler()
+        idx.start_reconciler(backend)
         _state._bg_codebase_index = idx
         logger.info("Background index ready: %d chunks", len(idx.chunks))
     except Exception as e:
@@ -157,12 +161,10 @@ def _assemble_auto_context(
     # 3.5. Dependency-aware context (1-hop imports of active file)
     if active_path and budget > 500:
         try:
-            from codebase_index import get_index, get_dependency_neighborhood
+            from codebase_index import get_index
             idx = get_index(abs_wd)
             if idx.file_imports:
-                neighbors = get_dependency_neighborhood(
-                    active_path, idx.file_imports, idx.reverse_imports, max_neighbors=5
-                )
+                neighbors = idx.dependency_neighborhood(active_path, max_neighbors=5)
                 if neighbors:
                     dep_lines = [f"# Related files (1-hop imports of {active_path})"]
                     for np_ in neighbors:
@@ -185,6 +187,12 @@ def _assemble_auto_context(
             idx = _state._bg_codebase_index
             if idx and idx.chunks:
                 results = idx.retrieve_with_refresh(user_query, top_k=5, backend=b)
+                # Lead with the best hits from the active file's package/top-level directory
+                scope = idx.scope_for(active_path) if active_path else ""
+                if scope:
+                    local = idx.retrieve(user_query, top_k=2, scope=scope)
+                    seen = {id(c) for c in local}
+                    results = (local + [c for c in results if id(c) not in seen])[:5]
                 if results:
                     sem_lines = ["# Relevant code (semantic search)"]
                     for chunk in results:
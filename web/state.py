@@ -88,6 +88,76 @@ class _WSRef:
             self.ws = None          # mark disconnected on first failure
 
 
+# Delta coalescing: the first delta after a quiet period goes out at once; under a
+# sustained stream deltas are held for one window (longer when batches are busy)
+# or until the byte threshold, then sent as one frame.
+_COALESCE_MIN_WINDOW = 0.016  # 16ms
+_COALESCE_MAX_WINDOW = 0.033  # 33ms
+_COALESCE_BUSY_DELTAS = 8     # batches this large switch to the longer window
+_COALESCE_MAX_BYTES = 4096
+
+
+class _DeltaCoalescer:
+    """Merges consecutive ``text`` / ``thinking`` deltas into one WebSocket frame.
+
+    ``delta()`` buffers a delta; ``send()`` flushes the buffer before any other
+    message so frame order matches event order. ``on_flush(type, content)`` is
+    called with each merged delta just before it is sent, so state derived from
+    deltas tracks exactly what the client has received.
+    """
+
+    def __init__(self, send, on_flush=None):
+        self._send = send
+        self._on_flush = on_flush
+        self._lock = asyncio.Lock()
+        self._type: Optional[str] = None
+        self._parts: list = []
+        self._bytes = 0
+        self._window = _COALESCE_MIN_WINDOW
+        self._last_send = 0.0
+        self._timer: Optional[asyncio.Task] = None
+
+    async def delta(self, event_type: str, content: str) -> None:
+        if self._parts and event_type != self._type:
+            await self.flush()
+        self._type = event_type
+        self._parts.append(content)
+        self._bytes += len(content)
+        if self._bytes >= _COALESCE_MAX_BYTES:
+            await self.flush()
+        elif len(self._parts) == 1 and time.monotonic() - self._last_send >= self._window:
+            await self.flush()  # idle stream: don't delay the first token
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        try:
+            await asyncio.sleep(self._window)
+        finally:
+            self._timer = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        async with self._lock:
+            if not self._parts:
+                return
+            event_type, content = self._type, "".join(self._parts)
+            busy = len(self._parts) >= _COALESCE_BUSY_DELTAS
+            self._parts, self._bytes = [], 0
+            self._window = _COALESCE_MAX_WINDOW if busy else _COALESCE_MIN_WINDOW
+            if self._on_flush:
+                self._on_flush(event_type, content)
+            await self._send({"type": event_type, "content": content})
+            self._last_send = time.monotonic()
+
+    async def send(self, data: Dict[str, Any]) -> None:
+        """Send a non-delta message after any buffered deltas."""
+        await self.flush()
+        async with self._lock:
+            await self._send(data)
+            self._last_send = time.monotonic()
+
+
 # Sessions with a running agent waiting for client reconnect.
 # Maps session_id → {"future": asyncio.Future, "done_events": [asyncio.Event]}
 _reconnect_sessions: Dict[str, Dict[str, Any]] = {}